@@ -0,0 +1,60 @@
+"""
+Массовая загрузка продавцов или объявлений из файла CSV (с заголовком) или NDJSON.
+
+Запуск из каталога hw5:
+    python -m app.cli.ingest users sellers.csv
+    python -m app.cli.ingest items catalog.ndjson [--format ndjson] [--batch-size 50000]
+"""
+import argparse
+import asyncio
+
+from app.clients.redis_client import close_redis
+from app.logging_config import setup_logging, stop_logging
+from database import close_db_pool
+from models.schemas import IngestResponse
+from services.ingest_service import FORMATS, INGEST_BATCH_SIZE, KINDS, ingest, iter_lines
+
+_READ_CHUNK = 1 << 20
+
+
+async def _read_file(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, _READ_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def run(kind: str, path: str, fmt: str, batch_size: int) -> IngestResponse:
+    try:
+        return await ingest(kind, iter_lines(_read_file(path)), fmt, batch_size)
+    finally:
+        await close_db_pool()
+        await close_redis()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load users or items from CSV/NDJSON")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="rows per COPY + upsert")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    setup_logging()
+    try:
+        report = asyncio.run(run(args.kind, args.path, fmt, args.batch_size))
+    finally:
+        stop_logging()
+    print(
+        f"Ingested {report.kind}: rows={report.rows} inserted={report.inserted} updated={report.updated} "
+        f"skipped={report.skipped} rejected={report.rejected} "
+        f"elapsed={report.elapsed_sec:.1f}s rate={report.rows_per_sec:.0f} rows/s"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    main()
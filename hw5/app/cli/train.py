@@ -0,0 +1,77 @@
+"""
+Офлайн-обучение и экспорт модели. Сервинг (API и воркер) модель никогда не обучает.
+
+Запуск из каталога hw5:
+    python -m app.cli.train [--out model.weights] [--pickle-out model.pkl] [--cv 5] [--jobs -1]
+    python -m app.cli.train --export-only [--pickle-in model.pkl]   # только перевыгрузить веса
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import sklearn
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_validate
+
+from model import (
+    MODEL_PATH,
+    PICKLE_MODEL_PATH,
+    export_weights,
+    load_model,
+    make_training_data,
+    save_model,
+    train_model,
+)
+
+
+def cross_validate_model(X, y, folds: int, jobs: int) -> dict:
+    """Кросс-валидация с фолдами в параллельных процессах."""
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    scores = cross_validate(LogisticRegression(), X, y, cv=cv, n_jobs=jobs, scoring=("accuracy", "roc_auc"))
+    return {
+        "cv_folds": folds,
+        "cv_accuracy_mean": float(np.mean(scores["test_accuracy"])),
+        "cv_accuracy_std": float(np.std(scores["test_accuracy"])),
+        "cv_roc_auc_mean": float(np.mean(scores["test_roc_auc"])),
+        "cv_roc_auc_std": float(np.std(scores["test_roc_auc"])),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and export the moderation model")
+    parser.add_argument("--out", default=MODEL_PATH, help="weights artifact for serving")
+    parser.add_argument("--pickle-out", default=None, help="also save the sklearn model as pickle")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cv", type=int, default=5, help="number of cross-validation folds, 0 to skip")
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel jobs for cross-validation")
+    parser.add_argument("--export-only", action="store_true", help="export weights from an existing pickle")
+    parser.add_argument("--pickle-in", default=PICKLE_MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    metadata = {
+        "trained_at": datetime.utcnow().isoformat() + "Z",
+        "sklearn_version": sklearn.__version__,
+    }
+    if args.export_only:
+        model = load_model(args.pickle_in)
+        metadata["source"] = args.pickle_in
+    else:
+        X, y = make_training_data(args.samples, args.seed)
+        metadata.update({"n_samples": args.samples, "seed": args.seed})
+        if args.cv > 1:
+            metadata.update(cross_validate_model(X, y, args.cv, args.jobs))
+        model = train_model(args.samples, args.seed)
+        if args.pickle_out:
+            save_model(model, args.pickle_out)
+    metadata["train_seconds"] = round(time.perf_counter() - started, 3)
+
+    header = export_weights(model, args.out, metadata=metadata)
+    print(json.dumps(header, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
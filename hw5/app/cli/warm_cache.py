@@ -0,0 +1,46 @@
+"""
+Прогрев кеша предсказаний по всем открытым объявлениям (например, после деплоя или сброса Redis).
+
+Запуск из каталога hw5:
+    python -m app.cli.warm_cache [--page-size 1000] [--rate 2000] [--model model.weights]
+"""
+import argparse
+import asyncio
+
+from app.clients.redis_client import close_redis
+from app.inference.executor import close_inference_executor, get_inference_executor
+from app.logging_config import setup_logging, stop_logging
+from app.workers.cache_warmer import CACHE_WARMER_PAGE_SIZE, CACHE_WARMER_RATE, CacheWarmer
+from database import close_db_pool
+from model import MODEL_PATH, load_scorer
+
+
+async def run(model_path: str, page_size: int, rate: float) -> int:
+    model = load_scorer(model_path)
+    await get_inference_executor(model_path)
+    try:
+        return await CacheWarmer(lambda: model, page_size=page_size, rate=rate).warm()
+    finally:
+        await close_inference_executor()
+        await close_db_pool()
+        await close_redis()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute cached predictions for all open items")
+    parser.add_argument("--model", default=MODEL_PATH, help="model artifact to score with")
+    parser.add_argument("--page-size", type=int, default=CACHE_WARMER_PAGE_SIZE)
+    parser.add_argument("--rate", type=float, default=CACHE_WARMER_RATE, help="max items per second, 0 for unlimited")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    try:
+        warmed = asyncio.run(run(args.model, args.page_size, args.rate))
+    finally:
+        stop_logging()
+    print(f"Warmed {warmed} items")
+    return warmed
+
+
+if __name__ == "__main__":
+    main()
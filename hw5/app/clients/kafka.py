@@ -1,6 +1,8 @@
+import asyncio
 import json
 import logging
 from datetime import datetime
+from typing import List, Tuple
 from aiokafka import AIOKafkaProducer
 
 logger = logging.getLogger(__name__)
@@ -8,6 +10,9 @@ logger = logging.getLogger(__name__)
 KAFKA_BOOTSTRAP_SERVERS = "localhost:9092"
 MODERATION_TOPIC = "moderation"
 DLQ_TOPIC = "moderation_dlq"
+# Версия схемы сообщений в MODERATION_TOPIC: с версии 2 в сообщении есть task_id.
+# Сообщения версии 1 (без поля version) содержат только item_id
+MODERATION_MESSAGE_VERSION = 2
 
 _producer = None
 
@@ -30,13 +35,11 @@ async def close_producer():
         _producer = None
 
 
-async def send_moderation_request(item_id):
+async def send_batch(messages: List[Tuple[str, dict]]):
+    """Отправляет пачку (topic, value) и ждёт подтверждения всех: сообщения уходят в Kafka вместе, а не по одному."""
     producer = await get_producer()
-    message = {
-        "item_id": item_id,
-        "timestamp": datetime.utcnow().isoformat() + "Z"
-    }
-    await producer.send_and_wait(MODERATION_TOPIC, message)
+    futures = [await producer.send(topic, value) for topic, value in messages]
+    await asyncio.gather(*futures)
 
 
 async def send_to_dlq(original_message, error, retry_count=1):
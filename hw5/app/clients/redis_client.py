@@ -1,19 +1,34 @@
+import asyncio
+import logging
 import os
 import redis.asyncio as aioredis
-from typing import Optional
+from redis.asyncio.connection import Connection
+from redis.exceptions import ResponseError
+from typing import Callable, List, Optional
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+# Таймауты отдельных операций задаёт cache_storage; socket_timeout не ставим — он рвал бы простаивающий pub/sub
+REDIS_CONNECT_TIMEOUT_MS = int(os.getenv("REDIS_CONNECT_TIMEOUT_MS", "200"))
+# Server-assisted client-side caching: Redis сам сообщает, какие ключи изменились
+REDIS_CLIENT_TRACKING = os.getenv("REDIS_CLIENT_TRACKING", "0") == "1"
+REDIS_TRACKING_PREFIXES = [p for p in os.getenv("REDIS_TRACKING_PREFIXES", "prediction:item:").split(",") if p]
+TRACKING_CHANNEL = "__redis__:invalidate"
 _redis: Optional[aioredis.Redis] = None
 
 
 async def get_redis():
     global _redis
     if _redis is None:
+        # Значения кеша бинарные (см. cache_codec), поэтому ответы не декодируем
         _redis = aioredis.Redis(
             host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
-            decode_responses=True
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT_MS / 1000,
         )
     return _redis
 
@@ -26,3 +41,104 @@ async def close_redis():
         except Exception:
             pass
         _redis = None
+
+
+class InvalidationTracker:
+    """
+    Подписка на инвалидации ключей от самого Redis (CLIENT TRACKING, Redis >= 6).
+
+    redis.asyncio не умеет client-side caching сам, поэтому используем режим BCAST с REDIRECT:
+    одно соединение подписано на __redis__:invalidate, второе включает на него трекинг по префиксам.
+    Сервер присылает имена ключей при любой их записи, удалении или истечении — кем бы они ни были
+    изменены. on_invalidate(keys) получает список ключей или None, когда надо сбросить всё
+    (FLUSHALL, разрыв соединения: пока нас не было, уведомления могли потеряться).
+    """
+
+    def __init__(self, prefixes: List[str], on_invalidate: Callable[[Optional[List[str]]], None]):
+        self.prefixes = prefixes
+        self._on_invalidate = on_invalidate
+        self._subscriber: Optional[Connection] = None
+        self._owner: Optional[Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _connect(self):
+        self._subscriber = Connection(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+        await self._subscriber.connect()
+        await self._subscriber.send_command("CLIENT", "ID")
+        subscriber_id = await self._subscriber.read_response()
+        await self._subscriber.send_command("SUBSCRIBE", TRACKING_CHANNEL)
+        await self._subscriber.read_response()
+
+        self._owner = Connection(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+        await self._owner.connect()
+        args = ["CLIENT", "TRACKING", "ON", "REDIRECT", subscriber_id, "BCAST"]
+        for prefix in self.prefixes:
+            args += ["PREFIX", prefix]
+        await self._owner.send_command(*args)
+        await self._owner.read_response()
+        # Всё, что было закешировано до подписки, могло устареть
+        self._on_invalidate(None)
+
+    async def _disconnect(self):
+        for conn in (self._subscriber, self._owner):
+            if conn is not None:
+                try:
+                    await conn.disconnect()
+                except Exception:
+                    pass
+        self._subscriber = self._owner = None
+
+    async def start(self) -> bool:
+        """Включает трекинг. False — сервер его не поддерживает, работаем без него."""
+        if self._task is not None:
+            return True
+        try:
+            await self._connect()
+        except ResponseError as e:
+            await self._disconnect()
+            metrics.set_gauge("redis_tracking_enabled", 0)
+            logger.warning("Redis client tracking is not supported, falling back: %s", e)
+            return False
+        except Exception as e:
+            # Redis пока недоступен — подключимся в фоне
+            await self._disconnect()
+            logger.warning("Redis tracking connection failed, retrying in background: %s", e)
+        metrics.set_gauge("redis_tracking_enabled", 1)
+        self._task = asyncio.create_task(self._listen())
+        return True
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+        metrics.set_gauge("redis_tracking_enabled", 0)
+
+    async def _listen(self):
+        while True:
+            try:
+                if self._subscriber is None:
+                    await self._connect()
+                message = await self._subscriber.read_response()
+                if isinstance(message, list) and len(message) == 3 and message[0] == b"message":
+                    keys = message[2]
+                    metrics.inc("redis_tracking_invalidations_total")
+                    self._on_invalidate(None if keys is None else [key.decode() for key in keys])
+            except asyncio.CancelledError:
+                raise
+            except ResponseError as e:
+                await self._disconnect()
+                metrics.set_gauge("redis_tracking_enabled", 0)
+                logger.warning("Redis client tracking is not supported, falling back: %s", e)
+                return
+            except Exception as e:
+                logger.warning("Redis tracking connection failed, reconnecting: %s", e)
+                metrics.inc("redis_tracking_reconnects_total")
+                await self._disconnect()
+                # Уведомления могли потеряться — локальные значения больше не актуальны
+                self._on_invalidate(None)
+                await asyncio.sleep(1)
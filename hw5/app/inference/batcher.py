@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.inference.executor import get_inference_executor
+from models.schemas import PredictResponse
+from services.predict_service import predict_raw_batch
+
+logger = logging.getLogger(__name__)
+
+BATCHING_ENABLED = os.getenv("BATCHING_ENABLED", "0") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+
+
+class MicroBatcher:
+    """
+    Собирает конкурентные запросы к модели в пачки: пачка уходит в модель,
+    когда набралось max_batch_size запросов или истекло max_wait_ms
+    с момента прихода первого запроса. Запрос — сырые признаки (см. raw_features).
+    Модель можно передать в submit: вызывающий кладёт результат в кеш под её версией,
+    и во время горячей замены запрос не должен уйти в другую модель.
+    """
+
+    def __init__(
+        self,
+        get_model: Callable[[], object],
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+    ):
+        self._get_model = get_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "asyncio.Queue[Tuple[tuple, object, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Не оставляем вызывающих висеть на незавершённых future
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, row: tuple, model=None) -> PredictResponse:
+        """model=None — текущая модель на момент отправки пачки."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, model, future))
+        metrics.set_gauge("batcher_queue_depth", self._queue.qsize())
+        return await future
+
+    async def _collect(self) -> List[Tuple[tuple, object, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            metrics.set_gauge("batcher_queue_depth", self._queue.qsize())
+            metrics.observe("batcher_batch_size", len(batch))
+            metrics.inc("batcher_batches_total")
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[tuple, object, asyncio.Future]]):
+        # Во время горячей замены в пачке бывают запросы к старой и новой модели: вызов модели на каждую
+        current = self._get_model()
+        groups: Dict[int, Tuple[object, List[Tuple[tuple, asyncio.Future]]]] = {}
+        for row, model, future in batch:
+            model = model if model is not None else current
+            groups.setdefault(id(model), (model, []))[1].append((row, future))
+        for model, requests in groups.values():
+            await self._infer(model, requests)
+
+    async def _infer(self, model, requests: List[Tuple[tuple, asyncio.Future]]):
+        started = time.perf_counter()
+        try:
+            executor = await get_inference_executor()
+            results = await executor.run(predict_raw_batch, [row for row, _ in requests], model)
+        except Exception as e:
+            logger.error(f"Batch inference failed: size={len(requests)}, error={e}")
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        metrics.observe("batcher_inference_ms", (time.perf_counter() - started) * 1000)
+        for (_, future), result in zip(requests, results):
+            # Вызывающий мог отменить ожидание (например, клиент отключился)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# inline — в event loop, thread — пул потоков, process — пул процессов с моделью в каждом
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "inline")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+MODES = ("inline", "thread", "process")
+
+# Модель, загруженная в дочернем процессе пула
+_child_model = None
+
+
+def _init_child(model_path: str):
+    global _child_model
+    from model import load_scorer
+    _child_model = load_scorer(model_path)
+
+
+def _warmup_child() -> int:
+    return os.getpid()
+
+
+def _call_with_child_model(fn: Callable, payload: Any):
+    return fn(payload, _child_model)
+
+
+class InferenceExecutor:
+    """
+    Запускает инференс вида fn(payload, model) в выбранном режиме.
+    В режиме process модель из аргумента не передаётся: каждый дочерний
+    процесс загружает свою копию при старте, через границу процессов идёт только payload.
+    """
+
+    def __init__(self, mode: str = INFERENCE_EXECUTOR, workers: int = INFERENCE_WORKERS, model_path: Optional[str] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown inference executor mode: {mode}, expected one of {MODES}")
+        self.mode = mode
+        self.workers = workers
+        self.model_path = model_path
+        self._pool: Optional[Executor] = None
+
+    def _create_process_pool(self) -> ProcessPoolExecutor:
+        if self.model_path is None:
+            from model import MODEL_PATH
+            self.model_path = MODEL_PATH
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_child,
+            initargs=(self.model_path,),
+        )
+
+    async def _warmup(self, pool: Executor):
+        # Поднимаем все процессы заранее, чтобы первый запрос не платил за загрузку модели
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _warmup_child) for _ in range(self.workers)))
+
+    async def start(self):
+        if self.mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        elif self.mode == "process":
+            self._pool = self._create_process_pool()
+            await self._warmup(self._pool)
+        logger.info(f"Inference executor started: mode={self.mode}, workers={self.workers}")
+
+    async def reload(self, model_path: str):
+        """
+        Подменяет модель в дочерних процессах: новый пул прогревается целиком,
+        и только потом заменяет старый. Задачи, уже отправленные в старый пул, дорабатывают.
+        """
+        self.model_path = model_path
+        if self.mode != "process":
+            return
+        pool = self._create_process_pool()
+        await self._warmup(pool)
+        old_pool, self._pool = self._pool, pool
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+
+    async def run(self, fn: Callable[[Any, Any], Any], payload: Any, model) -> Any:
+        if self._pool is None:
+            return fn(payload, model)
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            return await loop.run_in_executor(self._pool, _call_with_child_model, fn, payload)
+        return await loop.run_in_executor(self._pool, fn, payload, model)
+
+    async def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            # Ждём выполняющиеся задачи в отдельном потоке: shutdown(wait=True) заблокировал бы event loop
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+
+_executor: Optional[InferenceExecutor] = None
+
+
+async def get_inference_executor(model_path: Optional[str] = None) -> InferenceExecutor:
+    global _executor
+    if _executor is None:
+        _executor = InferenceExecutor(model_path=model_path)
+        await _executor.start()
+    return _executor
+
+
+async def close_inference_executor():
+    global _executor
+    if _executor is not None:
+        await _executor.close()
+        _executor = None
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from app import metrics
+from app.inference.executor import get_inference_executor
+from model import MODEL_PATH, load_scorer
+from services.predict_service import FEATURE_SCALE
+
+logger = logging.getLogger(__name__)
+
+# Период проверки артефакта на изменения; 0 — не следить (только ручной reload)
+MODEL_WATCH_INTERVAL_SEC = float(os.getenv("MODEL_WATCH_INTERVAL_SEC", "0"))
+# Запасной артефакт на случай, если основной отсутствует или не прошёл проверку
+MODEL_FALLBACK_PATH = os.getenv("MODEL_FALLBACK_PATH") or None
+
+# Контрольные входы для проверки новой модели перед подменой
+_PROBE_FEATURES = np.array([
+    [0.0, 0.0, 0.0, 0.0],
+    [1.0, 0.5, 0.5, 0.5],
+    [1.0, 1.0, 1.0, 1.0],
+    [0.0, 10.0, 100.0, 10.0],
+])
+
+
+def validate_model(model):
+    """Проверяет, что модель принимает наши признаки и отдаёт корректные вероятности."""
+    if model.n_features != FEATURE_SCALE.size:
+        raise ValueError(f"Model expects {model.n_features} features, service provides {FEATURE_SCALE.size}")
+    labels, probabilities = model.predict_with_proba(_PROBE_FEATURES)
+    if labels.shape != (len(_PROBE_FEATURES),) or probabilities.shape != (len(_PROBE_FEATURES),):
+        raise ValueError("Model returned outputs of unexpected shape")
+    if not np.all(np.isfinite(probabilities)) or np.any((probabilities < 0) | (probabilities > 1)):
+        raise ValueError("Model returned invalid probabilities")
+
+
+class ModelManager:
+    """
+    Держит текущую модель и подменяет её без рестарта процесса.
+    Новая модель загружается и проверяется в фоне; подмена — одно присваивание ссылки,
+    поэтому запросы, уже взявшие старую модель, спокойно дорабатывают на ней.
+    """
+
+    def __init__(
+        self,
+        path: str = MODEL_PATH,
+        loader: Callable[[str], object] = load_scorer,
+        on_swap: Optional[Callable[[object], None]] = None,
+        fallback_path: Optional[str] = MODEL_FALLBACK_PATH,
+    ):
+        self.path = path
+        self.fallback_path = fallback_path
+        self.model = None
+        self.loaded_path: Optional[str] = None
+        self._loader = loader
+        self._on_swap = on_swap
+        self._mtime: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.model.version if self.model is not None else None
+
+    def load(self):
+        """
+        Первичная синхронная загрузка при старте процесса.
+        Если основной артефакт недоступен, пробует запасной; иначе пробрасывает ошибку.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            model = self._loader(self.path)
+            validate_model(model)
+            self.loaded_path = self.path
+        except Exception as e:
+            if self.fallback_path is None:
+                raise
+            logger.warning(f"Failed to load model from {self.path}: {e}; using fallback {self.fallback_path}")
+            # mtime не запоминаем: как только появится основной артефакт, watcher его подхватит
+            mtime = None
+            model = self._loader(self.fallback_path)
+            validate_model(model)
+            self.loaded_path = self.fallback_path
+            metrics.inc("model_fallback_loads_total")
+        self._swap(model, mtime)
+        return model
+
+    async def reload(self, force: bool = False) -> bool:
+        """Перечитывает артефакт, если он изменился. Возвращает True, если модель подменена."""
+        async with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            if not force and mtime == self._mtime:
+                return False
+            try:
+                model = await asyncio.to_thread(self._loader, self.path)
+                validate_model(model)
+            except Exception as e:
+                metrics.inc("model_reload_failures_total")
+                logger.error(f"Model reload rejected: path={self.path}, error={e}")
+                raise
+            if not force and model.version == self.version:
+                self._mtime = mtime
+                return False
+            # В режиме process модель живёт в дочерних процессах — перезапускаем их
+            executor = await get_inference_executor()
+            await executor.reload(self.path)
+            self.loaded_path = self.path
+            self._swap(model, mtime)
+            metrics.inc("model_reloads_total")
+            return True
+
+    def _swap(self, model, mtime: Optional[int]):
+        previous = self.version
+        self.model = model
+        self._mtime = mtime
+        if self._on_swap is not None:
+            self._on_swap(model)
+        metrics.set_info("model_version", model.version)
+        metrics.set_gauge("model_loaded_at", time.time())
+        logger.info(f"Model swapped: {previous} -> {model.version}")
+
+    async def start_watching(self, interval: float = MODEL_WATCH_INTERVAL_SEC):
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload()
+            except FileNotFoundError:
+                logger.warning(f"Model artifact not found: {self.path}")
+            except Exception:
+                # Ошибка уже залогирована в reload; остаёмся на текущей модели
+                pass
@@ -0,0 +1,37 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class LogisticScorer:
+    """
+    Скоринг бинарной логистической регрессии на чистом NumPy.
+    Коэффициенты извлекаются один раз при загрузке; в горячем пути нет sklearn
+    и его валидации входа — только скалярное произведение и сигмоида.
+    """
+
+    def __init__(self, coef, intercept: float, version: str = "unknown"):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64).ravel()
+        self.intercept = float(intercept)
+        self.version = version
+
+    @classmethod
+    def from_sklearn(cls, model, version: str = "unknown") -> "LogisticScorer":
+        """Строит скорер из обученной sklearn LogisticRegression."""
+        classes = list(getattr(model, "classes_", []))
+        if classes != [0, 1] or model.coef_.shape[0] != 1:
+            raise ValueError(f"Expected binary classifier with classes [0, 1], got {classes}")
+        return cls(model.coef_[0], model.intercept_[0], version=version)
+
+    @property
+    def n_features(self) -> int:
+        return self.coef.size
+
+    def predict_with_proba(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Возвращает (метки, вероятности класса 1) для матрицы признаков (n, n_features).
+        Метка совпадает с LogisticRegression.predict: decision > 0.
+        """
+        decision = features @ self.coef + self.intercept
+        # Устойчивая сигмоида: 1 / (1 + exp(-z)) без переполнения при больших |z|
+        return decision > 0, np.exp(-np.logaddexp(0.0, -decision))
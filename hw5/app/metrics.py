@@ -0,0 +1,63 @@
+import threading
+from typing import Dict
+
+# Простейший in-process реестр метрик: счётчики, gauges и сводки (count/sum/min/max).
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, Dict[str, float]] = {}
+_info: Dict[str, str] = {}
+
+
+def inc(name: str, value: float = 1.0) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0.0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = float(value)
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            _summaries[name] = {"count": 1, "sum": value, "min": value, "max": value}
+            return
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["min"] = min(summary["min"], value)
+        summary["max"] = max(summary["max"], value)
+
+
+def set_info(name: str, value: str) -> None:
+    with _lock:
+        _info[name] = value
+
+
+def get_counter(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0.0)
+
+
+def snapshot() -> dict:
+    with _lock:
+        summaries = {
+            name: {**s, "avg": s["sum"] / s["count"]}
+            for name, s in _summaries.items()
+        }
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": summaries,
+            "info": dict(_info),
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+        _info.clear()
@@ -1,35 +1,86 @@
-from database import get_db_pool
+import json
 from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
 
+from app.clients.kafka import MODERATION_MESSAGE_VERSION
+from database import get_db_pool, warm_statement
 
-async def create_moderation_task(item_id):
+_TASK_BY_ID = (
+    "SELECT id, item_id, status, is_violation, probability, error_message, created_at, processed_at "
+    "FROM moderation_results WHERE id = $1"
+)
+_PENDING_TASK_BY_ITEM_ID = (
+    "SELECT id FROM moderation_results WHERE item_id = $1 AND status = 'pending' ORDER BY created_at DESC LIMIT 1"
+)
+
+# /moderation_result и воркер: готовим планы на каждом соединении
+warm_statement(_TASK_BY_ID, 0)
+warm_statement(_PENDING_TASK_BY_ITEM_ID, 0)
+
+
+async def enqueue_moderation_task(item_id: int, topic: str) -> Optional[int]:
+    """
+    Создаёт задачу модерации и сообщение для Kafka в outbox одним запросом — атомарно и за один
+    round trip. Возвращает task_id или None, если объявления нет. Отправляет сообщение relay
+    (app/workers/outbox_relay.py); схема сообщения — MODERATION_MESSAGE_VERSION.
+    """
     pool = await get_db_pool()
     async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "INSERT INTO moderation_results (item_id, status) VALUES ($1, 'pending') RETURNING id",
-            item_id
+        return await conn.fetchval(
+            """WITH task AS (
+                   INSERT INTO moderation_results (item_id, status)
+                   SELECT $1, 'pending' WHERE EXISTS (SELECT 1 FROM items WHERE item_id = $1)
+                   RETURNING id, item_id
+               ), message AS (
+                   INSERT INTO moderation_outbox (topic, payload)
+                   SELECT $2, jsonb_build_object(
+                       'version', $3::int,
+                       'task_id', id,
+                       'item_id', item_id,
+                       'timestamp', to_char(clock_timestamp() AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')
+                   )
+                   FROM task
+               )
+               SELECT id FROM task""",
+            item_id, topic, MODERATION_MESSAGE_VERSION
         )
-        return row["id"]
+
+
+async def drain_outbox(limit: int, send: Callable[[List[Tuple[str, dict]]], Awaitable]) -> List[dict]:
+    """
+    Забирает до limit самых старых сообщений outbox, отдаёт их send пачкой и удаляет в той же
+    транзакции. Упал send — транзакция откатывается, сообщения уйдут в следующий раз (at-least-once).
+    SKIP LOCKED: несколько relay не отправляют одно сообщение одновременно.
+    Возвращает отправленные строки: id, topic и age_sec — сколько сообщение ждало в outbox.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch(
+                """DELETE FROM moderation_outbox
+                   WHERE id IN (
+                       SELECT id FROM moderation_outbox ORDER BY id LIMIT $1 FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING id, topic, payload, EXTRACT(EPOCH FROM LOCALTIMESTAMP - created_at)::float AS age_sec""",
+                limit
+            )
+            if rows:
+                rows = sorted(rows, key=lambda row: row["id"])
+                await send([(row["topic"], json.loads(row["payload"])) for row in rows])
+    return [{"id": row["id"], "topic": row["topic"], "age_sec": row["age_sec"]} for row in rows]
 
 
 async def get_moderation_task(task_id):
     pool = await get_db_pool()
     async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "SELECT id, item_id, status, is_violation, probability, error_message, created_at, processed_at "
-            "FROM moderation_results WHERE id = $1",
-            task_id
-        )
+        row = await conn.fetchrow(_TASK_BY_ID, task_id)
         return dict(row) if row else None
 
 
 async def get_pending_task_by_item_id(item_id):
     pool = await get_db_pool()
     async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "SELECT id FROM moderation_results WHERE item_id = $1 AND status = 'pending' ORDER BY created_at DESC LIMIT 1",
-            item_id
-        )
+        row = await conn.fetchrow(_PENDING_TASK_BY_ITEM_ID, item_id)
         return row["id"] if row else None
 
 
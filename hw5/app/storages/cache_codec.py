@@ -0,0 +1,123 @@
+"""
+Бинарный формат значений кеша.
+
+Запись: байт версии формата, байт типа значения, мягкий TTL и стоимость пересчёта (float64),
+затем поля модели фиксированной раскладкой. Значения пишем только мы сами, поэтому на чтении
+модель собирается без повторной валидации pydantic (см. _trusted).
+Записи в JSON (прежний формат) по-прежнему читаются — через обычную валидацию.
+"""
+import json
+import math
+import struct
+from typing import Any, NamedTuple, Optional
+
+from models.schemas import ModerationResultResponse, PredictResponse
+
+FORMAT_VERSION = 1
+
+_TAG_PREDICTION = 1
+_TAG_MODERATION = 2
+
+# версия, тип, soft_expires_at, delta
+_HEADER = struct.Struct("<BBdd")
+# is_violation, probability
+_PREDICTION = struct.Struct("<?d")
+# task_id, is_violation (0/1, 2 — None), probability (NaN — None), длины status и error_message (-1 — None)
+_MODERATION = struct.Struct("<qBdHi")
+
+
+_FIELDS_SET = {cls: set(cls.model_fields) for cls in (PredictResponse, ModerationResultResponse)}
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    soft_expires_at: float
+    # Сколько секунд занял пересчёт значения
+    delta: float
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def encode_entry(entry: CacheEntry) -> bytes:
+    value = entry.value
+    if isinstance(value, PredictResponse):
+        header = _HEADER.pack(FORMAT_VERSION, _TAG_PREDICTION, entry.soft_expires_at, entry.delta)
+        return header + _PREDICTION.pack(value.is_violation, value.probability)
+    if isinstance(value, ModerationResultResponse):
+        header = _HEADER.pack(FORMAT_VERSION, _TAG_MODERATION, entry.soft_expires_at, entry.delta)
+        status = value.status.encode()
+        error = value.error_message.encode() if value.error_message is not None else b""
+        body = _MODERATION.pack(
+            value.task_id,
+            2 if value.is_violation is None else int(value.is_violation),
+            math.nan if value.probability is None else value.probability,
+            len(status),
+            -1 if value.error_message is None else len(error),
+        )
+        return header + body + status + error
+    raise TypeError(f"Unsupported cache value type: {type(value).__name__}")
+
+
+def encode_entry_json(entry: CacheEntry) -> str:
+    """Прежний JSON-формат: для раскатки, пока часть реплик ещё не читает бинарный."""
+    return json.dumps({
+        "value": entry.value.model_dump(),
+        "soft_expires_at": entry.soft_expires_at,
+        "delta": entry.delta,
+    })
+
+
+def _decode_json(raw, model_cls) -> CacheEntry:
+    data = json.loads(raw)
+    if "soft_expires_at" not in data:
+        # Голый JSON модели без мягкого TTL
+        return CacheEntry(model_cls(**data), math.inf, 0.0)
+    return CacheEntry(model_cls(**data["value"]), data["soft_expires_at"], data["delta"])
+
+
+def _trusted(model_cls, fields: dict):
+    """
+    То же, что model_cls.model_construct(**fields) для полного набора полей, но без его
+    накладных расходов (разбор алиасов, дефолты): в pydantic 2 он медленнее самой валидации.
+    """
+    obj = model_cls.__new__(model_cls)
+    object.__setattr__(obj, "__dict__", fields)
+    object.__setattr__(obj, "__pydantic_fields_set__", _FIELDS_SET[model_cls])
+    object.__setattr__(obj, "__pydantic_extra__", None)
+    object.__setattr__(obj, "__pydantic_private__", None)
+    return obj
+
+
+def _optional_bool(flag: int) -> Optional[bool]:
+    return None if flag == 2 else bool(flag)
+
+
+def decode_entry(raw, model_cls) -> CacheEntry:
+    """Бинарная запись — без валидации; JSON (str или bytes, начинается с '{') — через pydantic."""
+    if isinstance(raw, str) or raw[:1] == b"{":
+        return _decode_json(raw, model_cls)
+
+    version, tag, soft_expires_at, delta = _HEADER.unpack_from(raw)
+    if version != FORMAT_VERSION:
+        raise UnsupportedFormat(f"Unknown cache format version {version}")
+    offset = _HEADER.size
+    if tag == _TAG_PREDICTION and model_cls is PredictResponse:
+        is_violation, probability = _PREDICTION.unpack_from(raw, offset)
+        value = _trusted(PredictResponse, {"is_violation": is_violation, "probability": probability})
+    elif tag == _TAG_MODERATION and model_cls is ModerationResultResponse:
+        task_id, is_violation, probability, status_len, error_len = _MODERATION.unpack_from(raw, offset)
+        offset += _MODERATION.size
+        status = raw[offset:offset + status_len].decode()
+        offset += status_len
+        value = _trusted(ModerationResultResponse, {
+            "task_id": task_id,
+            "status": status,
+            "is_violation": _optional_bool(is_violation),
+            "probability": None if math.isnan(probability) else probability,
+            "error_message": None if error_len < 0 else raw[offset:offset + error_len].decode(),
+        })
+    else:
+        raise UnsupportedFormat(f"Cache entry of type {tag} cannot be read as {model_cls.__name__}")
+    return CacheEntry(value, soft_expires_at, delta)
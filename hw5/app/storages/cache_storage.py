@@ -1,54 +1,780 @@
-import json
-import hashlib
-from app.clients.redis_client import get_redis
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+import redis.asyncio as aioredis
+from app import metrics
+from app.clients.redis_client import (
+    REDIS_CLIENT_TRACKING,
+    REDIS_TRACKING_PREFIXES,
+    InvalidationTracker,
+    get_redis,
+)
+from app.storages.circuit_breaker import CircuitBreaker
+from app.storages.cache_codec import CacheEntry, decode_entry, encode_entry, encode_entry_json
+from app.storages.item_filter import ITEM_FILTER_ENABLED, item_filter
+from app.storages.local_cache import LocalCache, record_lookup
 from models.schemas import PredictResponse, ModerationResultResponse
 
+logger = logging.getLogger(__name__)
+
 # TTL 1 час
 TTL = 3600
 PREDICTION_CACHE_TTL_SEC = TTL
 
 
-def _key_req(data):
-    return "prediction:req:" + hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+def _ttl_from_env(namespace: str) -> Tuple[float, int]:
+    hard = int(os.getenv(f"CACHE_{namespace.upper()}_HARD_TTL_SEC", str(TTL)))
+    soft = float(os.getenv(f"CACHE_{namespace.upper()}_SOFT_TTL_SEC", str(hard * 5 / 6)))
+    return min(soft, hard), hard
+
+
+# Мягкий и жёсткий TTL по пространствам имён: request (/predict), item (/simple_predict), task (/moderation_result).
+# После мягкого TTL значение ещё отдаётся, но пересчитывается в фоне; по жёсткому Redis удаляет ключ.
+CACHE_TTLS: Dict[str, Tuple[float, int]] = {ns: _ttl_from_env(ns) for ns in ("request", "item", "task")}
+# XFetch: вероятностное обновление до мягкого TTL, тем раньше, чем дороже пересчёт; 0 — выключить
+CACHE_XFETCH_BETA = float(os.getenv("CACHE_XFETCH_BETA", "1.0"))
+# Формат записи значений: binary (см. cache_codec) или json — пока не все реплики читают binary
+CACHE_VALUE_FORMAT = os.getenv("CACHE_VALUE_FORMAT", "binary")
+
+# L1: in-process кеш перед Redis; 0 в L1_CACHE_MAX_SIZE отключает его
+L1_CACHE_MAX_SIZE = int(os.getenv("L1_CACHE_MAX_SIZE", "10000"))
+L1_CACHE_TTL_SEC = float(os.getenv("L1_CACHE_TTL_SEC", "30"))
+# Канал, через который реплики узнают об удалённых ключах
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Негативный кеш: «такого объявления нет» — коротко, чтобы созданное позже быстро стало видно
+NEGATIVE_CACHE_TTL_SEC = int(os.getenv("NEGATIVE_CACHE_TTL_SEC", "30"))
+# Redis — только ускоритель: медленный или недоступный Redis не должен добавлять задержку.
+# Каждая операция ограничена по времени; после серии ошибок breaker пускает запросы в обход Redis.
+REDIS_OP_TIMEOUT_MS = int(os.getenv("REDIS_OP_TIMEOUT_MS", "50"))
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "5"))
+REDIS_BREAKER_RESET_SEC = float(os.getenv("REDIS_BREAKER_RESET_SEC", "5"))
+# Пакетные операции (MGET, pipeline на тысячи ключей) получают добавку к таймауту на каждый ключ
+# и свой breaker: медленные большие пачки не должны отключать Redis для одиночных запросов
+REDIS_OP_TIMEOUT_PER_KEY_US = float(os.getenv("REDIS_OP_TIMEOUT_PER_KEY_US", "20"))
+# Сколько ключей продавца удалять за один pipeline
+SELLER_INVALIDATION_BATCH = int(os.getenv("SELLER_INVALIDATION_BATCH", "500"))
+
+_local = {
+    "prediction": LocalCache("prediction", L1_CACHE_MAX_SIZE, L1_CACHE_TTL_SEC),
+    "moderation": LocalCache("moderation", L1_CACHE_MAX_SIZE, L1_CACHE_TTL_SEC),
+    "missing": LocalCache("missing", L1_CACHE_MAX_SIZE, min(L1_CACHE_TTL_SEC, NEGATIVE_CACHE_TTL_SEC)),
+}
+_invalidation_task: Optional[asyncio.Task] = None
+# Инвалидации, которые не удалось выполнить из-за недоступного Redis: досылаются в фоне (DEL + PUBLISH)
+_pending_keys: Set[str] = set()
+# Продавцы, чьи предсказания не удалось сбросить целиком (см. invalidate_seller_predictions)
+_pending_sellers: Set[int] = set()
+# Объявления, для которых не удалось узнать версии модели в кеше (см. delete_cached_predictions_for_items)
+_pending_items: Set[int] = set()
+# Версии модели, под которыми эта реплика читала или писала prediction:item:*
+_item_versions: Set[str] = set()
+_retry_task: Optional[asyncio.Task] = None
+_tracker: Optional[InvalidationTracker] = None
+_breaker = CircuitBreaker("redis", REDIS_BREAKER_FAILURES, REDIS_BREAKER_RESET_SEC)
+_bulk_breaker = CircuitBreaker("redis_bulk", REDIS_BREAKER_FAILURES, REDIS_BREAKER_RESET_SEC)
+
+# Single-flight: на промахе ключ пересчитывает одна корутина, остальные ждут её результат.
+# При SINGLE_FLIGHT_LOCK_TTL_MS > 0 — ещё и одна реплика (короткий lock в Redis).
+SINGLE_FLIGHT_LOCK_TTL_MS = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_MS", "0"))
+SINGLE_FLIGHT_POLL_MS = 20
+_inflight: Dict[str, asyncio.Task] = {}
+_refresh_tasks: Set[asyncio.Task] = set()
+# Момент начала пересчёта: по нему setter измеряет его стоимость для XFetch
+_compute_started: ContextVar[Optional[float]] = ContextVar("cache_compute_started", default=None)
+
+# Удаляем lock, только если он всё ещё наш
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CacheUnavailable(Exception):
+    """Redis не ответил вовремя, ответил ошибкой или обходится из-за разомкнутого breaker."""
+
+
+def _op_timeout(keys: int) -> float:
+    return REDIS_OP_TIMEOUT_MS / 1000 + max(keys - 1, 0) * REDIS_OP_TIMEOUT_PER_KEY_US / 1e6
+
+
+async def _redis(op: Callable[[aioredis.Redis], Awaitable], keys: int = 1):
+    """
+    Выполняет op(client) с таймаутом и через breaker; любая неудача — CacheUnavailable.
+    keys — сколько ключей затрагивает op: от него зависят таймаут и breaker (см. REDIS_OP_TIMEOUT_PER_KEY_US).
+    """
+    breaker = _breaker if keys <= 1 else _bulk_breaker
+    if not breaker.allow():
+        metrics.inc("cache_redis_bypassed_total")
+        raise CacheUnavailable("circuit breaker is open")
+    try:
+        result = await asyncio.wait_for(op(await get_redis()), _op_timeout(keys))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        metrics.inc("cache_redis_timeouts_total" if isinstance(e, asyncio.TimeoutError) else "cache_redis_errors_total")
+        raise CacheUnavailable(str(e) or type(e).__name__) from e
+    breaker.record_success()
+    return result
+
+
+async def _try_redis(op: Callable[[aioredis.Redis], Awaitable], default=None, keys: int = 1):
+    """Для чтений и записей кеша: при недоступном Redis работаем как без кеша."""
+    try:
+        return await _redis(op, keys)
+    except CacheUnavailable as e:
+        logger.debug("Redis skipped: %s", e)
+        return default
 
 
-def _key_item(item_id):
-    return f"prediction:item:{item_id}"
+def _key_features(features: tuple, model_version: str):
+    # Канонический вектор признаков короче любого хеша, поэтому кладём его в ключ как есть
+    is_verified, images_qty, description_length, category = features
+    return f"prediction:feat:{model_version}:{int(is_verified)}:{images_qty}:{description_length}:{category}"
+
+
+def _key_item(item_id, model_version: str):
+    # Версия модели в ключе, как у prediction:feat: после горячей замены старые вердикты не отдаются
+    return f"prediction:item:{model_version}:{item_id}"
 
 
 def _key_task(task_id):
     return f"moderation:task:{task_id}"
 
 
-async def get_cached_prediction_by_request(request_data: dict):
-    r = await get_redis()
-    raw = await r.get(_key_req(request_data))
-    return PredictResponse(**json.loads(raw)) if raw else None
+def _key_missing(item_id):
+    return f"missing:item:{item_id}"
+
+
+def _key_seller_items(seller_id):
+    # Индекс seller_id -> ключи prediction:item:* его объявлений, которые сейчас в кеше
+    return f"index:seller_items:{seller_id}"
+
+
+# Индекс версий модели, под которыми в кеше есть prediction:item:* (sorted set: версия -> когда истекут
+# её самые свежие ключи). Закрытие объявления и ingest не знают модель, а удалить нужно ключи всех версий
+_KEY_ITEM_VERSIONS = "index:item_versions"
+
+
+_TTL_NAMESPACES = {"prediction:feat": "request", "prediction:item": "item", "moderation:task": "task"}
+
+
+def _ttl_namespace(key: str) -> str:
+    return _TTL_NAMESPACES[":".join(key.split(":", 2)[:2])]
+
+
+def _local_for(key: str) -> LocalCache:
+    return _local[key.split(":", 1)[0]]
+
+
+def clear_local_caches():
+    for cache in _local.values():
+        cache.clear()
+
+
+def _invalidate_local(keys: Optional[List[str]]):
+    """Выкидывает ключи из L1; None — сбросить всё."""
+    if keys is None:
+        clear_local_caches()
+        return
+    for key in keys:
+        local = _local.get(key.split(":", 1)[0])
+        if local is not None:
+            local.invalidate(key)
+        if key.startswith("missing:item:"):
+            # Объявление создали на другой реплике — его нужно знать и фильтру существования
+            item_filter.add(int(key.rsplit(":", 1)[1]))
+
+
+def _encode(key: str, value, delta: Optional[float] = None) -> Tuple[CacheEntry, Union[bytes, str], int]:
+    """delta — стоимость пересчёта для XFetch; None — время с начала пересчёта (см. _timed), если он идёт."""
+    soft, hard = CACHE_TTLS[_ttl_namespace(key)]
+    if delta is None:
+        started = _compute_started.get()
+        delta = time.monotonic() - started if started is not None else 0.0
+    entry = CacheEntry(value, time.time() + soft, delta)
+    raw = encode_entry_json(entry) if CACHE_VALUE_FORMAT == "json" else encode_entry(entry)
+    return entry, raw, hard
+
+
+def _decode(raw: Union[bytes, str], model_cls) -> Optional[CacheEntry]:
+    try:
+        return decode_entry(raw, model_cls)
+    except Exception as e:
+        # Нечитаемую запись (например, из более нового формата) считаем промахом
+        metrics.inc("cache_decode_errors_total")
+        logger.warning("Failed to decode cache entry: %s", e)
+        return None
+
+
+def _should_refresh(key: str, entry: CacheEntry) -> bool:
+    now = time.time()
+    namespace = _ttl_namespace(key)
+    if now >= entry.soft_expires_at:
+        metrics.inc(f"cache_{namespace}_stale_hits")
+        return True
+    # XFetch (Vattani et al.): -log(U) ~ Exp(1), сдвигаем «сейчас» вперёд на delta * beta * Exp(1)
+    if CACHE_XFETCH_BETA > 0 and entry.delta > 0:
+        if now - entry.delta * CACHE_XFETCH_BETA * math.log(1.0 - random.random()) >= entry.soft_expires_at:
+            metrics.inc(f"cache_{namespace}_early_refreshes")
+            return True
+    return False
+
+
+async def _timed(compute: Callable[[], Awaitable]):
+    _compute_started.set(time.monotonic())
+    return await compute()
+
+
+def _schedule_refresh(key: str, refresh: Callable[[], Awaitable]):
+    """Фоновый пересчёт ключа; если ключ уже пересчитывается, ничего не делаем."""
+    if key in _inflight:
+        return
+
+    async def run():
+        try:
+            await single_flight(key, refresh)
+            metrics.inc("cache_refreshes_total")
+        except Exception as e:
+            metrics.inc("cache_refresh_failures_total")
+            logger.warning("Background cache refresh failed: key=%s, error=%s", key, e)
+
+    task = asyncio.ensure_future(run())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _get_entry(key: str, model_cls) -> Optional[CacheEntry]:
+    local = _local_for(key)
+    entry = local.get(key)
+    if entry is not None:
+        return entry
+    if key in _pending_keys:
+        # Удаление ещё не дошло до Redis — там лежит устаревшее значение
+        return None
+    token = local.read_token()
+    try:
+        raw = await _redis(lambda r: r.get(key))
+    except CacheUnavailable:
+        return None
+    record_lookup("redis", local.namespace, raw is not None)
+    if not raw:
+        return None
+    entry = _decode(raw, model_cls)
+    if entry is not None:
+        local.set_if_fresh(key, entry, token)
+    return entry
+
+
+async def _get(key: str, model_cls, refresh: Optional[Callable[[], Awaitable]] = None):
+    """
+    Значение из L1/Redis. Если оно устарело по мягкому TTL (или XFetch решил обновить заранее),
+    всё равно отдаём его, а refresh() запускаем в фоне.
+    """
+    entry = await _get_entry(key, model_cls)
+    if entry is None:
+        return None
+    if refresh is not None and _should_refresh(key, entry):
+        _schedule_refresh(key, refresh)
+    return entry.value
+
+
+async def _set(key: str, value):
+    entry, raw, hard_ttl = _encode(key, value)
+    _local_for(key).set(key, entry)
+    await _try_redis(lambda r: r.setex(key, hard_ttl, raw))
+
+
+async def _get_entries(keys: List[str], model_cls) -> List[Optional[CacheEntry]]:
+    """L1 для каждого ключа, затем один MGET на оставшиеся; None на месте промахов. Ключи — одного пространства имён."""
+    local = _local_for(keys[0])
+    entries = [local.get(key) for key in keys]
+    missing = [i for i, entry in enumerate(entries) if entry is None and keys[i] not in _pending_keys]
+    if missing:
+        token = local.read_token()
+        raws = await _try_redis(lambda r: r.mget([keys[i] for i in missing]), [None] * len(missing), len(missing))
+        for i, raw in zip(missing, raws):
+            record_lookup("redis", local.namespace, raw is not None)
+            entries[i] = _decode(raw, model_cls) if raw else None
+            if entries[i] is not None:
+                local.set_if_fresh(keys[i], entries[i], token)
+    return entries
+
+
+async def get_cached_prediction_by_features(
+    features: tuple, model_version: str, refresh: Optional[Callable[[], Awaitable]] = None
+):
+    """Кеш /predict: ключ — сырые признаки модели и версия модели, а не весь запрос."""
+    return await _get(_key_features(features, model_version), PredictResponse, refresh)
+
+
+async def set_cached_prediction_by_features(features: tuple, model_version: str, result: PredictResponse):
+    await _set(_key_features(features, model_version), result)
+
+
+async def get_cached_predictions_by_features(
+    features_rows: List[tuple],
+    model_version: str,
+    refresh: Optional[Callable[[List[tuple]], Awaitable]] = None,
+) -> List[Optional[PredictResponse]]:
+    """
+    L1 для каждого ключа, затем один MGET на оставшиеся; None на месте промахов.
+    Устаревшие строки отдаются как есть и пересчитываются одним фоновым вызовом refresh(rows).
+    """
+    if not features_rows:
+        return []
+    keys = [_key_features(features, model_version) for features in features_rows]
+    entries = await _get_entries(keys, PredictResponse)
+    if refresh is not None:
+        stale = {
+            keys[i]: features_rows[i]
+            for i, entry in enumerate(entries)
+            if entry is not None and keys[i] not in _inflight and _should_refresh(keys[i], entry)
+        }
+        if stale:
+            rows = list(stale.values())
+            _schedule_refresh(f"prediction:batch:{model_version}:{hash(tuple(rows))}", lambda: refresh(rows))
+    return [entry.value if entry is not None else None for entry in entries]
+
 
+async def set_cached_predictions_by_features(
+    items: List[Tuple[tuple, PredictResponse]], model_version: str, delta: Optional[float] = None
+):
+    """
+    Записывает пачку результатов одним pipeline. delta — сколько считалась пачка: без single_flight
+    время пересчёта не измерить, а с нулевым delta XFetch не обновляет записи заранее.
+    """
+    if not items:
+        return
+    local = _local["prediction"]
+    writes = []
+    for features, result in items:
+        key = _key_features(features, model_version)
+        entry, raw, hard_ttl = _encode(key, result, delta)
+        local.set(key, entry)
+        writes.append((key, hard_ttl, raw))
 
-async def set_cached_prediction_by_request(request_data: dict, result: PredictResponse):
-    await (await get_redis()).setex(_key_req(request_data), TTL, result.model_dump_json())
+    def write(r):
+        pipe = r.pipeline(transaction=False)
+        for key, hard_ttl, raw in writes:
+            pipe.setex(key, hard_ttl, raw)
+        return pipe.execute()
 
+    await _try_redis(write, keys=len(writes))
 
-async def get_cached_prediction_by_item(item_id: int):
-    r = await get_redis()
-    raw = await r.get(_key_item(item_id))
-    return PredictResponse(**json.loads(raw)) if raw else None
 
+async def get_cached_prediction_by_item(
+    item_id: int, model_version: str, refresh: Optional[Callable[[], Awaitable]] = None
+):
+    _item_versions.add(model_version)
+    return await _get(_key_item(item_id, model_version), PredictResponse, refresh)
 
-async def set_cached_prediction_by_item(item_id: int, result: PredictResponse):
-    await (await get_redis()).setex(_key_item(item_id), TTL, result.model_dump_json())
 
+async def get_cached_predictions_by_items(
+    item_ids: List[int],
+    model_version: str,
+    refresh: Optional[Callable[[List[int]], Awaitable]] = None,
+) -> List[Optional[PredictResponse]]:
+    """
+    Как get_cached_predictions_by_features, но по item_id: L1, затем один MGET.
+    Устаревшие объявления пересчитываются одним фоновым вызовом refresh(item_ids).
+    """
+    if not item_ids:
+        return []
+    _item_versions.add(model_version)
+    keys = [_key_item(item_id, model_version) for item_id in item_ids]
+    entries = await _get_entries(keys, PredictResponse)
+    if refresh is not None:
+        stale = [
+            item_id
+            for item_id, key, entry in zip(item_ids, keys, entries)
+            if entry is not None and key not in _inflight and _should_refresh(key, entry)
+        ]
+        if stale:
+            _schedule_refresh(f"prediction:items:{model_version}:{hash(tuple(stale))}", lambda: refresh(stale))
+    return [entry.value if entry is not None else None for entry in entries]
 
-async def get_cached_moderation_result(task_id: int):
-    r = await get_redis()
-    raw = await r.get(_key_task(task_id))
-    return ModerationResultResponse(**json.loads(raw)) if raw else None
+
+def _index_seller_items(pipe, seller_id: int, keys: List[str], hard_ttl: int):
+    index = _key_seller_items(seller_id)
+    pipe.sadd(index, *keys)
+    # Индекс живёт не дольше самых свежих своих ключей
+    pipe.expire(index, hard_ttl)
+
+
+def _index_item_version(pipe, model_version: str, hard_ttl: int):
+    _item_versions.add(model_version)
+    now = time.time()
+    pipe.zadd(_KEY_ITEM_VERSIONS, {model_version: now + hard_ttl})
+    # Версии, все ключи которых уже истекли, больше не нужно удалять
+    pipe.zremrangebyscore(_KEY_ITEM_VERSIONS, "-inf", now)
+    pipe.expire(_KEY_ITEM_VERSIONS, hard_ttl)
+
+
+async def set_cached_prediction_by_item(
+    item_id: int, model_version: str, result: PredictResponse, seller_id: Optional[int] = None
+):
+    """С seller_id ключ попадает в индекс продавца — см. invalidate_seller_predictions."""
+    key = _key_item(item_id, model_version)
+    entry, raw, hard_ttl = _encode(key, result)
+    _local_for(key).set(key, entry)
+
+    def write(r):
+        pipe = r.pipeline(transaction=False)
+        pipe.setex(key, hard_ttl, raw)
+        _index_item_version(pipe, model_version, hard_ttl)
+        if seller_id is not None:
+            _index_seller_items(pipe, seller_id, [key], hard_ttl)
+        return pipe.execute()
+
+    await _try_redis(write)
+
+
+async def set_cached_predictions_by_items(items: List[Tuple[int, int, PredictResponse]], model_version: str):
+    """
+    Записывает пачку (item_id, seller_id, предсказание) одним pipeline: SET EX на каждый ключ
+    и пополнение индексов продавцов.
+    L1 не трогаем: массовая запись (прогрев) вытеснила бы из него горячие ключи.
+    """
+    if not items:
+        return
+    writes = []
+    by_seller: Dict[int, List[str]] = {}
+    hard_ttl = CACHE_TTLS["item"][1]
+    for item_id, seller_id, result in items:
+        key = _key_item(item_id, model_version)
+        _, raw, hard_ttl = _encode(key, result)
+        writes.append((key, raw))
+        by_seller.setdefault(seller_id, []).append(key)
+
+    def write(r):
+        pipe = r.pipeline(transaction=False)
+        for key, raw in writes:
+            pipe.setex(key, hard_ttl, raw)
+        _index_item_version(pipe, model_version, hard_ttl)
+        for seller_id, keys in by_seller.items():
+            _index_seller_items(pipe, seller_id, keys, hard_ttl)
+        return pipe.execute()
+
+    # Прогреву нужна ошибка, а не тихий пропуск: иначе он посчитает ключи записанными
+    await _redis(write, len(writes))
+
+
+async def invalidate_seller_predictions(seller_id: int, batch_size: int = SELLER_INVALIDATION_BATCH) -> int:
+    """
+    Удаляет все закешированные предсказания объявлений продавца (например, после смены
+    верификации — это признак модели). Ключи читаются из индекса SRANDMEMBER-ом порциями по
+    batch_size; DEL, PUBLISH и SREM порции идут одним pipeline, так что ключ покидает индекс
+    только вместе с удалением. Ключи, проиндексированные во время удаления, тоже попадут под него.
+    Недоступен Redis — CacheUnavailable, а продавец сбрасывается заново в фоне.
+    Возвращает число удалённых из индекса ключей.
+    """
+    index = _key_seller_items(seller_id)
+    removed = 0
+    try:
+        while True:
+            keys = [key.decode() for key in await _redis(lambda r: r.srandmember(index, batch_size), batch_size) or []]
+            if not keys:
+                break
+            _invalidate_local(keys)
+            await _redis(_delete_and_publish(keys, index), len(keys))
+            removed += len(keys)
+    except CacheUnavailable:
+        _schedule_retry(sellers=[seller_id])
+        raise
+    metrics.inc("cache_seller_invalidations_total")
+    metrics.inc("cache_seller_invalidated_keys_total", removed)
+    logger.info("Invalidated cached predictions: seller_id=%s, keys=%d", seller_id, removed)
+    return removed
+
+
+async def get_cached_moderation_result(task_id: int, refresh: Optional[Callable[[], Awaitable]] = None):
+    return await _get(_key_task(task_id), ModerationResultResponse, refresh)
 
 
 async def set_cached_moderation_result(task_id: int, result: ModerationResultResponse):
-    await (await get_redis()).setex(_key_task(task_id), TTL, result.model_dump_json())
+    await _set(_key_task(task_id), result)
 
 
 async def delete_cached_prediction_for_item(item_id: int):
-    await (await get_redis()).delete(_key_item(item_id))
+    await delete_cached_predictions_for_items([item_id])
+
+
+def _delete_and_publish(keys: List[str], index: Optional[str] = None):
+    def delete(r):
+        pipe = r.pipeline(transaction=False)
+        pipe.delete(*keys)
+        for key in keys:
+            pipe.publish(INVALIDATION_CHANNEL, key)
+        if index is not None:
+            # Из индекса — последним: команды pipeline выполняются по порядку, и если SREM
+            # прошёл, то DEL тоже
+            pipe.srem(index, *keys)
+        return pipe.execute()
+
+    return delete
+
+
+async def _delete_keys(keys: List[str]):
+    """
+    Удаляет ключи здесь, в Redis и (через pub/sub) в L1 остальных реплик — одним pipeline.
+    Недоступен Redis — CacheUnavailable, но удаление досылается в фоне: иначе устаревшее значение
+    жило бы в Redis и в L1 других реплик до жёсткого TTL.
+    """
+    _invalidate_local(keys)
+    try:
+        await _redis(_delete_and_publish(keys), len(keys))
+    except CacheUnavailable:
+        _schedule_retry(keys)
+        raise
+
+
+async def _retry_invalidations():
+    while _pending_keys or _pending_sellers or _pending_items:
+        await asyncio.sleep(REDIS_BREAKER_RESET_SEC)
+        keys = sorted(_pending_keys)
+        if keys:
+            try:
+                await _redis(_delete_and_publish(keys), len(keys))
+            except CacheUnavailable:
+                continue
+            _pending_keys.difference_update(keys)
+            metrics.inc("cache_invalidations_retried_total", len(keys))
+            logger.info("Retried cache invalidations: keys=%d", len(keys))
+        for seller_id in sorted(_pending_sellers):
+            _pending_sellers.discard(seller_id)
+            try:
+                await invalidate_seller_predictions(seller_id)
+            except CacheUnavailable:
+                # Продавец снова в очереди (см. invalidate_seller_predictions)
+                break
+            metrics.inc("cache_seller_invalidations_retried_total")
+        items = sorted(_pending_items)
+        if items:
+            _pending_items.difference_update(items)
+            try:
+                await delete_cached_predictions_for_items(items)
+            except CacheUnavailable:
+                # Объявления снова в очереди (см. delete_cached_predictions_for_items)
+                continue
+            metrics.inc("cache_item_invalidations_retried_total", len(items))
+
+
+def _schedule_retry(keys: List[str] = (), sellers: List[int] = (), items: List[int] = ()):
+    global _retry_task
+    _pending_keys.update(keys)
+    _pending_sellers.update(sellers)
+    _pending_items.update(items)
+    metrics.inc("cache_invalidation_failures_total")
+    if _retry_task is None or _retry_task.done():
+        _retry_task = asyncio.ensure_future(_retry_invalidations())
+
+
+async def delete_cached_predictions_for_items(item_ids: List[int]):
+    """
+    Удаляет предсказания объявлений под всеми версиями модели, что есть в кеше (см. _KEY_ITEM_VERSIONS):
+    после отката модели старые ключи снова читаются. Индекс версий недоступен — удаляем под известными
+    этой реплике версиями, а объявления целиком досылаются в фоне.
+    """
+    if not item_ids:
+        return
+    versions = set(_item_versions)
+    try:
+        live = await _redis(lambda r: r.zrangebyscore(_KEY_ITEM_VERSIONS, time.time(), "+inf"))
+        versions.update(version.decode() for version in live or [])
+    except CacheUnavailable:
+        _schedule_retry(items=item_ids)
+        if not versions:
+            raise
+    keys = [_key_item(item_id, version) for version in sorted(versions) for item_id in item_ids]
+    if keys:
+        await _delete_keys(keys)
+
+
+async def is_item_known_missing(item_id: int) -> bool:
+    key = _key_missing(item_id)
+    local = _local["missing"]
+    if local.get(key) is not None:
+        return True
+    token = local.read_token()
+    missing = bool(await _try_redis(lambda r: r.exists(key), 0))
+    record_lookup("redis", local.namespace, missing)
+    if missing:
+        local.set_if_fresh(key, True, token)
+    return missing
+
+
+async def mark_item_missing(item_id: int):
+    key = _key_missing(item_id)
+    _local["missing"].set(key, True)
+    await _try_redis(lambda r: r.setex(key, NEGATIVE_CACHE_TTL_SEC, b"1"))
+
+
+async def mark_items_missing(item_ids: List[int]):
+    """Негативные записи для пачки item_id одним pipeline."""
+    if not item_ids:
+        return
+    keys = [_key_missing(item_id) for item_id in item_ids]
+    local = _local["missing"]
+    for key in keys:
+        local.set(key, True)
+
+    def write(r):
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.setex(key, NEGATIVE_CACHE_TTL_SEC, b"1")
+        return pipe.execute()
+
+    await _try_redis(write, keys=len(keys))
+
+
+async def forget_item_missing(item_id: int):
+    """Объявление появилось: снимаем негативную запись здесь и на остальных репликах."""
+    await forget_items_missing([item_id])
+
+
+async def forget_items_missing(item_ids: List[int]):
+    """
+    forget_item_missing для пачки — одним pipeline; id попадают и в фильтр существования (см. _invalidate_local).
+    Сообщение остальным репликам при недоступном Redis досылается в фоне (см. _delete_keys): без него
+    их фильтры существования отвечали бы 404 на созданное объявление до пересборки.
+    """
+    if item_ids:
+        await _delete_keys([_key_missing(item_id) for item_id in item_ids])
+
+
+async def _compute_with_lock(key: str, compute: Callable[[], Awaitable], read: Callable[[], Awaitable]):
+    """Пересчёт под коротким Redis-lock: чужая реплика уже считает — ждём её запись в кеш."""
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    # Redis недоступен — lock не берём, считаем сами (как будто он наш)
+    if await _try_redis(lambda r: r.set(lock_key, token, nx=True, px=SINGLE_FLIGHT_LOCK_TTL_MS), True):
+        try:
+            return await compute()
+        finally:
+            await _try_redis(lambda r: r.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token))
+
+    metrics.inc("cache_single_flight_remote_waits")
+    deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_TTL_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_MS / 1000)
+        value = await read()
+        if value is not None:
+            metrics.inc("cache_single_flight_remote_hits")
+            return value
+    # Реплика-владелец не успела (или упала) — считаем сами
+    return await compute()
+
+
+def _forget_inflight(key: str, task: asyncio.Task):
+    _inflight.pop(key, None)
+    # Помечаем исключение полученным, даже если все ожидающие уже отменились
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(key: str, compute: Callable[[], Awaitable], read: Optional[Callable[[], Awaitable]] = None):
+    """
+    Коалесцирует конкурентные пересчёты одного ключа. compute() сам пишет результат в кеш;
+    read() нужен только для межрепличного режима — чтобы дождаться чужой записи.
+    Пересчёт идёт отдельной задачей: отмена одного из ожидающих (клиент ушёл) не отменяет его для остальных.
+    """
+    task = _inflight.get(key)
+    if task is not None:
+        metrics.inc("cache_single_flight_coalesced")
+        return await asyncio.shield(task)
+
+    metrics.inc("cache_single_flight_leaders")
+    if SINGLE_FLIGHT_LOCK_TTL_MS > 0 and read is not None:
+        task = asyncio.ensure_future(_compute_with_lock(key, lambda: _timed(compute), read))
+    else:
+        task = asyncio.ensure_future(_timed(compute))
+    _inflight[key] = task
+    task.add_done_callback(lambda done: _forget_inflight(key, done))
+    return await asyncio.shield(task)
+
+
+async def coalesce_prediction_by_features(
+    features: tuple, model_version: str, compute: Callable[[], Awaitable[PredictResponse]]
+):
+    return await single_flight(
+        _key_features(features, model_version),
+        compute,
+        lambda: get_cached_prediction_by_features(features, model_version),
+    )
+
+
+async def coalesce_prediction_by_item(
+    item_id: int, model_version: str, compute: Callable[[], Awaitable[PredictResponse]]
+):
+    return await single_flight(
+        _key_item(item_id, model_version),
+        compute,
+        lambda: get_cached_prediction_by_item(item_id, model_version),
+    )
+
+
+async def coalesce_moderation_result(task_id: int, compute: Callable[[], Awaitable[ModerationResultResponse]]):
+    return await single_flight(_key_task(task_id), compute, lambda: get_cached_moderation_result(task_id))
+
+
+async def _listen_invalidations():
+    while True:
+        pubsub = None
+        try:
+            pubsub = (await get_redis()).pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Пока не были подписаны, могли пропустить инвалидации — и вставки объявлений на других репликах
+            clear_local_caches()
+            item_filter.mark_stale()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _invalidate_local([message["data"].decode()])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Cache invalidation listener failed, resubscribing: %s", e)
+            await asyncio.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+async def start_invalidation_listener():
+    global _invalidation_task, _tracker
+    # Канал нужен и L1, и фильтру существования: через него приходят объявления с других реплик
+    if _invalidation_task is None and (L1_CACHE_MAX_SIZE > 0 or ITEM_FILTER_ENABLED):
+        _invalidation_task = asyncio.create_task(_listen_invalidations())
+    if _tracker is None and L1_CACHE_MAX_SIZE > 0 and REDIS_CLIENT_TRACKING:
+        # Ключи под трекингом Redis инвалидирует сам при любой записи, а не только при /close
+        tracker = InvalidationTracker(REDIS_TRACKING_PREFIXES, _invalidate_local)
+        if await tracker.start():
+            _tracker = tracker
+
+
+async def stop_invalidation_listener():
+    global _invalidation_task, _tracker, _retry_task
+    if _retry_task is not None:
+        _retry_task.cancel()
+        _retry_task = None
+    if _tracker is not None:
+        await _tracker.stop()
+        _tracker = None
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+        try:
+            await _invalidation_task
+        except asyncio.CancelledError:
+            pass
+        _invalidation_task = None
@@ -0,0 +1,64 @@
+import logging
+import time
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold ошибок подряд размыкается: allow() отвечает False, вызовы идут в обход.
+    Через reset_timeout секунд пропускает один пробный вызов: успех замыкает цепь, ошибка — снова размыкает.
+    Состояние — в gauge {name}_breaker_state (0 — closed, 1 — half_open, 2 — open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        metrics.set_gauge(f"{name}_breaker_state", _STATE_GAUGE[CLOSED])
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning("Circuit breaker %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            metrics.set_gauge(f"{self.name}_breaker_state", _STATE_GAUGE[state])
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        # Один пробный вызов; остальные идут в обход, пока он не завершится.
+        # Пробу, которая так и не отчиталась (например, отменена), повторяем через reset_timeout.
+        if (self.state == OPEN and now - self._opened_at >= self.reset_timeout) or \
+                (self.state == HALF_OPEN and now - self._probe_at >= self.reset_timeout):
+            self._probe_at = now
+            self._set_state(HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            if self.state != OPEN:
+                metrics.inc(f"{self.name}_breaker_opened_total")
+            self._set_state(OPEN)
+
+    def reset(self):
+        self._failures = 0
+        self._set_state(CLOSED)
@@ -0,0 +1,209 @@
+"""
+In-memory фильтр существующих item_id: отвечает «точно нет» без похода в Postgres.
+
+Считающий фильтр Блума (счётчик на позицию вместо бита), поэтому объявления можно и удалять.
+Ложноположительные ответы возможны (тогда просто идём в БД), ложноотрицательные — нет, пока
+все вставки проходят через item_repository: локальные — сразу, с других реплик — через канал
+инвалидаций (см. cache_storage.forget_item_missing). Всё остальное подхватывает периодическая
+пересборка из таблицы items. Если вставку с другой реплики могли пропустить (переподключение
+слушателя канала, неудавшаяся публикация), фильтр помечается устаревшим (mark_stale): до конца
+внеочередной пересборки он пропускает всё в БД.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+ITEM_FILTER_ENABLED = os.getenv("ITEM_FILTER_ENABLED", "0") == "1"
+ITEM_FILTER_CAPACITY = int(os.getenv("ITEM_FILTER_CAPACITY", "1000000"))
+ITEM_FILTER_ERROR_RATE = float(os.getenv("ITEM_FILTER_ERROR_RATE", "0.01"))
+ITEM_FILTER_REBUILD_SEC = float(os.getenv("ITEM_FILTER_REBUILD_SEC", "300"))
+ITEM_FILTER_PAGE_SIZE = 50000
+
+_MAX_COUNT = np.iinfo(np.uint8).max
+_MASK64 = (1 << 64) - 1
+_SEED2 = 0x5BD1E9955BD1E995
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64: хорошо перемешивает подряд идущие item_id
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _mix_int(x: int) -> int:
+    # То же на int: для одного id numpy дороже самих вычислений
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class CountingBloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(1, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._counters = np.zeros(self.size, dtype=np.uint8)
+        self._steps = np.arange(self.hashes, dtype=np.uint64)
+
+    def _positions(self, ids) -> np.ndarray:
+        x = np.asarray(ids, dtype=np.uint64).reshape(-1)
+        h1 = _mix(x)
+        h2 = _mix(x ^ np.uint64(_SEED2)) | np.uint64(1)
+        # Двойное хеширование: k позиций из двух хешей
+        return ((h1[:, None] + self._steps * h2[:, None]) % np.uint64(self.size)).astype(np.int64)
+
+    def _positions_one(self, item_id: int) -> List[int]:
+        h1 = _mix_int(item_id)
+        h2 = _mix_int(item_id ^ _SEED2) | 1
+        return [((h1 + i * h2) & _MASK64) % self.size for i in range(self.hashes)]
+
+    def add_many(self, ids) -> None:
+        positions, counts = np.unique(self._positions(ids), return_counts=True)
+        # Насыщающее сложение: переполненный счётчик больше не уменьшается, фильтр остаётся консервативным
+        self._counters[positions] = np.minimum(self._counters[positions] + counts, _MAX_COUNT)
+
+    def add(self, item_id: int) -> None:
+        counters = self._counters
+        for position in self._positions_one(item_id):
+            if counters[position] < _MAX_COUNT:
+                counters[position] += 1
+
+    def remove(self, item_id: int) -> None:
+        counters = self._counters
+        for position in self._positions_one(item_id):
+            if 0 < counters[position] < _MAX_COUNT:
+                counters[position] -= 1
+
+    def __contains__(self, item_id: int) -> bool:
+        counters = self._counters
+        return all(counters[position] for position in self._positions_one(item_id))
+
+    @property
+    def fill_ratio(self) -> float:
+        return float(np.count_nonzero(self._counters)) / self.size
+
+
+class ItemExistenceFilter:
+    """
+    Фильтр плюс его жизненный цикл. Пока первая сборка не закончилась, фильтр выключен или
+    устарел (mark_stale), might_contain отвечает True — то есть «иди в БД».
+    """
+
+    def __init__(self, capacity: int = ITEM_FILTER_CAPACITY, error_rate: float = ITEM_FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom: Optional[CountingBloomFilter] = None
+        # Вставки, пришедшие во время пересборки: добавляются в новый фильтр после подмены
+        self._pending: Optional[List[int]] = None
+        self._task: Optional[asyncio.Task] = None
+        # Растёт при каждом mark_stale: сборка, начатая до него, могла не увидеть пропущенную вставку
+        self._generation = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    def might_contain(self, item_id: int) -> bool:
+        return self._bloom is None or item_id in self._bloom
+
+    def add(self, item_id: int) -> None:
+        if self._pending is not None:
+            self._pending.append(item_id)
+        if self._bloom is not None:
+            self._bloom.add(item_id)
+
+    def remove(self, item_id: int) -> None:
+        # Удаление во время пересборки не переносим: новый фильтр мог и не увидеть этот id,
+        # а вычитание чужих счётчиков дало бы ложное «нет». Лишний id доживёт до следующей пересборки.
+        if self._bloom is not None:
+            self._bloom.remove(item_id)
+
+    def mark_stale(self) -> None:
+        """Могли пропустить вставку с другой реплики: не отвечаем «нет» до следующей пересборки и запускаем её сейчас."""
+        self._generation += 1
+        if self._bloom is not None:
+            metrics.inc("item_filter_stale_total")
+            logger.info("Item filter marked stale, rebuilding")
+        self._bloom = None
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def rebuild(self, load_page: Callable[[int, int], Awaitable[List[int]]]) -> int:
+        """Собирает новый фильтр по всем item_id (load_page(after_item_id, limit)) и подменяет текущий."""
+        started = time.monotonic()
+        generation = self._generation
+        self._pending = []
+        try:
+            bloom = CountingBloomFilter(self.capacity, self.error_rate)
+            after_item_id, total = 0, 0
+            while True:
+                ids = await load_page(after_item_id, ITEM_FILTER_PAGE_SIZE)
+                if not ids:
+                    break
+                bloom.add_many(ids)
+                after_item_id = ids[-1]
+                total += len(ids)
+            if self._pending:
+                bloom.add_many(self._pending)
+            if generation != self._generation:
+                # Во время сборки фильтр пометили устаревшим — результат тоже мог пропустить вставку
+                metrics.inc("item_filter_rebuilds_discarded_total")
+                logger.info("Item filter rebuild discarded: marked stale while loading")
+                return total
+            self._bloom = bloom
+        finally:
+            self._pending = None
+
+        metrics.inc("item_filter_rebuilds_total")
+        metrics.set_gauge("item_filter_items", total)
+        metrics.set_gauge("item_filter_fill_ratio", bloom.fill_ratio)
+        if total > self.capacity:
+            logger.warning("Item filter over capacity: items=%d, capacity=%d", total, self.capacity)
+        logger.info("Item filter rebuilt: items=%d, elapsed=%.2fs", total, time.monotonic() - started)
+        return total
+
+    async def start(self, load_page: Callable[[int, int], Awaitable[List[int]]], interval: float = ITEM_FILTER_REBUILD_SEC):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(load_page, interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, load_page, interval: float):
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    await self.rebuild(load_page)
+                except Exception as e:
+                    metrics.inc("item_filter_rebuild_failures_total")
+                    logger.warning("Item filter rebuild failed: %s", e)
+                # Следующая сборка — по расписанию (interval <= 0 — только по mark_stale) или сразу после mark_stale
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), interval if interval > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
+
+
+item_filter = ItemExistenceFilter()
@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app import metrics
+
+# Сколько последних инвалидаций помнить для set_if_fresh
+_INVALIDATION_LOG_SIZE = 10000
+
+
+def record_lookup(tier: str, namespace: str, hit: bool) -> None:
+    """Счётчики попаданий/промахов и текущий hit rate для уровня кеша."""
+    prefix = f"cache_{tier}_{namespace}"
+    metrics.inc(f"{prefix}_hits" if hit else f"{prefix}_misses")
+    hits = metrics.get_counter(f"{prefix}_hits")
+    metrics.set_gauge(f"{prefix}_hit_rate", hits / (hits + metrics.get_counter(f"{prefix}_misses")))
+
+
+class LocalCache:
+    """
+    Ограниченный in-process кеш с TTL и вытеснением LRU.
+    Работает в одном event loop, поэтому без блокировок.
+
+    Значение, прочитанное из Redis, кладётся через set_if_fresh(key, value, read_token()):
+    если ключ инвалидировали, пока шло чтение, оно уже устарело. Инвалидации учитываются
+    по ключам — запись одного ключа (например, по CLIENT TRACKING) не мешает заполнять L1 остальными.
+    """
+
+    def __init__(self, namespace: str, max_size: int, ttl: float):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        # Номер последней инвалидации; журнал ключ -> номер её последней инвалидации
+        self._seq = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        # Номер, до которого журнал неполон: старые записи вытеснены или сброшены clear()
+        self._forgotten = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            entry = None
+        record_lookup("l1", self.namespace, entry is not None)
+        if entry is None:
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            metrics.inc(f"cache_l1_{self.namespace}_evictions")
+
+    def read_token(self) -> int:
+        """Берётся перед чтением из Redis и передаётся в set_if_fresh."""
+        return self._seq
+
+    def set_if_fresh(self, key: str, value: Any, token: int) -> bool:
+        """set, если ключ не инвалидировали после read_token(); иначе значение отбрасывается."""
+        if self._forgotten > token or self._invalidated.get(key, 0) > token:
+            return False
+        self.set(key, value)
+        return True
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def invalidate(self, key: str) -> None:
+        self._data.pop(key, None)
+        self._seq += 1
+        self._invalidated[key] = self._seq
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > _INVALIDATION_LOG_SIZE:
+            # Для чтений, начатых до вытесненной записи, журнал неполон — set_if_fresh их отбросит
+            _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._seq += 1
+        self._invalidated.clear()
+        self._forgotten = self._seq
+
+    def __len__(self) -> int:
+        return len(self._data)
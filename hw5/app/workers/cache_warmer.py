@@ -0,0 +1,100 @@
+"""
+Прогрев кеша /simple_predict: предсказания для всех открытых объявлений заранее.
+
+Объявления читаются из Postgres страницами, каждая страница скорится одним векторным вызовом
+модели и записывается в Redis одним pipeline. Скорость ограничена (объявлений в секунду),
+чтобы прогрев не отнимал БД и CPU у живого трафика.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable
+
+from app import metrics
+from app.inference.executor import get_inference_executor
+from app.storages.cache_storage import set_cached_predictions_by_items
+from repositories.item_repository import get_open_item_features_page
+from services.predict_service import item_raw_features, predict_raw_batch
+
+logger = logging.getLogger(__name__)
+
+# Фоновый прогрев в API-процессе (см. main.py); CLI: python -m app.cli.warm_cache
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER_ENABLED", "0") == "1"
+CACHE_WARMER_PAGE_SIZE = int(os.getenv("CACHE_WARMER_PAGE_SIZE", "1000"))
+# Не больше стольких объявлений в секунду; 0 — без ограничения
+CACHE_WARMER_RATE = float(os.getenv("CACHE_WARMER_RATE", "2000"))
+# Период повторного прогрева; 0 — один проход при старте
+CACHE_WARMER_INTERVAL_SEC = float(os.getenv("CACHE_WARMER_INTERVAL_SEC", "0"))
+
+
+class CacheWarmer:
+    def __init__(
+        self,
+        get_model: Callable[[], object],
+        page_size: int = CACHE_WARMER_PAGE_SIZE,
+        rate: float = CACHE_WARMER_RATE,
+    ):
+        self._get_model = get_model
+        self.page_size = page_size
+        self.rate = rate
+        self._task = None
+
+    async def warm(self) -> int:
+        """Один проход по всем открытым объявлениям. Возвращает число записанных ключей."""
+        executor = await get_inference_executor()
+        started = time.monotonic()
+        after_item_id = 0
+        warmed = 0
+        while True:
+            items = await get_open_item_features_page(after_item_id, self.page_size)
+            if not items:
+                break
+            # Модель — одна на страницу: её версия идёт в ключи кеша
+            model = self._get_model()
+            results = await executor.run(predict_raw_batch, [item_raw_features(item) for item in items], model)
+            await set_cached_predictions_by_items(
+                [(item["item_id"], item["seller_id"], result) for item, result in zip(items, results)],
+                model.version,
+            )
+
+            after_item_id = items[-1]["item_id"]
+            warmed += len(items)
+            metrics.inc("cache_warmer_items_total", len(items))
+            metrics.inc("cache_warmer_pages_total")
+
+            if self.rate > 0:
+                # Держим среднюю скорость прохода не выше rate
+                ahead = warmed / self.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+
+        elapsed = time.monotonic() - started
+        metrics.set_gauge("cache_warmer_last_run_items", warmed)
+        metrics.set_gauge("cache_warmer_last_run_sec", elapsed)
+        logger.info("Cache warmed: items=%d, elapsed=%.1fs", warmed, elapsed)
+        return warmed
+
+    async def start(self, interval: float = CACHE_WARMER_INTERVAL_SEC):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval: float):
+        while True:
+            try:
+                await self.warm()
+            except Exception as e:
+                metrics.inc("cache_warmer_failures_total")
+                logger.warning("Cache warming failed: %s", e)
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
@@ -3,17 +3,18 @@ import logging
 import asyncio
 from aiokafka import AIOKafkaConsumer
 
+from app import metrics
 from database import get_db_pool, close_db_pool
-from model import get_or_train_model
-from repositories.item_repository import get_item_by_item_id
+from app.inference.model_manager import ModelManager
+from repositories.item_repository import get_item_features_by_item_id
 from app.repositories.moderation_repository import (
     get_pending_task_by_item_id, update_moderation_result
 )
 from app.clients.kafka import send_to_dlq
-from services.predict_service import predict_moderation
-from models.schemas import PredictRequest
+from app.inference.executor import get_inference_executor, close_inference_executor
+from app.logging_config import setup_logging
+from services.predict_service import predict_item
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 KAFKA_BOOTSTRAP_SERVERS = "localhost:9092"
@@ -27,49 +28,48 @@ INITIAL_DELAY_SEC = 1
 
 async def process_moderation_message(message_data, model):
     item_id = message_data["item_id"]
-    logger.info(f"Processing item_id={item_id}")
+    # С версии 2 задача приходит в сообщении и обновляется по первичному ключу. Для старых
+    # сообщений (только item_id) ищем ожидающую задачу объявления — один раз на сообщение
+    task_id = message_data.get("task_id")
+    if task_id is None:
+        metrics.inc("moderation_legacy_messages_total")
+    logger.info("Processing item_id=%s, task_id=%s", item_id, task_id)
 
     last_error = None
     for attempt in range(MAX_RETRIES):
         try:
-            item_data = await get_item_by_item_id(item_id)
+            item_data = await get_item_features_by_item_id(item_id)
             if not item_data:
                 raise Exception(f"Item {item_id} not found")
 
-            request = PredictRequest(
-                seller_id=item_data["seller_id"],
-                is_verified_seller=item_data["is_verified_seller"],
-                item_id=item_data["item_id"],
-                name=item_data["name"],
-                description=item_data["description"],
-                category=item_data["category"],
-                images_qty=item_data["images_qty"]
-            )
-            result = predict_moderation(request, model)
+            executor = await get_inference_executor()
+            result = await executor.run(predict_item, item_data, model)
 
-            task_id = await get_pending_task_by_item_id(item_id)
+            if task_id is None:
+                task_id = await get_pending_task_by_item_id(item_id)
             await update_moderation_result(
                 task_id=task_id,
                 status="completed",
                 is_violation=result.is_violation,
                 probability=result.probability
             )
-            logger.info(f"Completed: item_id={item_id}, violation={result.is_violation}")
+            logger.info("Completed: item_id=%s, violation=%s", item_id, result.is_violation)
             return
 
         except Exception as e:
             last_error = e
             error_msg = str(e)
-            logger.warning(f"Attempt {attempt + 1}/{MAX_RETRIES} failed for item_id={item_id}: {error_msg}")
+            logger.warning("Attempt %d/%d failed for item_id=%s: %s", attempt + 1, MAX_RETRIES, item_id, error_msg)
             if attempt < MAX_RETRIES - 1:
                 delay = INITIAL_DELAY_SEC * (2 ** attempt)
-                logger.info(f"Retrying in {delay}s...")
+                logger.info("Retrying in %ss...", delay)
                 await asyncio.sleep(delay)
 
     # All retries exhausted — mark failed and send to DLQ
     error_msg = str(last_error)
-    logger.error(f"All retries failed for item_id={item_id}: {error_msg}")
-    task_id = await get_pending_task_by_item_id(item_id)
+    logger.error("All retries failed for item_id=%s: %s", item_id, error_msg)
+    if task_id is None:
+        task_id = await get_pending_task_by_item_id(item_id)
     if task_id:
         await update_moderation_result(
             task_id=task_id,
@@ -80,7 +80,10 @@ async def process_moderation_message(message_data, model):
 
 
 async def consume_messages():
-    model = get_or_train_model()
+    model_manager = ModelManager()
+    model_manager.load()
+    await get_inference_executor(model_manager.loaded_path)
+    await model_manager.start_watching()
     await get_db_pool()
 
     consumer = AIOKafkaConsumer(
@@ -97,15 +100,18 @@ async def consume_messages():
     try:
         async for message in consumer:
             try:
-                await process_moderation_message(message.value, model)
+                await process_moderation_message(message.value, model_manager.model)
                 await consumer.commit()
             except Exception as e:
                 logger.error(f"Unexpected error processing message: {e}", exc_info=True)
                 # Do not commit — message will be redelivered
     finally:
         await consumer.stop()
+        await model_manager.stop()
+        await close_inference_executor()
         await close_db_pool()
 
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(consume_messages())
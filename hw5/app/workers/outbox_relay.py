@@ -0,0 +1,85 @@
+"""
+Relay transactional outbox: отправляет в Kafka сообщения, записанные /async_predict в таблицу
+moderation_outbox вместе с задачей модерации (см. enqueue_moderation_task).
+
+Пачка сообщений забирается, отправляется и удаляется в одной транзакции: при сбое Kafka
+сообщения остаются в таблице и уходят на следующем проходе (at-least-once — воркер
+должен переносить повторную доставку). Пока outbox не пуст, пачки идут подряд; пустой
+outbox опрашивается раз в OUTBOX_POLL_INTERVAL_MS.
+
+Запуск из каталога hw5:
+    python -m app.workers.outbox_relay
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Tuple
+
+from app import metrics
+from app.clients.kafka import close_producer, send_batch
+from app.logging_config import setup_logging, stop_logging
+from app.repositories.moderation_repository import drain_outbox
+from database import close_db_pool, get_db_pool
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL_MS = float(os.getenv("OUTBOX_POLL_INTERVAL_MS", "100"))
+# Пауза после неудачной отправки, чтобы не долбить недоступную Kafka
+OUTBOX_RETRY_DELAY_SEC = float(os.getenv("OUTBOX_RETRY_DELAY_SEC", "1"))
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        send: Callable[[List[Tuple[str, dict]]], Awaitable] = send_batch,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval_ms: float = OUTBOX_POLL_INTERVAL_MS,
+        retry_delay: float = OUTBOX_RETRY_DELAY_SEC,
+    ):
+        self._send = send
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval_ms / 1000
+        self.retry_delay = retry_delay
+
+    async def relay_once(self) -> int:
+        """Одна пачка. Возвращает число отправленных сообщений."""
+        rows = await drain_outbox(self.batch_size, self._send)
+        if rows:
+            metrics.inc("outbox_relayed_total", len(rows))
+            metrics.observe("outbox_batch_size", len(rows))
+            # Сколько ждало самое старое сообщение пачки
+            metrics.set_gauge("outbox_lag_sec", max(row["age_sec"] for row in rows))
+        return len(rows)
+
+    async def run(self):
+        """Отправляет сообщения, пока не отменят."""
+        while True:
+            try:
+                sent = await self.relay_once()
+            except Exception as e:
+                metrics.inc("outbox_relay_failures_total")
+                logger.warning("Outbox relay failed: %s", e)
+                await asyncio.sleep(self.retry_delay)
+                continue
+            if sent < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+
+async def run_relay():
+    await get_db_pool()
+    relay = OutboxRelay()
+    logger.info("Outbox relay started: batch_size=%d", relay.batch_size)
+    try:
+        await relay.run()
+    finally:
+        await close_producer()
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        asyncio.run(run_relay())
+    finally:
+        stop_logging()
@@ -0,0 +1,53 @@
+"""
+Путь попадания в кеш: декодирование значения из Redis до готовой модели ответа.
+
+До: json.loads + PredictResponse(**...) / ModerationResultResponse(**...) с полной валидацией pydantic.
+После: бинарная запись cache_codec + model_construct без валидации.
+Сеть не участвует — меряется только то, что делает процесс после получения байтов.
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_cache_codec [--iterations 200000]
+"""
+import argparse
+import json
+import time
+
+from app.storages.cache_codec import CacheEntry, decode_entry, encode_entry
+from models.schemas import ModerationResultResponse, PredictResponse
+
+
+def json_before(raw: str, model_cls):
+    return model_cls(**json.loads(raw))
+
+
+def measure(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    values = [
+        PredictResponse(is_violation=True, probability=0.8734),
+        ModerationResultResponse(task_id=123456, status="completed", is_violation=False, probability=0.12),
+    ]
+    for value in values:
+        model_cls = type(value)
+        legacy = value.model_dump_json()
+        binary = encode_entry(CacheEntry(value, time.time() + 3000, 0.004))
+
+        before = measure(lambda: json_before(legacy, model_cls), args.iterations)
+        after = measure(lambda: decode_entry(binary, model_cls), args.iterations)
+        print(
+            f"{model_cls.__name__:<26} json+validate={before * 1e6:6.2f} us ({len(legacy)} B)  "
+            f"binary={after * 1e6:6.2f} us ({len(binary)} B)  speedup={before / after:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Hit rate и стоимость ключа кеша /predict: хеш всего запроса против вектора признаков.
+
+Реплеим синтетический поток запросов: объявления выбираются по закону Ципфа,
+у разных объявлений разные seller_id/item_id/тексты, но признаки модели
+(верификация, число фото, длина описания, категория) часто совпадают.
+Кеш моделируется как LRU фиксированного размера.
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_cache_keys [--listings 200000] [--requests 500000] [--capacity 50000]
+"""
+import argparse
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.storages.cache_storage import _key_features
+from models.schemas import PredictRequest
+from services.predict_service import raw_features
+
+
+def old_key(request: PredictRequest) -> str:
+    return "prediction:req:" + hashlib.sha256(json.dumps(request.model_dump(), sort_keys=True).encode()).hexdigest()
+
+
+def new_key(request: PredictRequest) -> str:
+    return _key_features(raw_features(request), "v1")
+
+
+def make_listings(n: int, rng) -> list:
+    # Длины описаний в реальности группируются вокруг шаблонов, поэтому берём их из узкого набора
+    lengths = rng.choice(np.arange(20, 400, 10), size=n)
+    return [
+        PredictRequest(
+            seller_id=int(i % 50000) + 1,
+            is_verified_seller=bool(rng.random() < 0.6),
+            item_id=i + 1,
+            name=f"Listing {i}",
+            description="x" * int(lengths[i]),
+            category=int(rng.integers(1, 51)),
+            images_qty=int(rng.integers(0, 11)),
+        )
+        for i in range(n)
+    ]
+
+
+def replay(requests: list, key_fn, capacity: int):
+    cache = OrderedDict()
+    hits = 0
+    started = time.perf_counter()
+    for request in requests:
+        key = key_fn(request)
+        if key in cache:
+            hits += 1
+            cache.move_to_end(key)
+        else:
+            cache[key] = True
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    elapsed = time.perf_counter() - started
+    return hits / len(requests), elapsed / len(requests), len(cache)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=500000)
+    parser.add_argument("--capacity", type=int, default=50000)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    listings = make_listings(args.listings, rng)
+    picks = (rng.zipf(args.zipf, size=args.requests) - 1) % args.listings
+    requests = [listings[i] for i in picks]
+
+    for label, key_fn in (("sha256(request)", old_key), ("feature vector", new_key)):
+        hit_rate, per_request, size = replay(requests, key_fn, args.capacity)
+        print(f"{label:<18} hit_rate={hit_rate:6.1%}  key+lookup={per_request * 1e6:6.2f} us  distinct_keys_in_cache={size}")
+
+
+if __name__ == "__main__":
+    main()
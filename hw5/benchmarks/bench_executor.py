@@ -0,0 +1,81 @@
+"""
+Задержка event loop и p99 латентности инференса в режимах inline / thread / process.
+
+Параллельно с потоком предсказаний в loop крутится «пробник», который спит 1 мс
+и замеряет, насколько позже он просыпается — это и есть блокировка loop для
+остального I/O (Redis, asyncpg, Kafka).
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_executor [--requests 5000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.inference.executor import InferenceExecutor
+from model import load_scorer
+from models.schemas import PredictRequest
+from services.predict_service import predict_moderation
+
+
+async def probe_lag(stop: asyncio.Event, lags: list, interval: float = 0.001):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_mode(mode: str, requests_total: int, concurrency: int, workers: int):
+    model = load_scorer()
+    executor = InferenceExecutor(mode=mode, workers=workers)
+    await executor.start()
+
+    requests = [
+        PredictRequest(
+            seller_id=1, is_verified_seller=i % 2 == 0, item_id=i + 1, name="x",
+            description="y" * (i % 2000 + 1), category=i % 100 + 1, images_qty=i % 10,
+        )
+        for i in range(requests_total)
+    ]
+    latencies, lags = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(request):
+        async with semaphore:
+            started = time.perf_counter()
+            await executor.run(predict_moderation, request, model)
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(r) for r in requests))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    await executor.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    lags_ms = np.array(lags or [0.0]) * 1000
+    print(
+        f"{mode:<8} throughput={requests_total / elapsed:9.0f} req/s  "
+        f"p50={np.percentile(latencies_ms, 50):7.3f}ms  p99={np.percentile(latencies_ms, 99):7.3f}ms  "
+        f"loop lag p99={np.percentile(lags_ms, 99):7.3f}ms max={lags_ms.max():7.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+    for mode in args.modes:
+        asyncio.run(run_mode(mode, args.requests, args.concurrency, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Конкурентные чтения объявлений: запрос на каждое против ItemLoader (одна пачка = ANY($1) на проход event loop).
+
+Postgres моделируется пулом из --pool соединений: запрос занимает соединение на
+--query-ms плюс --row-us на каждую строку. Считаем время волны из --concurrency
+одновременных чтений, число взятых из пула соединений, число запросов и худшее ожидание
+соединения (метрики InstrumentedPool).
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_item_loader [--concurrency 500] [--pool 10] [--query-ms 1.0] [--row-us 5]
+"""
+import argparse
+import asyncio
+import random
+import time
+from unittest.mock import patch
+
+from app import metrics
+from database import InstrumentedPool
+from repositories import item_repository
+
+
+class SimulatedPool:
+    def __init__(self, size: int, query_ms: float, row_us: float):
+        self.size = size
+        self._slots = asyncio.Semaphore(size)
+        self.query = query_ms / 1000
+        self.row = row_us / 1e6
+
+    def get_size(self):
+        return self.size
+
+    async def acquire(self, timeout=None):
+        await self._slots.acquire()
+        return self
+
+    async def release(self, conn):
+        self._slots.release()
+
+    async def fetchrow(self, query, item_id):
+        await asyncio.sleep(self.query + self.row)
+        return {"item_id": item_id, "seller_id": 1}
+
+    async def fetch(self, query, item_ids):
+        await asyncio.sleep(self.query + self.row * len(item_ids))
+        return [{"item_id": item_id, "seller_id": 1} for item_id in item_ids]
+
+
+async def wave(ids, args, loader_enabled: bool):
+    pool = InstrumentedPool(SimulatedPool(args.pool, args.query_ms, args.row_us))
+
+    async def get_pool():
+        return pool
+
+    metrics.reset()
+    with patch.object(item_repository, "get_db_pool", get_pool), \
+         patch.object(item_repository, "ITEM_LOADER_ENABLED", loader_enabled), \
+         patch.object(item_repository, "known_missing", lambda item_id: asyncio.sleep(0, False)):
+        started = time.perf_counter()
+        await asyncio.gather(*(item_repository.get_item_by_item_id(item_id) for item_id in ids))
+        elapsed = time.perf_counter() - started
+    snapshot = metrics.snapshot()
+    wait = snapshot["summaries"]["db_pool_acquire_ms"]
+    return elapsed, snapshot["counters"]["db_pool_acquires_total"], snapshot["counters"]["item_queries_total"], wait["max"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--items", type=int, default=300, help="число различных item_id в волне")
+    parser.add_argument("--pool", type=int, default=10)
+    parser.add_argument("--query-ms", type=float, default=1.0)
+    parser.add_argument("--row-us", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    ids = [rng.randint(1, args.items) for _ in range(args.concurrency)]
+
+    for label, enabled in (("query per lookup", False), ("item loader", True)):
+        elapsed, acquires, queries, max_wait = asyncio.run(wave(ids, args, enabled))
+        print(
+            f"{label:<17} wave={elapsed * 1000:8.1f} ms  pool_acquires={acquires:5.0f}  queries={queries:5.0f}  "
+            f"max_acquire_wait={max_wait:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
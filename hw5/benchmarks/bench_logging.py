@@ -0,0 +1,74 @@
+"""
+Накладные расходы логирования на горячем пути предсказания.
+
+Сравниваются: логирование выключено (WARNING), синхронный StreamHandler как в старом
+logging.basicConfig, очередь с записью в отдельном потоке и очередь с сэмплированием.
+Вывод идёт в /dev/null, чтобы мерить стоимость логирования, а не терминала.
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_logging [--calls 20000]
+"""
+import argparse
+import logging
+import os
+import time
+
+from app.logging_config import TEXT_FORMAT, setup_logging, stop_logging
+from model import load_scorer
+from models.schemas import PredictRequest
+from services.predict_service import predict_moderation
+
+
+def configure_sync(devnull):
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+
+
+def run(label, calls, model, request):
+    started = time.perf_counter()
+    for _ in range(calls):
+        predict_moderation(request, model)
+    per_call = (time.perf_counter() - started) / calls
+    print(f"{label:<36} {per_call * 1e6:8.2f} us/call")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    model = load_scorer()
+    request = PredictRequest(
+        seller_id=1, is_verified_seller=True, item_id=1, name="x",
+        description="y" * 500, category=10, images_qty=3,
+    )
+    devnull = open(os.devnull, "w")
+
+    logging.getLogger().handlers = []
+    logging.getLogger().setLevel(logging.WARNING)
+    baseline = run("disabled (WARNING)", args.calls, model, request)
+
+    configure_sync(devnull)
+    run("sync StreamHandler, text", args.calls, model, request)
+
+    settings = [
+        ("queue, text", "text", {}),
+        ("queue, json", "json", {}),
+        ("queue, json, sample 10%", "json", {"services.predict_service": 0.1}),
+        ("queue, json, sample 1%", "json", {"services.predict_service": 0.01}),
+    ]
+    for label, fmt, rates in settings:
+        setup_logging(level="INFO", fmt=fmt, sample_rates=rates, stream=devnull)
+        per_call = run(label, args.calls, model, request)
+        stop_logging()
+        print(f"{'':<36} overhead vs disabled: {(per_call - baseline) * 1e6:6.2f} us/call")
+
+    devnull.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Микробенчмарк: sklearn predict + predict_proba против LogisticScorer.
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_scorer
+"""
+import timeit
+
+import numpy as np
+
+from app.inference.scorer import LogisticScorer
+from model import load_model
+
+
+def bench(label, fn, number):
+    per_call = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{label:<40} {per_call * 1e6:10.2f} us/call")
+    return per_call
+
+
+def main():
+    model = load_model()
+    scorer = LogisticScorer.from_sklearn(model)
+    rng = np.random.default_rng(0)
+
+    for rows, number in ((1, 20000), (64, 5000), (4096, 200)):
+        features = rng.random((rows, 4))
+        print(f"--- batch of {rows} row(s)")
+        baseline = bench(
+            "sklearn predict + predict_proba",
+            lambda: (model.predict(features), model.predict_proba(features)[:, 1]),
+            number,
+        )
+        compiled = bench("LogisticScorer.predict_with_proba", lambda: scorer.predict_with_proba(features), number)
+        print(f"{'speedup':<40} {baseline / compiled:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Время загрузки модели и RSS процесса: model.pkl (pickle + sklearn) против model.weights (mmap).
+
+Каждый вариант запускается в отдельном чистом интерпретаторе, как это происходит
+при старте uvicorn-воркера или воркера модерации.
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+_CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+from model import load_scorer
+scorer = load_scorer(sys.argv[1])
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "load_ms": elapsed * 1000,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "sklearn_imported": "sklearn" in sys.modules,
+}))
+"""
+
+
+def measure(path: str, runs: int):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _CHILD, path],
+            capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    load_ms = np.median([s["load_ms"] for s in samples])
+    rss_mb = np.median([s["max_rss_mb"] for s in samples])
+    print(f"{path:<16} load={load_ms:8.1f}ms  max_rss={rss_mb:7.1f}MB  sklearn_imported={samples[0]['sklearn_imported']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    for path in ("model.pkl", "model.weights"):
+        measure(path, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Воркер модерации: сообщения версии 1 (поиск ожидающей задачи по item_id) против версии 2
+(task_id в сообщении, обновление по первичному ключу).
+
+Postgres моделируется пулом из одного соединения (воркер обрабатывает сообщения по одному):
+чтение объявления и UPDATE стоят --query-ms, поиск ожидающей задачи — --lookup-ms
+(индекс по item_id, сортировка ожидающих задач объявления по created_at). Инференс —
+настоящая модель в inline-исполнителе. Считаем пропускную способность и запросы на сообщение.
+
+Запуск из каталога hw5:
+    python -m benchmarks.bench_worker_task_lookup [--messages 2000] [--query-ms 0.5] [--lookup-ms 0.7]
+"""
+import argparse
+import asyncio
+import time
+from unittest.mock import patch
+
+from app import metrics
+from app.repositories import moderation_repository
+from app.workers import moderation_worker
+from database import InstrumentedPool
+from model import load_scorer
+
+
+class SimulatedPool:
+    def __init__(self, query_ms: float, lookup_ms: float):
+        self._slots = asyncio.Semaphore(1)
+        self.query = query_ms / 1000
+        self.lookup = lookup_ms / 1000
+        self.queries = 0
+
+    def get_size(self):
+        return 1
+
+    async def acquire(self, timeout=None):
+        await self._slots.acquire()
+        return self
+
+    async def release(self, conn):
+        self._slots.release()
+
+    async def fetchrow(self, query, item_id):
+        # Только поиск ожидающей задачи: объявления читает fake_item_features
+        self.queries += 1
+        await asyncio.sleep(self.lookup)
+        return {"id": item_id}
+
+    async def execute(self, query, *args):
+        self.queries += 1
+        await asyncio.sleep(self.query)
+
+
+async def run(messages, args):
+    pool = SimulatedPool(args.query_ms, args.lookup_ms)
+    instrumented = InstrumentedPool(pool)
+
+    async def get_pool():
+        return instrumented
+
+    async def fake_item_features(item_id):
+        pool.queries += 1
+        await asyncio.sleep(pool.query)
+        return {
+            "item_id": item_id, "seller_id": 1, "is_verified_seller": item_id % 2 == 0,
+            "description_length": item_id % 500, "category": item_id % 100 + 1, "images_qty": item_id % 10,
+        }
+
+    model = load_scorer()
+    metrics.reset()
+    with patch.object(moderation_repository, "get_db_pool", get_pool), \
+         patch.object(moderation_worker, "get_item_features_by_item_id", fake_item_features):
+        started = time.perf_counter()
+        for message in messages:
+            await moderation_worker.process_moderation_message(message, model)
+        elapsed = time.perf_counter() - started
+    return elapsed, pool.queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--query-ms", type=float, default=0.5)
+    parser.add_argument("--lookup-ms", type=float, default=0.7)
+    args = parser.parse_args()
+
+    ids = range(1, args.messages + 1)
+    variants = (
+        ("v1 pending lookup", [{"item_id": i} for i in ids]),
+        ("v2 task_id in msg", [{"version": 2, "task_id": i, "item_id": i} for i in ids]),
+    )
+    for label, messages in variants:
+        elapsed, queries = asyncio.run(run(messages, args))
+        print(
+            f"{label:<18} {len(messages) / elapsed:8.0f} msg/s  "
+            f"queries/msg={queries / len(messages):4.2f}  total={elapsed * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
+import asyncio
 import asyncpg
+import logging
 import os
-from typing import Optional
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = int(os.getenv("DB_PORT", "5432"))
@@ -8,7 +16,91 @@ DB_USER = os.getenv("DB_USER", "user")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_NAME = os.getenv("DB_NAME", "moderationservices")
 
-pool: Optional[asyncpg.Pool] = None
+# Размер пула: min_size соединений открывается сразу при создании пула
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Сколько ждать свободного соединения; 0 — без ограничения
+DB_POOL_ACQUIRE_TIMEOUT_SEC = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_SEC", "0"))
+# Таймаут на запрос; 0 — без ограничения
+DB_COMMAND_TIMEOUT_SEC = float(os.getenv("DB_COMMAND_TIMEOUT_SEC", "0"))
+DB_CONNECT_TIMEOUT_SEC = float(os.getenv("DB_CONNECT_TIMEOUT_SEC", "60"))
+# Время жизни соединения: закрывается после стольких запросов или стольких секунд простоя
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+DB_POOL_MAX_INACTIVE_SEC = float(os.getenv("DB_POOL_MAX_INACTIVE_SEC", "300"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+pool: Optional["InstrumentedPool"] = None
+
+# Горячие запросы: подготавливаются на каждом новом соединении (см. warm_statement)
+_warm_statements: List[Tuple[str, tuple]] = []
+
+
+def warm_statement(query: str, *args):
+    """
+    Регистрирует горячий запрос. При открытии соединения он выполняется один раз с args,
+    которые ничего не находят, — и уже подготовленным лежит в кеше statement'ов соединения,
+    так что первый настоящий запрос не платит за parse/plan. Только для SELECT.
+    """
+    _warm_statements.append((query, args))
+
+
+async def _init_connection(conn):
+    started = time.perf_counter()
+    for query, args in _warm_statements:
+        try:
+            await conn.fetch(query, *args)
+        except Exception as e:
+            # Например, миграция ещё не применена — соединение всё равно пригодно
+            logger.warning("Failed to prepare statement: %s, query=%r", e, query[:80])
+    metrics.inc("db_pool_connections_opened_total")
+    metrics.observe("db_pool_connection_warmup_ms", (time.perf_counter() - started) * 1000)
+
+
+class InstrumentedPool:
+    """
+    asyncpg.Pool с метриками: размер пула, занятые соединения, ожидающие соединения и время
+    ожидания (db_pool_size, db_pool_in_use, db_pool_waiters, db_pool_acquire_ms).
+    acquire() работает только как async with; остальные методы — как у Pool.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT_SEC):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self._waiters = 0
+        self._in_use = 0
+        self._publish()
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def _publish(self):
+        metrics.set_gauge("db_pool_size", self._pool.get_size())
+        metrics.set_gauge("db_pool_in_use", self._in_use)
+        metrics.set_gauge("db_pool_waiters", self._waiters)
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        self._waiters += 1
+        self._publish()
+        started = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=timeout or self.acquire_timeout or None)
+        except asyncio.TimeoutError:
+            metrics.inc("db_pool_acquire_timeouts_total")
+            logger.warning("Timed out waiting for a database connection: waiters=%d", self._waiters)
+            raise
+        finally:
+            self._waiters -= 1
+        metrics.observe("db_pool_acquire_ms", (time.perf_counter() - started) * 1000)
+        metrics.inc("db_pool_acquires_total")
+        self._in_use += 1
+        self._publish()
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            await self._pool.release(conn)
+            self._publish()
 
 
 async def get_db_pool():
@@ -19,9 +111,22 @@ async def get_db_pool():
                 await pool.close()
             except Exception:
                 pass
-        pool = await asyncpg.create_pool(
+        started = time.perf_counter()
+        raw_pool = await asyncpg.create_pool(
             host=DB_HOST, port=DB_PORT, user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
+            password=DB_PASSWORD, database=DB_NAME,
+            min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+            max_queries=DB_POOL_MAX_QUERIES,
+            max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_SEC,
+            command_timeout=DB_COMMAND_TIMEOUT_SEC or None,
+            timeout=DB_CONNECT_TIMEOUT_SEC,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            init=_init_connection,
+        )
+        pool = InstrumentedPool(raw_pool)
+        logger.info(
+            "Database pool ready: size=%d, max_size=%d, warm_statements=%d, elapsed=%.0fms",
+            raw_pool.get_size(), DB_POOL_MAX_SIZE, len(_warm_statements), (time.perf_counter() - started) * 1000,
         )
     return pool
 
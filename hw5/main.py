@@ -1,56 +1,106 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from routes.predict_router import router
-from model import get_or_train_model
+from routes.metrics_router import router as metrics_router
+from routes.admin_router import router as admin_router
 from database import get_db_pool, close_db_pool
-from app.clients.kafka import get_producer, close_producer
 from app.clients.redis_client import get_redis, close_redis
+from app.storages.cache_storage import start_invalidation_listener, stop_invalidation_listener
+from app.inference.batcher import MicroBatcher, BATCHING_ENABLED
+from app.inference.executor import get_inference_executor, close_inference_executor
+from app.inference.model_manager import ModelManager
+from app.workers.cache_warmer import CacheWarmer, CACHE_WARMER_ENABLED
+from app.storages.item_filter import item_filter, ITEM_FILTER_ENABLED
+from repositories.item_repository import get_item_ids_page
+from app.logging_config import setup_logging, stop_logging
 import logging
 import uvicorn
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
+app.state.model = None
+app.state.batcher = None
+app.state.cache_warmer = None
+app.state.model_manager = ModelManager(on_swap=lambda model: setattr(app.state, "model", model))
+
+
+@app.middleware("http")
+async def add_model_version_header(request: Request, call_next):
+    response = await call_next(request)
+    if app.state.model is not None:
+        response.headers["X-Model-Version"] = app.state.model.version
+    return response
 
 
 @app.on_event("startup")
 async def startup_event():
+    setup_logging()
     logger.info("Starting application...")
     try:
-        app.state.model = get_or_train_model()
-        logger.info("Model loaded successfully")
+        app.state.model_manager.load()
+        logger.info(f"Model loaded successfully: version={app.state.model_manager.version}")
     except Exception as e:
-        logger.error(f"Failed to load model: {e}")
-        app.state.model = None
-    
+        # Без модели сервис бесполезен: не обучаем её на лету, а падаем при старте
+        logger.error(f"Failed to load model: {e}. Train it with: python -m app.cli.train")
+        raise
+    await app.state.model_manager.start_watching()
+
+    try:
+        executor = await get_inference_executor(app.state.model_manager.loaded_path)
+        logger.info(f"Inference executor ready: mode={executor.mode}")
+    except Exception as e:
+        logger.error(f"Failed to start inference executor: {e}")
+
+    if BATCHING_ENABLED:
+        app.state.batcher = MicroBatcher(lambda: app.state.model)
+        await app.state.batcher.start()
+        logger.info("Micro-batching enabled")
+
     try:
         await get_db_pool()
         logger.info("Database connection established")
     except Exception as e:
         logger.error(f"Failed to connect to database: {e}")
-    
-    try:
-        await get_producer()
-        logger.info("Kafka producer initialized")
-    except Exception as e:
-        logger.error(f"Failed to initialize Kafka producer: {e}")
 
     try:
         await get_redis()
+        await start_invalidation_listener()
         logger.info("Redis client initialized")
     except Exception as e:
         logger.error(f"Failed to connect to Redis: {e}")
 
+    if ITEM_FILTER_ENABLED:
+        # Пока фильтр собирается, все запросы идут в БД как обычно
+        await item_filter.start(get_item_ids_page)
+        logger.info("Item existence filter enabled")
+
+    if CACHE_WARMER_ENABLED:
+        app.state.cache_warmer = CacheWarmer(lambda: app.state.model)
+        await app.state.cache_warmer.start()
+        logger.info("Cache warmer started")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down application...")
+    if app.state.cache_warmer is not None:
+        await app.state.cache_warmer.stop()
+        app.state.cache_warmer = None
+    await item_filter.stop()
+    await app.state.model_manager.stop()
+    if app.state.batcher is not None:
+        await app.state.batcher.stop()
+        app.state.batcher = None
+    await close_inference_executor()
     await close_db_pool()
-    await close_producer()
+    await stop_invalidation_listener()
     await close_redis()
+    stop_logging()
 
 
 app.include_router(router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
 
 
 if __name__ == "__main__":
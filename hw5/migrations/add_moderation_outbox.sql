@@ -0,0 +1,8 @@
+-- Transactional outbox: сообщения для Kafka пишутся в одной транзакции с задачей модерации,
+-- relay (python -m app.workers.outbox_relay) пачками отправляет их и удаляет
+CREATE TABLE IF NOT EXISTS moderation_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    topic VARCHAR(255) NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -1,41 +1,137 @@
 import numpy as np
-from sklearn.linear_model import LogisticRegression
 import pickle
 import os
+import json
+import struct
+import hashlib
+from app.inference.scorer import LogisticScorer
 
+MODEL_PATH = os.getenv("MODEL_PATH", "model.weights")
+PICKLE_MODEL_PATH = "model.pkl"
 
-def train_model():
-    """Обучает простую модель на синтетических данных."""
-    np.random.seed(42)
-    # Признаки: [is_verified_seller, images_qty, description_length, category]
-    X = np.random.rand(1000, 4)
+# Признаки в порядке, в котором их ждёт модель
+FEATURE_NAMES = ["is_verified_seller", "images_qty", "description_length", "category"]
+
+# Формат model.weights:
+#   magic (4 байта) | длина заголовка uint32 LE | JSON-заголовок | выравнивание до 64 | веса float64 LE
+# Веса лежат по выровненному смещению, поэтому читаются через np.memmap без копирования,
+# и все процессы на машине делят одни и те же страницы page cache.
+WEIGHTS_MAGIC = b"MODW"
+WEIGHTS_FORMAT_VERSION = 1
+WEIGHTS_DTYPE = "<f8"
+_WEIGHTS_ALIGN = 64
+
+
+def make_training_data(n_samples=1000, seed=42):
+    """Синтетическая выборка: признаки [is_verified_seller, images_qty, description_length, category]."""
+    np.random.seed(seed)
+    X = np.random.rand(n_samples, 4)
     # Целевая переменная: 1 = нарушение, 0 = нет нарушения
     y = (X[:, 0] < 0.3) & (X[:, 1] < 0.2)
-    y = y.astype(int)
-    
+    return X, y.astype(int)
+
+
+def train_model(n_samples=1000, seed=42):
+    """Обучает простую модель на синтетических данных."""
+    from sklearn.linear_model import LogisticRegression
+
+    X, y = make_training_data(n_samples, seed)
     model = LogisticRegression()
     model.fit(X, y)
     return model
 
 
-def save_model(model, path="model.pkl"):
+def _atomic_write(path, data: bytes):
+    """Пишет файл во временный рядом и атомарно подменяет: читатели видят либо старую, либо новую версию."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_model(model, path=PICKLE_MODEL_PATH):
     """Сохраняет модель в файл."""
-    with open(path, "wb") as f:
-        pickle.dump(model, f)
+    _atomic_write(path, pickle.dumps(model))
 
 
-def load_model(path="model.pkl"):
+def load_model(path=PICKLE_MODEL_PATH):
     """Загружает модель из файла."""
     with open(path, "rb") as f:
         return pickle.load(f)
 
 
-def get_or_train_model(path="model.pkl"):
-    """Загружает модель из файла, если файла нет - обучает и сохраняет."""
-    if os.path.exists(path):
-        return load_model(path)
-    else:
-        model = train_model()
-        save_model(model, path)
-        return model
+def pack_weights(scorer: LogisticScorer) -> np.ndarray:
+    """Коэффициенты и свободный член одним вектором — в том виде, в каком они лежат в model.weights."""
+    return np.append(scorer.coef, scorer.intercept).astype(WEIGHTS_DTYPE)
+
+
+def weights_version(weights: np.ndarray) -> str:
+    """
+    Версия модели — префикс sha256 упакованных коэффициентов. Не зависит от формата артефакта:
+    одна и та же модель из .pkl и из model.weights получает одну версию (и одни ключи кеша).
+    """
+    return hashlib.sha256(weights.tobytes()).hexdigest()[:12]
+
+
+def export_weights(model, path=MODEL_PATH, metadata=None) -> dict:
+    """Экспортирует коэффициенты sklearn-модели в model.weights. Возвращает заголовок."""
+    weights = pack_weights(LogisticScorer.from_sklearn(model))
+    checksum = hashlib.sha256(weights.tobytes()).hexdigest()
+    header = {
+        "format_version": WEIGHTS_FORMAT_VERSION,
+        "model_version": weights_version(weights),
+        "feature_names": FEATURE_NAMES,
+        "n_features": weights.size - 1,
+        "dtype": WEIGHTS_DTYPE,
+        "checksum": checksum,
+        "metadata": metadata or {},
+    }
+    header_bytes = json.dumps(header).encode()
+    prefix = WEIGHTS_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+    padding = b"\0" * (-len(prefix) % _WEIGHTS_ALIGN)
+    _atomic_write(path, prefix + padding + weights.tobytes())
+    return header
+
+
+def read_weights_header(path=MODEL_PATH):
+    """Читает заголовок model.weights. Возвращает (заголовок, смещение весов)."""
+    with open(path, "rb") as f:
+        if f.read(len(WEIGHTS_MAGIC)) != WEIGHTS_MAGIC:
+            raise ValueError(f"{path} is not a model weights file")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+    if header.get("format_version") != WEIGHTS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported weights format version: {header.get('format_version')}")
+    prefix_len = len(WEIGHTS_MAGIC) + 4 + header_len
+    return header, prefix_len + (-prefix_len % _WEIGHTS_ALIGN)
+
+
+def load_weights(path=MODEL_PATH) -> LogisticScorer:
+    """Загружает скорер из model.weights через mmap и сверяет спецификацию и checksum."""
+    header, offset = read_weights_header(path)
+    if header["feature_names"] != FEATURE_NAMES:
+        raise ValueError(f"Feature spec mismatch: {header['feature_names']} != {FEATURE_NAMES}")
+    weights = np.memmap(path, dtype=header["dtype"], mode="r", offset=offset, shape=(header["n_features"] + 1,))
+    if hashlib.sha256(weights.tobytes()).hexdigest() != header["checksum"]:
+        raise ValueError(f"Checksum mismatch for {path}")
+    return LogisticScorer(weights[:-1], weights[-1], version=header["model_version"])
+
+
+def load_scorer(path=MODEL_PATH):
+    """
+    Загружает скорер для сервинга: model.weights через mmap, .pkl — через sklearn.
+    Никогда не обучает модель: если артефакта нет, падает с FileNotFoundError
+    (обучение — отдельной командой python -m app.cli.train).
+    """
+    if not path.endswith(".pkl"):
+        return load_weights(path)
+    scorer = LogisticScorer.from_sklearn(load_model(path))
+    scorer.version = weights_version(pack_weights(scorer))
+    return scorer
 
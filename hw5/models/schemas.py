@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Annotated, List, Optional
+
+MAX_BATCH_SIZE = 10000
 
 
 class PredictRequest(BaseModel):
@@ -17,6 +19,29 @@ class PredictResponse(BaseModel):
     probability: float = Field(..., ge=0.0, le=1.0)
 
 
+class PredictBatchRequest(BaseModel):
+    items: List[PredictRequest] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class PredictBatchResponse(BaseModel):
+    results: List[PredictResponse] = Field(...)
+
+
+class SimplePredictBatchRequest(BaseModel):
+    item_ids: List[Annotated[int, Field(ge=1)]] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class SimplePredictBatchItem(BaseModel):
+    item_id: int = Field(...)
+    # "ok" или "not_found"
+    status: str = Field(...)
+    result: Optional[PredictResponse] = None
+
+
+class SimplePredictBatchResponse(BaseModel):
+    results: List[SimplePredictBatchItem] = Field(...)
+
+
 class AsyncPredictRequest(BaseModel):
     item_id: int = Field(..., ge=1)
 
@@ -34,3 +59,16 @@ class ModerationResultResponse(BaseModel):
     probability: Optional[float] = Field(None, ge=0.0, le=1.0)
     error_message: Optional[str] = None
 
+
+class IngestResponse(BaseModel):
+    kind: str = Field(...)
+    # Прочитано строк, в том числе отклонённых
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    # Объявления с неизвестным seller_id
+    skipped: int = 0
+    # Невалидные строки
+    rejected: int = 0
+    elapsed_sec: float = 0.0
+    rows_per_sec: float = 0.0
@@ -1,46 +1,308 @@
-from database import get_db_pool
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from database import get_db_pool, warm_statement
+from app import metrics
+from app.storages.cache_storage import (
+    forget_item_missing,
+    is_item_known_missing,
+    mark_item_missing,
+    mark_items_missing,
+)
+from app.storages.item_filter import item_filter
+
+logger = logging.getLogger(__name__)
+
+# Коалесцировать одиночные чтения объявлений в пачки (см. ItemLoader)
+ITEM_LOADER_ENABLED = os.getenv("ITEM_LOADER_ENABLED", "0") == "1"
+# Сколько ждать добора пачки; 0 — только чтения из того же прохода event loop
+ITEM_LOADER_WINDOW_MS = float(os.getenv("ITEM_LOADER_WINDOW_MS", "0"))
+ITEM_LOADER_MAX_BATCH = int(os.getenv("ITEM_LOADER_MAX_BATCH", "500"))
+
+ITEM_COLUMNS = ("item_id", "seller_id", "name", "description", "category", "images_qty")
+
+_ITEM_SELECT = """SELECT i.item_id, i.seller_id, i.name, i.description, i.category, i.images_qty,
+                          u.is_verified_seller
+                   FROM items i
+                   JOIN users u ON i.seller_id = u.seller_id"""
+
+_FEATURES_SELECT = """SELECT i.item_id, i.seller_id, i.category, i.images_qty,
+                          length(i.description) AS description_length,
+                          u.is_verified_seller
+                   FROM items i
+                   JOIN users u ON i.seller_id = u.seller_id"""
+
+
+_BY_ID = "\n                   WHERE i.item_id = $1"
+_BY_IDS = "\n                   WHERE i.item_id = ANY($1)"
+
+# id 0 не бывает (item_id >= 1): на соединении только готовится план
+for _select in (_ITEM_SELECT, _FEATURES_SELECT):
+    warm_statement(_select + _BY_ID, 0)
+    warm_statement(_select + _BY_IDS, [])
+
+
+@asynccontextmanager
+async def _connection():
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        yield conn
+
+
+async def _fetch_rows(select: str, item_ids: List[int]) -> Dict[int, dict]:
+    metrics.inc("item_queries_total")
+    async with _connection() as conn:
+        rows = await conn.fetch(select + _BY_IDS, item_ids)
+    return {row["item_id"]: dict(row) for row in rows}
+
+
+async def _fetch_row(select: str, item_id: int) -> Optional[dict]:
+    metrics.inc("item_queries_total")
+    async with _connection() as conn:
+        row = await conn.fetchrow(select + _BY_ID, item_id)
+    return dict(row) if row else None
+
+
+class ItemLoader:
+    """
+    DataLoader: чтения по item_id, пришедшие за один проход event loop (или за window_ms),
+    уходят в БД одним batch_fn(ids) — один connection из пула и один запрос = ANY($1) вместо
+    запроса на каждое. Повторные id в пачке загружаются один раз, результат получают все.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[int]], Awaitable[Dict[int, dict]]],
+        window_ms: float = ITEM_LOADER_WINDOW_MS,
+        max_batch_size: int = ITEM_LOADER_MAX_BATCH,
+    ):
+        self.name = name
+        self._batch_fn = batch_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._handle: Optional[asyncio.Handle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, item_id: int) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый event loop (например, asyncio.run в CLI): future старого здесь не дождаться
+            self._loop, self._pending, self._handle = loop, {}, None
+        metrics.inc(f"{self.name}_loads_total")
+        future = self._pending.get(item_id)
+        if future is None:
+            future = loop.create_future()
+            self._pending[item_id] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self._handle is None:
+                if self.window > 0:
+                    self._handle = loop.call_later(self.window, self._dispatch)
+                else:
+                    self._handle = loop.call_soon(self._dispatch)
+        else:
+            metrics.inc(f"{self.name}_deduplicated_total")
+        # Отмена одного вызывающего не должна отменять загрузку для остальных
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._load_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self, batch: Dict[int, asyncio.Future]):
+        metrics.inc(f"{self.name}_batches_total")
+        metrics.observe(f"{self.name}_batch_size", len(batch))
+        try:
+            rows = await self._batch_fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for item_id, future in batch.items():
+            if not future.done():
+                future.set_result(rows.get(item_id))
+
+
+_item_loader = ItemLoader("item_loader", lambda item_ids: _fetch_rows(_ITEM_SELECT, item_ids))
+_features_loader = ItemLoader("item_features_loader", lambda item_ids: _fetch_rows(_FEATURES_SELECT, item_ids))
+
+
+async def known_missing(item_id: int) -> bool:
+    """
+    Ответ «объявления нет» без запроса к БД: по негативному кешу (отсутствие уже подтвердила БД),
+    затем по фильтру существования. Устаревший фильтр (см. ItemExistenceFilter.mark_stale)
+    никого не отсекает — промах проверяется запросом в БД.
+    """
+    try:
+        if await is_item_known_missing(item_id):
+            return True
+    except Exception as e:
+        # Недоступный кеш не должен ломать чтение — решает фильтр или БД
+        logger.warning("Negative cache lookup failed: item_id=%s, error=%s", item_id, e)
+    if not item_filter.might_contain(item_id):
+        metrics.inc("item_filter_rejections_total")
+        return True
+    return False
+
+
+async def _remember_missing(item_id: int):
+    try:
+        await mark_item_missing(item_id)
+    except Exception as e:
+        logger.warning("Negative cache write failed: item_id=%s, error=%s", item_id, e)
+
+
+async def _load(select: str, loader: ItemLoader, item_id: int) -> Optional[dict]:
+    if await known_missing(item_id):
+        return None
+    try:
+        if ITEM_LOADER_ENABLED:
+            row = await loader.load(item_id)
+        else:
+            row = await _fetch_row(select, item_id)
+    except Exception as e:
+        raise Exception(f"Database error: {str(e)}")
+    if row is None:
+        await _remember_missing(item_id)
+    return row
 
 
 async def get_item_by_item_id(item_id: int):
+    return await _load(_ITEM_SELECT, _item_loader, item_id)
+
+
+async def get_item_features_by_item_id(item_id: int):
+    """Только признаки для модели: вместо текста описания БД отдаёт его длину."""
+    return await _load(_FEATURES_SELECT, _features_loader, item_id)
+
+
+async def get_item_features_by_item_ids(item_ids: List[int]) -> Dict[int, dict]:
+    """
+    Признаки пачки объявлений одним запросом (= ANY($1)) вместо запроса на каждое.
+    Ключ — item_id; ненайденных объявлений в ответе нет, они попадают в негативный кеш.
+    """
+    candidates = [item_id for item_id in item_ids if item_filter.might_contain(item_id)]
+    if len(candidates) < len(item_ids):
+        metrics.inc("item_filter_rejections_total", len(item_ids) - len(candidates))
+    if not candidates:
+        return {}
+    try:
+        found = await _fetch_rows(_FEATURES_SELECT, candidates)
+    except Exception as e:
+        raise Exception(f"Database error: {str(e)}")
+    absent = [item_id for item_id in candidates if item_id not in found]
+    if absent:
+        try:
+            await mark_items_missing(absent)
+        except Exception as e:
+            logger.warning("Negative cache write failed: items=%d, error=%s", len(absent), e)
+    return found
+
+
+async def get_open_item_features_page(after_item_id: int, limit: int):
+    """
+    Страница признаков открытых объявлений с item_id > after_item_id (keyset-пагинация:
+    стоимость страницы не растёт с её номером, в отличие от OFFSET).
+    """
     try:
-        pool = await get_db_pool()
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """SELECT i.item_id, i.seller_id, i.name, i.description, i.category, i.images_qty,
+        async with _connection() as conn:
+            rows = await conn.fetch(
+                """SELECT i.item_id, i.seller_id, i.category, i.images_qty,
+                          length(i.description) AS description_length,
                           u.is_verified_seller
                    FROM items i
                    JOIN users u ON i.seller_id = u.seller_id
-                   WHERE i.item_id = $1""",
-                item_id
+                   WHERE NOT i.is_closed AND i.item_id > $1
+                   ORDER BY i.item_id
+                   LIMIT $2""",
+                after_item_id, limit
             )
-            if row:
-                return {
-                    "item_id": row["item_id"],
-                    "seller_id": row["seller_id"],
-                    "name": row["name"],
-                    "description": row["description"],
-                    "category": row["category"],
-                    "images_qty": row["images_qty"],
-                    "is_verified_seller": row["is_verified_seller"]
-                }
-            return None
+            return [dict(row) for row in rows]
     except Exception as e:
         raise Exception(f"Database error: {str(e)}")
 
 
+async def get_item_ids_page(after_item_id: int, limit: int):
+    """Страница item_id > after_item_id по возрастанию — для пересборки фильтра существования."""
+    async with _connection() as conn:
+        rows = await conn.fetch(
+            "SELECT item_id FROM items WHERE item_id > $1 ORDER BY item_id LIMIT $2",
+            after_item_id, limit
+        )
+        return [row["item_id"] for row in rows]
+
+
 async def create_item(item_id: int, seller_id: int, name: str, description: str, category: int, images_qty: int):
-    pool = await get_db_pool()
-    async with pool.acquire() as conn:
+    async with _connection() as conn:
         await conn.execute(
             "INSERT INTO items (item_id, seller_id, name, description, category, images_qty) VALUES ($1, $2, $3, $4, $5, $6) ON CONFLICT (item_id) DO NOTHING",
             item_id, seller_id, name, description, category, images_qty
         )
+    item_filter.add(item_id)
+    try:
+        await forget_item_missing(item_id)
+    except Exception as e:
+        logger.warning("Negative cache invalidation failed: item_id=%s, error=%s", item_id, e)
+
+
+async def bulk_upsert_items(records: List[tuple]) -> Tuple[List[int], List[int], int]:
+    """
+    Пачка строк ITEM_COLUMNS без повторов item_id: COPY во временную таблицу и один
+    INSERT ... ON CONFLICT DO UPDATE (неизменившиеся строки не переписываются).
+    Строки с неизвестным продавцом пропускаются. Возвращает (созданные item_id, изменённые item_id,
+    число пропущенных). Кеш и фильтр существования не трогает — это делает вызывающий.
+    """
+    async with _connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                """CREATE TEMP TABLE items_staging (
+                       item_id integer, seller_id integer, name varchar(255), description text,
+                       category integer, images_qty integer
+                   ) ON COMMIT DROP"""
+            )
+            await conn.copy_records_to_table("items_staging", records=records, columns=ITEM_COLUMNS)
+            skipped = await conn.fetchval(
+                """SELECT count(*) FROM items_staging s
+                   WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.seller_id = s.seller_id)"""
+            )
+            rows = await conn.fetch(
+                """INSERT INTO items (item_id, seller_id, name, description, category, images_qty)
+                   SELECT s.item_id, s.seller_id, s.name, s.description, s.category, s.images_qty
+                   FROM items_staging s
+                   JOIN users u ON u.seller_id = s.seller_id
+                   ON CONFLICT (item_id) DO UPDATE SET
+                       seller_id = EXCLUDED.seller_id, name = EXCLUDED.name, description = EXCLUDED.description,
+                       category = EXCLUDED.category, images_qty = EXCLUDED.images_qty
+                   WHERE (items.seller_id, items.name, items.description, items.category, items.images_qty)
+                         IS DISTINCT FROM
+                         (EXCLUDED.seller_id, EXCLUDED.name, EXCLUDED.description, EXCLUDED.category, EXCLUDED.images_qty)
+                   RETURNING item_id, (xmax = 0) AS inserted"""
+            )
+    inserted = [row["item_id"] for row in rows if row["inserted"]]
+    updated = [row["item_id"] for row in rows if not row["inserted"]]
+    return inserted, updated, skipped
 
 
 async def delete_item_by_item_id(item_id: int) -> bool:
     """Удалить объявление по item_id. Возвращает True, если строка была удалена."""
-    pool = await get_db_pool()
-    async with pool.acquire() as conn:
+    async with _connection() as conn:
         result = await conn.execute("DELETE FROM items WHERE item_id = $1", item_id)
-        # asyncpg returns e.g. "DELETE 1" or "DELETE 0"
-        return int(result.split()[-1]) > 0
\ No newline at end of file
+    # asyncpg returns e.g. "DELETE 1" or "DELETE 0"
+    deleted = int(result.split()[-1]) > 0
+    if deleted:
+        item_filter.remove(item_id)
+        await _remember_missing(item_id)
+    return deleted
\ No newline at end of file
@@ -1,4 +1,12 @@
+import logging
+from typing import List, Tuple
+
 from database import get_db_pool
+from app.storages.cache_storage import CacheUnavailable, invalidate_seller_predictions
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = ("seller_id", "is_verified_seller")
 
 
 async def get_user_by_seller_id(seller_id: int):
@@ -24,3 +32,49 @@ async def create_user(seller_id: int, is_verified_seller: bool):
             seller_id, is_verified_seller
         )
 
+
+async def bulk_upsert_users(records: List[Tuple[int, bool]]) -> Tuple[List[int], List[int]]:
+    """
+    Пачка (seller_id, is_verified_seller) без повторов seller_id: COPY во временную таблицу
+    и один INSERT ... ON CONFLICT DO UPDATE. Возвращает (созданные seller_id, seller_id со сменой
+    верификации). Кеш не трогает — это делает вызывающий (см. services/ingest_service.py).
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "CREATE TEMP TABLE users_staging (seller_id integer, is_verified_seller boolean) ON COMMIT DROP"
+            )
+            await conn.copy_records_to_table("users_staging", records=records, columns=USER_COLUMNS)
+            rows = await conn.fetch(
+                """INSERT INTO users (seller_id, is_verified_seller)
+                   SELECT seller_id, is_verified_seller FROM users_staging
+                   ON CONFLICT (seller_id) DO UPDATE SET is_verified_seller = EXCLUDED.is_verified_seller
+                   WHERE users.is_verified_seller IS DISTINCT FROM EXCLUDED.is_verified_seller
+                   RETURNING seller_id, (xmax = 0) AS inserted"""
+            )
+    inserted = [row["seller_id"] for row in rows if row["inserted"]]
+    changed = [row["seller_id"] for row in rows if not row["inserted"]]
+    return inserted, changed
+
+
+async def set_seller_verification(seller_id: int, is_verified_seller: bool) -> bool:
+    """
+    Меняет верификацию продавца. Это признак модели, поэтому при изменении сбрасываются
+    закешированные предсказания всех его объявлений. Возвращает True, если значение изменилось.
+    Недоступный кеш не делает ошибкой уже сохранённое изменение: сброс досылается в фоне.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            "UPDATE users SET is_verified_seller = $2 WHERE seller_id = $1 AND is_verified_seller IS DISTINCT FROM $2",
+            seller_id, is_verified_seller
+        )
+    changed = int(result.split()[-1]) > 0
+    if changed:
+        try:
+            await invalidate_seller_predictions(seller_id)
+        except CacheUnavailable as e:
+            # Повтор запроса ничего не сбросил бы: IS DISTINCT FROM уже не найдёт изменения
+            logger.warning("Seller cache invalidation queued for retry: seller_id=%s, error=%s", seller_id, e)
+    return changed
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from models.schemas import IngestResponse
+from services.ingest_service import ingest, iter_lines
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/admin")
+
+
+@router.get("/model")
+async def get_model_info(req: Request) -> dict:
+    """
+    Текущая загруженная модель.
+    """
+    manager = req.app.state.model_manager
+    return {"path": manager.path, "version": manager.version}
+
+
+@router.post("/model/reload")
+async def reload_model(req: Request, force: bool = Query(False)) -> dict:
+    """
+    Перечитать артефакт модели и атомарно подменить её без рестарта.
+    """
+    manager = req.app.state.model_manager
+    try:
+        reloaded = await manager.reload(force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+    return {"reloaded": reloaded, "version": manager.version}
+
+
+@router.post("/ingest/{kind}", response_model=IngestResponse)
+async def ingest_records(
+    req: Request,
+    kind: str = Path(..., pattern="^(users|items)$"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+) -> IngestResponse:
+    """
+    Массовая загрузка продавцов или объявлений: тело запроса — CSV с заголовком или NDJSON,
+    читается потоком. Отвечает счётчиками строк и скоростью загрузки.
+    """
+    try:
+        return await ingest(kind, iter_lines(req.stream()), format)
+    except Exception as e:
+        logger.error("Ingest failed: kind=%s, error=%s", kind, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Ingest failed: {str(e)}")
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from app import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics() -> dict:
+    """
+    Снимок in-process метрик (кеш, батчинг, модель и т.д.).
+    """
+    return metrics.snapshot()
@@ -1,64 +1,138 @@
 from fastapi import APIRouter, HTTPException, Query, Path, Request
 from models.schemas import (
     PredictRequest, PredictResponse,
+    PredictBatchRequest, PredictBatchResponse,
+    SimplePredictBatchRequest, SimplePredictBatchItem, SimplePredictBatchResponse,
     AsyncPredictRequest, AsyncPredictResponse,
     ModerationResultResponse
 )
-from services.predict_service import predict_moderation, predict_from_db
+from services.predict_service import (
+    predict_moderation, predict_raw_batch, predict_item_from_db, predict_items_from_db, raw_features
+)
 from app.repositories.moderation_repository import (
-    create_moderation_task,
+    enqueue_moderation_task,
     get_moderation_task,
-    update_moderation_result,
     delete_moderation_results_by_item_id,
 )
-from app.clients.kafka import send_moderation_request
+from app.clients.kafka import MODERATION_TOPIC
+from app.inference.executor import get_inference_executor
 from app.storages.cache_storage import (
-    get_cached_prediction_by_request,
-    set_cached_prediction_by_request,
+    CacheUnavailable,
+    get_cached_prediction_by_features,
+    set_cached_prediction_by_features,
+    get_cached_predictions_by_features,
+    set_cached_predictions_by_features,
     get_cached_prediction_by_item,
     set_cached_prediction_by_item,
+    get_cached_predictions_by_items,
+    set_cached_predictions_by_items,
     get_cached_moderation_result,
     set_cached_moderation_result,
     delete_cached_prediction_for_item,
+    coalesce_prediction_by_features,
+    coalesce_prediction_by_item,
+    coalesce_moderation_result,
 )
-from repositories.item_repository import get_item_by_item_id, delete_item_by_item_id
+from repositories.item_repository import get_item_by_item_id, delete_item_by_item_id, known_missing
+from app import metrics
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+async def _predict(request: PredictRequest, req: Request, model) -> PredictResponse:
+    # model — тот же объект, по версии которого строится ключ кеша: горячая замена посреди
+    # запроса не должна положить ответ новой модели под ключ старой
+    batcher = getattr(req.app.state, "batcher", None)
+    if batcher is not None:
+        return await batcher.submit(raw_features(request), model)
+    executor = await get_inference_executor()
+    return await executor.run(predict_moderation, request, model)
+
+
 @router.post("/predict", response_model=PredictResponse)
 async def predict(request: PredictRequest, req: Request) -> PredictResponse:
     if req.app.state.model is None:
         raise HTTPException(status_code=503, detail="Service Unavailable: Model is not loaded")
 
-    cached = await get_cached_prediction_by_request(request.model_dump())
+    model = req.app.state.model
+    features = raw_features(request)
+
+    async def compute() -> PredictResponse:
+        result = await _predict(request, req, model)
+        await set_cached_prediction_by_features(features, model.version, result)
+        return result
+
+    cached = await get_cached_prediction_by_features(features, model.version, refresh=compute)
     if cached is not None:
         return cached
 
     try:
-        result = predict_moderation(request, req.app.state.model)
-        await set_cached_prediction_by_request(request.model_dump(), result)
-        return result
+        return await coalesce_prediction_by_features(features, model.version, compute)
     except Exception as e:
         logger.error(f"Error during prediction: {e}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+@router.post("/predict_batch", response_model=PredictBatchResponse)
+async def predict_batch(request: PredictBatchRequest, req: Request) -> PredictBatchResponse:
+    """
+    Пакетное предсказание: один MGET по кешу, один вызов модели на все промахи.
+    """
+    if req.app.state.model is None:
+        raise HTTPException(status_code=503, detail="Service Unavailable: Model is not loaded")
+
+    model = req.app.state.model
+
+    async def compute(rows):
+        executor = await get_inference_executor()
+        started = time.monotonic()
+        computed = await executor.run(predict_raw_batch, rows, model)
+        # Стоимость пересчёта — в запись: по ней XFetch решает, насколько заранее обновлять
+        await set_cached_predictions_by_features(
+            list(zip(rows, computed)), model.version, delta=time.monotonic() - started
+        )
+        return computed
+
+    features_rows = [raw_features(item) for item in request.items]
+    results = await get_cached_predictions_by_features(features_rows, model.version, refresh=compute)
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    if not missing:
+        return PredictBatchResponse(results=results)
+
+    try:
+        computed = await compute([features_rows[i] for i in missing])
+        for i, result in zip(missing, computed):
+            results[i] = result
+        return PredictBatchResponse(results=results)
+    except Exception as e:
+        logger.error(f"Error during batch prediction: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
 @router.post("/simple_predict", response_model=PredictResponse)
 async def simple_predict(req: Request, item_id: int = Query(..., ge=1)) -> PredictResponse:
     if req.app.state.model is None:
         raise HTTPException(status_code=503, detail="Service Unavailable: Model is not loaded")
 
-    cached = await get_cached_prediction_by_item(item_id)
+    model = req.app.state.model
+
+    async def compute() -> PredictResponse:
+        item, result = await predict_item_from_db(item_id, model, getattr(req.app.state, "batcher", None))
+        # seller_id — чтобы кеш можно было сбросить при смене верификации продавца
+        await set_cached_prediction_by_item(item_id, model.version, result, seller_id=item["seller_id"])
+        return result
+
+    # Устаревшее значение отдаём сразу, а compute() запускается в фоне
+    cached = await get_cached_prediction_by_item(item_id, model.version, refresh=compute)
     if cached is not None:
         return cached
 
     try:
-        result = await predict_from_db(item_id, req.app.state.model)
-        await set_cached_prediction_by_item(item_id, result)
-        return result
+        # Конкурентные промахи по одному item_id ждут один пересчёт
+        return await coalesce_prediction_by_item(item_id, model.version, compute)
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -66,55 +140,76 @@ async def simple_predict(req: Request, item_id: int = Query(..., ge=1)) -> Predi
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+@router.post("/simple_predict_batch", response_model=SimplePredictBatchResponse)
+async def simple_predict_batch(request: SimplePredictBatchRequest, req: Request) -> SimplePredictBatchResponse:
+    """
+    /simple_predict для списка item_id: один MGET по кешу, один запрос в БД (= ANY($1)) и один
+    вызов модели на все промахи, запись в кеш одним pipeline. Для каждого id — статус ok или not_found.
+    """
+    if req.app.state.model is None:
+        raise HTTPException(status_code=503, detail="Service Unavailable: Model is not loaded")
+
+    model = req.app.state.model
+
+    async def compute(item_ids):
+        predicted = await predict_items_from_db(item_ids, model)
+        try:
+            await set_cached_predictions_by_items(
+                [(item_id, item["seller_id"], result) for item_id, (item, result) in predicted.items()],
+                model.version,
+            )
+        except CacheUnavailable as e:
+            # Ответ уже посчитан — недоступный кеш его не отменяет
+            logger.warning("Failed to cache batch predictions: items=%d, error=%s", len(predicted), e)
+        return {item_id: result for item_id, (_, result) in predicted.items()}
+
+    item_ids = list(dict.fromkeys(request.item_ids))
+    cached = await get_cached_predictions_by_items(item_ids, model.version, refresh=compute)
+    results = dict(zip(item_ids, cached))
+    missing = [item_id for item_id, result in results.items() if result is None]
+    if missing:
+        try:
+            results.update(await compute(missing))
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error during simple batch prediction: %s", e, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+    return SimplePredictBatchResponse(results=[
+        SimplePredictBatchItem(
+            item_id=item_id,
+            status="ok" if results[item_id] is not None else "not_found",
+            result=results[item_id],
+        )
+        for item_id in request.item_ids
+    ])
+
+
 @router.post("/async_predict", response_model=AsyncPredictResponse)
 async def async_predict(request: AsyncPredictRequest) -> AsyncPredictResponse:
     """
-    Create an async moderation task and send it to Kafka.
+    Create an async moderation task. The task and its Kafka message are written to PostgreSQL
+    in one statement (transactional outbox); app.workers.outbox_relay sends the message.
     """
     item_id = request.item_id
-    
-    # Check if advertisement exists
-    try:
-        item_data = await get_item_by_item_id(item_id)
-        if item_data is None:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Advertisement with item_id={item_id} not found"
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error checking item existence: {e}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Database error: {str(e)}"
-        )
-    
-    # Create moderation task
+
     try:
-        task_id = await create_moderation_task(item_id)
+        # Заведомо несуществующие объявления отсекаем без БД; остальные проверяет сам запрос
+        task_id = None if await known_missing(item_id) else await enqueue_moderation_task(item_id, MODERATION_TOPIC)
     except Exception as e:
         logger.error(f"Error creating moderation task: {e}")
         raise HTTPException(
-            status_code=500, 
+            status_code=500,
             detail=f"Failed to create moderation task: {str(e)}"
         )
-    
-    # Send message to Kafka
-    try:
-        await send_moderation_request(item_id)
-    except Exception as e:
-        logger.error(f"Error sending message to Kafka: {e}")
-        await update_moderation_result(
-            task_id=task_id,
-            status="failed",
-            error_message=f"Failed to send to Kafka: {str(e)}"
-        )
+
+    if task_id is None:
         raise HTTPException(
-            status_code=500,
-            detail=f"Failed to send moderation request: {str(e)}"
+            status_code=404,
+            detail=f"Advertisement with item_id={item_id} not found"
         )
-    
+
     return AsyncPredictResponse(
         task_id=task_id,
         status="pending",
@@ -129,11 +224,7 @@ async def get_moderation_result(
     """
     Get moderation result by task_id.
     """
-    cached = await get_cached_moderation_result(task_id)
-    if cached is not None:
-        return cached
-
-    try:
+    async def compute() -> ModerationResultResponse:
         task = await get_moderation_task(task_id)
         if task is None:
             raise HTTPException(
@@ -150,6 +241,13 @@ async def get_moderation_result(
         )
         await set_cached_moderation_result(task_id, result)
         return result
+
+    cached = await get_cached_moderation_result(task_id, refresh=compute)
+    if cached is not None:
+        return cached
+
+    try:
+        return await coalesce_moderation_result(task_id, compute)
     except HTTPException:
         raise
     except Exception as e:
@@ -177,9 +275,16 @@ async def close_advertisement(item_id: int = Query(..., ge=1)) -> None:
         deleted = await delete_item_by_item_id(item_id)
         if not deleted:
             raise HTTPException(status_code=500, detail="Failed to delete item")
-        await delete_cached_prediction_for_item(item_id)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error closing advertisement: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+    try:
+        await delete_cached_prediction_for_item(item_id)
+    except CacheUnavailable as e:
+        # Объявление уже удалено из БД: 500 заставил бы клиента повторить запрос и получить 404.
+        # Удаление из Redis и L1 остальных реплик досылается в фоне (см. cache_storage._delete_keys)
+        metrics.inc("close_cache_invalidation_failures_total")
+        logger.warning("Failed to invalidate cache on close: item_id=%s, error=%s", item_id, e)
\ No newline at end of file
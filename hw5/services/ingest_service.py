@@ -0,0 +1,228 @@
+"""
+Массовая загрузка продавцов и объявлений из CSV (с заголовком) или NDJSON.
+
+Строки читаются потоком и копятся в пачки по batch_size; каждая пачка уходит в Postgres
+через COPY во временную таблицу и один upsert (см. bulk_upsert_users / bulk_upsert_items),
+после чего из кеша удаляются затронутые ключи. Невалидные строки пропускаются и считаются.
+"""
+import codecs
+import csv
+import json
+import logging
+import os
+import time
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, List, Optional
+
+from app import metrics
+from app.storages.cache_storage import (
+    CacheUnavailable,
+    delete_cached_predictions_for_items,
+    forget_items_missing,
+    invalidate_seller_predictions,
+)
+from models.schemas import IngestResponse
+from repositories.item_repository import bulk_upsert_items
+from repositories.user_repository import bulk_upsert_users
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50000"))
+FORMATS = ("csv", "ndjson")
+KINDS = ("users", "items")
+
+# Сколько строк CSV разбирать за раз
+_CSV_CHUNK_LINES = 1000
+_TRUE = {"1", "true", "t", "yes", "y"}
+_FALSE = {"0", "false", "f", "no", "n"}
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Байтовый поток (тело запроса, файл) в строки UTF-8 с сохранённым переводом строки.
+    Режем только по "\n": str.splitlines разрезал бы и по U+2028, \x1c и т. п., которые
+    могут стоять внутри значения (json.dumps(ensure_ascii=False) их не экранирует).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _csv_rows(lines: AsyncIterable[str]) -> AsyncIterator[Dict[str, str]]:
+    # Строку не режем посреди значения в кавычках: в описании бывают переводы строк
+    header: Optional[List[str]] = None
+    buffer: List[str] = []
+    in_quotes = False
+
+    async for line in lines:
+        buffer.append(line)
+        if line.count('"') % 2:
+            in_quotes = not in_quotes
+        if in_quotes or len(buffer) < _CSV_CHUNK_LINES:
+            continue
+        for values in csv.reader(buffer):
+            if header is None:
+                header = [name.strip() for name in values]
+            elif values:
+                yield dict(zip(header, values))
+        buffer = []
+
+    for values in csv.reader(buffer):
+        if header is None:
+            header = [name.strip() for name in values]
+        elif values:
+            yield dict(zip(header, values))
+
+
+async def _ndjson_rows(lines: AsyncIterable[str]) -> AsyncIterator[Optional[dict]]:
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+def _int(row: dict, name: str, minimum: int) -> int:
+    try:
+        value = int(row[name])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidRecord(f"{name} must be an integer")
+    if value < minimum:
+        raise InvalidRecord(f"{name} must be >= {minimum}")
+    return value
+
+
+def _bool(row: dict, name: str) -> bool:
+    value = row.get(name)
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise InvalidRecord(f"{name} must be a boolean")
+
+
+def _text(row: dict, name: str, max_length: Optional[int] = None) -> str:
+    value = row.get(name)
+    if not isinstance(value, str) or not value:
+        raise InvalidRecord(f"{name} must be a non-empty string")
+    if max_length is not None and len(value) > max_length:
+        raise InvalidRecord(f"{name} is longer than {max_length}")
+    return value
+
+
+def parse_user(row: dict) -> tuple:
+    """Строка в запись USER_COLUMNS; ограничения те же, что у API."""
+    return _int(row, "seller_id", 1), _bool(row, "is_verified_seller")
+
+
+def parse_item(row: dict) -> tuple:
+    """Строка в запись ITEM_COLUMNS; ограничения те же, что у PredictRequest и схемы items."""
+    return (
+        _int(row, "item_id", 1),
+        _int(row, "seller_id", 1),
+        _text(row, "name", 255),
+        _text(row, "description"),
+        _int(row, "category", 1),
+        _int(row, "images_qty", 0),
+    )
+
+
+async def _invalidate(action: str, invalidate: Callable, ids: List[int]):
+    # Данные в БД уже записаны: недоступный кеш не откатывает загрузку, а доживает до TTL
+    try:
+        await invalidate(ids)
+    except CacheUnavailable as e:
+        metrics.inc("ingest_cache_invalidation_failures_total")
+        logger.warning("Ingest cache invalidation failed: action=%s, keys=%d, error=%s", action, len(ids), e)
+
+
+async def _invalidate_sellers(seller_ids: List[int]):
+    for seller_id in seller_ids:
+        await invalidate_seller_predictions(seller_id)
+
+
+async def _flush_users(records: Dict[int, tuple], report: IngestResponse):
+    inserted, changed = await bulk_upsert_users(list(records.values()))
+    report.inserted += len(inserted)
+    report.updated += len(changed)
+    # Верификация — признак модели: предсказания по объявлениям продавца устарели
+    await _invalidate("seller_predictions", _invalidate_sellers, changed)
+
+
+async def _flush_items(records: Dict[int, tuple], report: IngestResponse):
+    inserted, updated, skipped = await bulk_upsert_items(list(records.values()))
+    report.inserted += len(inserted)
+    report.updated += len(updated)
+    report.skipped += skipped
+    # Снимает негативные записи и добавляет id в фильтр существования (в том числе на других репликах)
+    await _invalidate("missing_items", forget_items_missing, inserted)
+    await _invalidate("item_predictions", delete_cached_predictions_for_items, updated)
+
+
+async def ingest(kind: str, lines: AsyncIterable[str], fmt: str, batch_size: int = INGEST_BATCH_SIZE) -> IngestResponse:
+    """
+    Загружает продавцов (kind="users") или объявления (kind="items") из потока строк CSV/NDJSON.
+    Повторы ключа внутри пачки схлопываются — побеждает последняя строка.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown ingest kind: {kind}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown ingest format: {fmt}")
+    parse, flush = (parse_user, _flush_users) if kind == "users" else (parse_item, _flush_items)
+    rows = _csv_rows(lines) if fmt == "csv" else _ndjson_rows(lines)
+
+    report = IngestResponse(kind=kind)
+    started = time.perf_counter()
+    batch: Dict[int, tuple] = {}
+
+    async def flush_batch():
+        batch_started = time.perf_counter()
+        await flush(batch, report)
+        elapsed = time.perf_counter() - batch_started
+        metrics.inc(f"ingest_{kind}_rows_total", len(batch))
+        metrics.observe(f"ingest_{kind}_batch_ms", elapsed * 1000)
+        logger.info("Ingest batch: kind=%s, rows=%d, elapsed=%.2fs", kind, len(batch), elapsed)
+        batch.clear()
+
+    async for row in rows:
+        report.rows += 1
+        try:
+            if row is None:
+                raise InvalidRecord("not a JSON object")
+            record = parse(row)
+        except InvalidRecord as e:
+            report.rejected += 1
+            if report.rejected <= 10:
+                logger.warning("Ingest rejected row: kind=%s, row=%d, error=%s", kind, report.rows, e)
+            continue
+        batch[record[0]] = record
+        if len(batch) >= batch_size:
+            await flush_batch()
+    if batch:
+        await flush_batch()
+
+    report.elapsed_sec = time.perf_counter() - started
+    report.rows_per_sec = report.rows / report.elapsed_sec if report.elapsed_sec > 0 else 0.0
+    metrics.inc(f"ingest_{kind}_rejected_total", report.rejected)
+    metrics.set_gauge(f"ingest_{kind}_rows_per_sec", report.rows_per_sec)
+    logger.info(
+        "Ingest done: kind=%s, rows=%d, inserted=%d, updated=%d, skipped=%d, rejected=%d, rows_per_sec=%.0f",
+        kind, report.rows, report.inserted, report.updated, report.skipped, report.rejected, report.rows_per_sec,
+    )
+    return report
@@ -1,11 +1,17 @@
 import numpy as np
 import logging
+from typing import Dict, List, Tuple
 from fastapi import HTTPException
 from models.schemas import PredictRequest, PredictResponse
-from repositories.item_repository import get_item_by_item_id
+from repositories.item_repository import get_item_features_by_item_id, get_item_features_by_item_ids
+from app.inference.executor import get_inference_executor
 
 logger = logging.getLogger(__name__)
 
+# Делители для нормализации признаков:
+# [is_verified_seller, images_qty, description_length, category]
+FEATURE_SCALE = np.array([1.0, 10.0, 1000.0, 100.0])
+
 
 def prepare_features(request: PredictRequest) -> np.ndarray:
 
@@ -18,30 +24,83 @@ def prepare_features(request: PredictRequest) -> np.ndarray:
     return features
 
 
+def raw_features(request: PredictRequest) -> tuple:
+    """Сырые (ненормализованные) признаки запроса."""
+    return (request.is_verified_seller, request.images_qty, len(request.description), request.category)
+
+
+def item_raw_features(item: dict) -> tuple:
+    """Сырые признаки из строки get_item_features_by_item_id — без текста описания."""
+    return (item["is_verified_seller"], item["images_qty"], item["description_length"], item["category"])
+
+
+def scale_features(rows: List[tuple]) -> np.ndarray:
+    """Собирает матрицу признаков (n, 4) из сырых признаков."""
+    raw = np.array(rows, dtype=np.float64).reshape(-1, FEATURE_SCALE.size)
+    return raw / FEATURE_SCALE
+
+
+def prepare_features_batch(requests: List[PredictRequest]) -> np.ndarray:
+    """Собирает матрицу признаков (n, 4) для пачки запросов."""
+    return scale_features([raw_features(r) for r in requests])
+
+
 def predict_moderation(request: PredictRequest, model) -> PredictResponse:
+    # Ленивое %-форматирование: строка собирается, только если запись реально пишется
     logger.info(
-        f"Request: seller_id={request.seller_id}, item_id={request.item_id}, "
-        f"is_verified_seller={request.is_verified_seller}, images_qty={request.images_qty}, "
-        f"description_length={len(request.description)}, category={request.category}"
+        "Request: seller_id=%s, item_id=%s, is_verified_seller=%s, images_qty=%s, "
+        "description_length=%s, category=%s",
+        request.seller_id, request.item_id, request.is_verified_seller, request.images_qty,
+        len(request.description), request.category,
     )
     
     features = prepare_features(request)
     
-    logger.info(f"Features preparing was done, features: {features[0].tolist()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Features preparing was done, features: %s", features[0].tolist())
     
-    prediction = model.predict(features)[0]
-    probability = model.predict_proba(features)[0][1]
+    predictions, probabilities = model.predict_with_proba(features)
+    probability = probabilities[0]
     
-    is_violation = bool(prediction)
+    is_violation = bool(predictions[0])
     
-    logger.info(f"Prediction: is_violation={is_violation}, probability={probability:.4f}")
+    logger.info("Prediction: is_violation=%s, probability=%.4f", is_violation, probability)
     
     return PredictResponse(is_violation=is_violation, probability=float(probability))
 
 
-async def predict_from_db(item_id: int, model) -> PredictResponse:
+def predict_raw_batch(rows: List[tuple], model) -> List[PredictResponse]:
+    """Один вызов модели на пачку сырых признаков, результаты в порядке строк."""
+    predictions, probabilities = model.predict_with_proba(scale_features(rows))
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Batch prediction done: size=%d, violations=%d", len(rows), int(np.sum(predictions)))
+
+    return [
+        PredictResponse(is_violation=bool(prediction), probability=float(probability))
+        for prediction, probability in zip(predictions, probabilities)
+    ]
+
+
+def predict_item(item: dict, model) -> PredictResponse:
+    """Предсказание по строке признаков объявления из БД."""
+    logger.info(
+        "Item: item_id=%s, seller_id=%s, is_verified_seller=%s, images_qty=%s, description_length=%s, category=%s",
+        item["item_id"], item["seller_id"], item["is_verified_seller"], item["images_qty"],
+        item["description_length"], item["category"],
+    )
+    return predict_raw_batch([item_raw_features(item)], model)[0]
+
+
+async def predict_from_db(item_id: int, model, batcher=None) -> PredictResponse:
+    _, result = await predict_item_from_db(item_id, model, batcher)
+    return result
+
+
+async def predict_item_from_db(item_id: int, model, batcher=None) -> Tuple[dict, PredictResponse]:
+    """Как predict_from_db, но отдаёт и строку признаков объявления (нужен seller_id для кеша)."""
     try:
-        item_data = await get_item_by_item_id(item_id)
+        item_data = await get_item_features_by_item_id(item_id)
     except Exception as e:
         logger.error(f"Error getting item from DB: {e}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -50,19 +109,35 @@ async def predict_from_db(item_id: int, model) -> PredictResponse:
         raise HTTPException(status_code=404, detail=f"Item with id {item_id} not found")
     
     try:
-        request = PredictRequest(
-            seller_id=item_data["seller_id"],
-            is_verified_seller=item_data["is_verified_seller"],
-            item_id=item_data["item_id"],
-            name=item_data["name"],
-            description=item_data["description"],
-            category=item_data["category"],
-            images_qty=item_data["images_qty"]
-        )
-        
-        return predict_moderation(request, model)
+        if batcher is not None:
+            return item_data, await batcher.submit(item_raw_features(item_data), model)
+        executor = await get_inference_executor()
+        return item_data, await executor.run(predict_item, item_data, model)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in predict_from_db: {e}")
-        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error in predict_item_from_db: {e}")
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+
+async def predict_items_from_db(item_ids: List[int], model) -> Dict[int, Tuple[dict, PredictResponse]]:
+    """
+    Пачка объявлений из БД: один запрос за признаками и один вызов модели на все найденные.
+    Ключ — item_id, значение — строка признаков и предсказание; ненайденных id в ответе нет.
+    """
+    try:
+        items = await get_item_features_by_item_ids(item_ids)
+    except Exception as e:
+        logger.error("Error getting items from DB: %s", e)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if not items:
+        return {}
+
+    try:
+        executor = await get_inference_executor()
+        results = await executor.run(predict_raw_batch, [item_raw_features(item) for item in items.values()], model)
+    except Exception as e:
+        logger.error("Error in predict_items_from_db: %s", e)
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    return {item_id: (item, result) for (item_id, item), result in zip(items.items(), results)}
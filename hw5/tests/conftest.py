@@ -2,13 +2,15 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
 from main import app
-from model import get_or_train_model
+from model import load_scorer
+from app.storages import cache_storage
+from app.storages.cache_storage import clear_local_caches
 
 
 @pytest.fixture(scope="module")
 def client():
     try:
-        app.state.model = get_or_train_model()
+        app.state.model = load_scorer()
     except Exception:
         app.state.model = None
     return TestClient(app)
@@ -16,6 +18,14 @@ def client():
 
 @pytest.fixture(autouse=True)
 def mock_redis_for_unit_tests(request):
+    clear_local_caches()
+    # Breaker, разомкнутый в одном тесте, не должен отключать Redis в следующих
+    cache_storage._breaker.reset()
+    cache_storage._bulk_breaker.reset()
+    cache_storage._pending_keys.clear()
+    cache_storage._pending_sellers.clear()
+    cache_storage._pending_items.clear()
+    cache_storage._item_versions.clear()
     if "test_integration_redis" in getattr(request.module, "__name__", ""):
         yield
         return
@@ -24,5 +34,12 @@ def mock_redis_for_unit_tests(request):
     mock.setex = AsyncMock(return_value=None)
     mock.delete = AsyncMock(return_value=None)
     mock.ttl = AsyncMock(return_value=3600)
+    mock.mget = AsyncMock(side_effect=lambda keys: [None] * len(keys))
+    mock.pipeline.return_value.execute = AsyncMock(return_value=[])
+    mock.publish = AsyncMock(return_value=0)
+    mock.set = AsyncMock(return_value=True)
+    mock.eval = AsyncMock(return_value=1)
+    mock.exists = AsyncMock(return_value=0)
+    mock.zrangebyscore = AsyncMock(return_value=[])
     with patch("app.storages.cache_storage.get_redis", new_callable=AsyncMock, return_value=mock):
         yield
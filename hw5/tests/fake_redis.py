@@ -0,0 +1,147 @@
+"""
+Минимальный Redis (RESP2) на asyncio для тестов деградации кеша — без настоящего сервера.
+
+Говорит только на RESP2 (клиенту нужен protocol=2). Поддерживает команды, которыми пользуется
+cache_storage, и умеет портить ответы:
+delay — задержка перед каждым ответом, fail — ответ ошибкой, drop — разрыв соединения.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class FakeRedisServer:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[object, Optional[float]]] = {}
+        self.commands: List[bytes] = []
+        self.delay = 0.0
+        self.fail = False
+        self.drop = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self.port = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        for writer in list(self._writers):
+            writer.close()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def heal(self):
+        self.delay, self.fail, self.drop = 0.0, False, False
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    return
+                self.commands.append(args[0].upper())
+                if self.drop:
+                    return
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if self.fail:
+                    writer.write(b"-ERR injected failure\r\n")
+                else:
+                    writer.write(self._encode(self._execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _encode(self, value) -> bytes:
+        if isinstance(value, Exception):
+            return b"-ERR " + str(value).encode() + b"\r\n"
+        if value is None:
+            return b"$-1\r\n"
+        if value is True:
+            return b"+OK\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, bytes):
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"*%d\r\n" % len(value) + b"".join(self._encode(v) for v in value)
+
+    def _get(self, key: bytes):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _execute(self, args: List[bytes]):
+        command, rest = args[0].upper(), args[1:]
+        if command in (b"PING",):
+            return True
+        if command == b"CLIENT":
+            return True
+        if command == b"GET":
+            return self._get(rest[0])
+        if command == b"MGET":
+            return [self._get(key) for key in rest]
+        if command == b"EXISTS":
+            return sum(self._get(key) is not None for key in rest)
+        if command == b"SETEX":
+            self.data[rest[0]] = (rest[2], time.monotonic() + int(rest[1]))
+            return True
+        if command == b"SET":
+            key, value, options = rest[0], rest[1], [o.upper() for o in rest[2:]]
+            if b"NX" in options and self._get(key) is not None:
+                return None
+            ttl = None
+            if b"PX" in options:
+                ttl = int(options[options.index(b"PX") + 1]) / 1000
+            self.data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+            return True
+        if command == b"DEL":
+            return sum(self.data.pop(key, None) is not None for key in rest)
+        if command == b"PUBLISH":
+            return 0
+        if command == b"EXPIRE":
+            return int(self._get(rest[0]) is not None)
+        if command == b"SADD":
+            members = self._get(rest[0]) or set()
+            added = len(set(rest[1:]) - members)
+            self.data[rest[0]] = (members | set(rest[1:]), None)
+            return added
+        if command == b"SPOP":
+            members = self._get(rest[0]) or set()
+            popped = [members.pop() for _ in range(min(int(rest[1]), len(members)))]
+            return popped
+        if command == b"ZADD":
+            members = self._get(rest[0]) or {}
+            pairs = dict(zip(rest[2::2], (float(score) for score in rest[1::2])))
+            self.data[rest[0]] = ({**members, **pairs}, None)
+            return len(set(pairs) - set(members))
+        if command in (b"ZRANGEBYSCORE", b"ZREMRANGEBYSCORE"):
+            members = self._get(rest[0]) or {}
+            low, high = (float(bound) for bound in rest[1:3])
+            matched = [member for member, score in sorted(members.items(), key=lambda m: m[1]) if low <= score <= high]
+            if command == b"ZRANGEBYSCORE":
+                return matched
+            self.data[rest[0]] = ({m: score for m, score in members.items() if m not in matched}, None)
+            return len(matched)
+        return ValueError(f"unknown command '{command.decode()}'")
@@ -2,14 +2,23 @@
 
 
 import asyncio
+import time
+import numpy as np
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import ANY, AsyncMock, patch, MagicMock
 
 from fastapi.testclient import TestClient
 
 from main import app
 from app.workers.moderation_worker import process_moderation_message
-from models.schemas import PredictResponse, ModerationResultResponse
+from app import metrics
+from app.inference.batcher import MicroBatcher
+from app.inference.executor import InferenceExecutor
+from app.inference.model_manager import ModelManager
+from app.inference.scorer import LogisticScorer
+from model import load_scorer, save_model, train_model
+from models.schemas import PredictRequest, PredictResponse, ModerationResultResponse
+from services.predict_service import predict_item, predict_moderation, raw_features
 
 
 class TestSuccessfulPredictions:
@@ -54,23 +63,25 @@ class TestSimplePredictUnit:
     def test_simple_predict_cache_miss_then_set(self, client: TestClient):
         mock_get_cached = AsyncMock(return_value=None)
         mock_predict_from_db = AsyncMock(
-            return_value=PredictResponse(is_violation=False, probability=0.2)
+            return_value=({"item_id": 200, "seller_id": 20}, PredictResponse(is_violation=False, probability=0.2))
         )
         mock_set = AsyncMock()
         with patch(
             "routes.predict_router.get_cached_prediction_by_item", mock_get_cached
         ), patch(
-            "routes.predict_router.predict_from_db", mock_predict_from_db
+            "routes.predict_router.predict_item_from_db", mock_predict_from_db
         ), patch(
             "routes.predict_router.set_cached_prediction_by_item", mock_set
         ):
             response = client.post("/simple_predict?item_id=200")
             assert response.status_code == 200
-            mock_get_cached.assert_called_once_with(200)
+            version = client.app.state.model.version
+            mock_get_cached.assert_called_once_with(200, version, refresh=ANY)
             mock_predict_from_db.assert_called_once()
             mock_set.assert_called_once()
-            assert mock_set.call_args[0][0] == 200
-            assert mock_set.call_args[0][1].is_violation is False
+            assert mock_set.call_args[0][:2] == (200, version)
+            assert mock_set.call_args[0][2].is_violation is False
+            assert mock_set.call_args[1]["seller_id"] == 20
 
     def test_simple_predict_cache_hit_no_db(self, client: TestClient):
         cached = PredictResponse(is_violation=True, probability=0.9)
@@ -79,29 +90,121 @@ class TestSimplePredictUnit:
         with patch(
             "routes.predict_router.get_cached_prediction_by_item", mock_get_cached
         ), patch(
-            "routes.predict_router.predict_from_db", mock_predict_from_db
+            "routes.predict_router.predict_item_from_db", mock_predict_from_db
         ):
             response = client.post("/simple_predict?item_id=200")
             assert response.status_code == 200
             assert response.json()["is_violation"] is True
             assert response.json()["probability"] == 0.9
-            mock_get_cached.assert_called_once_with(200)
+            mock_get_cached.assert_called_once_with(200, client.app.state.model.version, refresh=ANY)
             mock_predict_from_db.assert_not_called()
 
     def test_simple_predict_item_not_found(self, client: TestClient):
-        # get_item_by_item_id вызывается внутри predict_from_db (services.predict_service)
+        # get_item_features_by_item_id вызывается внутри predict_item_from_db (services.predict_service)
         mock_get_cached = AsyncMock(return_value=None)
         mock_get_item = AsyncMock(return_value=None)
         with patch(
             "routes.predict_router.get_cached_prediction_by_item", mock_get_cached
         ), patch(
-            "services.predict_service.get_item_by_item_id", mock_get_item
+            "services.predict_service.get_item_features_by_item_id", mock_get_item
         ):
             response = client.post("/simple_predict?item_id=99999")
             assert response.status_code == 404
             assert "not found" in response.json()["detail"].lower()
 
 
+class TestSimplePredictBatch:
+    @staticmethod
+    def _row(item_id, seller_id=1):
+        return {
+            "item_id": item_id,
+            "seller_id": seller_id,
+            "category": item_id % 10 + 1,
+            "images_qty": item_id % 4,
+            "description_length": 100 + item_id,
+            "is_verified_seller": item_id % 2 == 0,
+        }
+
+    def test_one_query_for_misses_and_not_found_status(self, client: TestClient):
+        cached = PredictResponse(is_violation=True, probability=0.99)
+        mock_get_cached = AsyncMock(return_value=[None, cached, None, None])
+        mock_get_items = AsyncMock(return_value={1: self._row(1, 10), 3: self._row(3, 30)})
+        mock_set_cached = AsyncMock()
+        with patch(
+            "routes.predict_router.get_cached_predictions_by_items", mock_get_cached
+        ), patch(
+            "services.predict_service.get_item_features_by_item_ids", mock_get_items
+        ), patch(
+            "routes.predict_router.set_cached_predictions_by_items", mock_set_cached
+        ):
+            response = client.post("/simple_predict_batch", json={"item_ids": [1, 2, 3, 4, 1]})
+            assert response.status_code == 200
+            results = response.json()["results"]
+            assert [r["item_id"] for r in results] == [1, 2, 3, 4, 1]
+            assert [r["status"] for r in results] == ["ok", "ok", "ok", "not_found", "ok"]
+            assert results[1]["result"]["probability"] == 0.99
+            assert results[3]["result"] is None
+            assert results[0] == results[4]
+
+            # Повторы схлопнуты, в БД — только промахи кеша, одним вызовом
+            mock_get_cached.assert_called_once_with([1, 2, 3, 4], client.app.state.model.version, refresh=ANY)
+            mock_get_items.assert_called_once_with([1, 3, 4])
+            written = mock_set_cached.call_args[0][0]
+            assert [(item_id, seller_id) for item_id, seller_id, _ in written] == [(1, 10), (3, 30)]
+
+    def test_matches_single_item_predictions(self, client: TestClient):
+        rows = {item_id: self._row(item_id) for item_id in (5, 6, 7)}
+        with patch(
+            "routes.predict_router.get_cached_predictions_by_items", AsyncMock(return_value=[None] * 3)
+        ), patch(
+            "services.predict_service.get_item_features_by_item_ids", AsyncMock(return_value=rows)
+        ):
+            results = client.post("/simple_predict_batch", json={"item_ids": [5, 6, 7]}).json()["results"]
+        for result in results:
+            expected = predict_item(rows[result["item_id"]], app.state.model)
+            assert result["result"]["probability"] == pytest.approx(expected.probability)
+
+    def test_cache_outage_does_not_fail_request(self, client: TestClient):
+        from app.storages.cache_storage import CacheUnavailable
+        with patch(
+            "routes.predict_router.get_cached_predictions_by_items", AsyncMock(return_value=[None])
+        ), patch(
+            "services.predict_service.get_item_features_by_item_ids", AsyncMock(return_value={5: self._row(5)})
+        ), patch(
+            "routes.predict_router.set_cached_predictions_by_items", AsyncMock(side_effect=CacheUnavailable("down"))
+        ):
+            response = client.post("/simple_predict_batch", json={"item_ids": [5]})
+            assert response.status_code == 200
+            assert response.json()["results"][0]["status"] == "ok"
+
+    def test_database_error_is_500(self, client: TestClient):
+        with patch(
+            "routes.predict_router.get_cached_predictions_by_items", AsyncMock(return_value=[None])
+        ), patch(
+            "services.predict_service.get_item_features_by_item_ids", AsyncMock(side_effect=Exception("boom"))
+        ):
+            assert client.post("/simple_predict_batch", json={"item_ids": [5]}).status_code == 500
+
+    def test_validation(self, client: TestClient):
+        assert client.post("/simple_predict_batch", json={"item_ids": []}).status_code == 422
+        assert client.post("/simple_predict_batch", json={"item_ids": [0]}).status_code == 422
+
+
+class TestItemFeatures:
+    def test_predict_item_matches_full_request(self):
+        model = load_scorer()
+        request = TestMicroBatcher._request(7)
+        item = {
+            "item_id": request.item_id,
+            "seller_id": request.seller_id,
+            "is_verified_seller": request.is_verified_seller,
+            "images_qty": request.images_qty,
+            "description_length": len(request.description),
+            "category": request.category,
+        }
+        assert predict_item(item, model) == predict_moderation(request, model)
+
+
 class TestValidation:
     def test_missing_required_field(self, client: TestClient):
         data = {
@@ -181,15 +284,36 @@ class TestPredictCacheUnit:
             "images_qty": 0,
         }
         with patch(
-            "routes.predict_router.get_cached_prediction_by_request", mock_get_cached
+            "routes.predict_router.get_cached_prediction_by_features", mock_get_cached
         ), patch(
-            "routes.predict_router.set_cached_prediction_by_request", mock_set_cached
+            "routes.predict_router.set_cached_prediction_by_features", mock_set_cached
         ):
             response = client.post("/predict", json=data)
             assert response.status_code == 200
             mock_get_cached.assert_called_once()
             mock_set_cached.assert_called_once()
-            assert mock_set_cached.call_args[0][1].probability >= 0
+            assert mock_set_cached.call_args[0][2].probability >= 0
+
+    def test_predict_cache_keyed_on_features_and_model_version(self, client: TestClient):
+        mock_get_cached = AsyncMock(return_value=None)
+        base = {
+            "seller_id": 1,
+            "is_verified_seller": True,
+            "item_id": 100,
+            "name": "X",
+            "description": "abc",
+            "category": 5,
+            "images_qty": 2,
+        }
+        other_listing = {**base, "seller_id": 2, "item_id": 200, "name": "Y", "description": "xyz"}
+        with patch(
+            "routes.predict_router.get_cached_prediction_by_features", mock_get_cached
+        ):
+            client.post("/predict", json=base)
+            client.post("/predict", json=other_listing)
+        first, second = mock_get_cached.call_args_list
+        assert first[0] == second[0]
+        assert first[0] == ((True, 2, 3, 5), app.state.model.version)
 
     def test_predict_cache_hit(self, client: TestClient):
         mock_get_cached = AsyncMock(
@@ -205,7 +329,7 @@ class TestPredictCacheUnit:
             "images_qty": 0,
         }
         with patch(
-            "routes.predict_router.get_cached_prediction_by_request", mock_get_cached
+            "routes.predict_router.get_cached_prediction_by_features", mock_get_cached
         ):
             response = client.post("/predict", json=data)
             assert response.status_code == 200
@@ -213,71 +337,98 @@ class TestPredictCacheUnit:
             mock_get_cached.assert_called_once()
 
 
+class TestPredictBatch:
+    @staticmethod
+    def _items():
+        return [
+            {
+                "seller_id": i + 1,
+                "is_verified_seller": i % 2 == 0,
+                "item_id": 100 + i,
+                "name": "Товар",
+                "description": "Описание " * (i + 1),
+                "category": i + 1,
+                "images_qty": i % 4,
+            }
+            for i in range(5)
+        ]
+
+    def test_predict_batch_matches_single_predictions_in_order(self, client: TestClient):
+        items = self._items()
+        response = client.post("/predict_batch", json={"items": items})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert len(results) == len(items)
+        for item, result in zip(items, results):
+            single = client.post("/predict", json=item).json()
+            assert result["is_violation"] == single["is_violation"]
+            assert result["probability"] == pytest.approx(single["probability"])
+
+    def test_predict_batch_scores_only_cache_misses(self, client: TestClient):
+        items = self._items()[:3]
+        cached = PredictResponse(is_violation=True, probability=0.99)
+        mock_get_cached = AsyncMock(return_value=[None, cached, None])
+        mock_set_cached = AsyncMock()
+        with patch(
+            "routes.predict_router.get_cached_predictions_by_features", mock_get_cached
+        ), patch(
+            "routes.predict_router.set_cached_predictions_by_features", mock_set_cached
+        ):
+            response = client.post("/predict_batch", json={"items": items})
+            assert response.status_code == 200
+            results = response.json()["results"]
+            assert results[1]["probability"] == 0.99
+            mock_get_cached.assert_called_once()
+            written = mock_set_cached.call_args[0][0]
+            assert [features[3] for features, _ in written] == [1, 3]
+            assert mock_set_cached.call_args[0][1] == app.state.model.version
+            # Время пересчёта пачки уходит в запись — иначе XFetch для /predict_batch выключен
+            assert mock_set_cached.call_args[1]["delta"] > 0
+
+    def test_predict_batch_empty_items(self, client: TestClient):
+        response = client.post("/predict_batch", json={"items": []})
+        assert response.status_code == 422
+
+
 class TestAsyncPredict:
     def test_async_predict_success(self, client: TestClient):
-        mock_get_item = AsyncMock(return_value={
-            "item_id": 100,
-            "seller_id": 1,
-            "name": "Item",
-            "description": "Desc",
-            "category": 1,
-            "images_qty": 0,
-            "is_verified_seller": False,
-        })
-        mock_create_task = AsyncMock(return_value=42)
-        mock_send_kafka = AsyncMock(return_value=None)
+        mock_enqueue = AsyncMock(return_value=42)
         with patch(
-            "routes.predict_router.get_item_by_item_id", mock_get_item
-        ), patch(
-            "routes.predict_router.create_moderation_task", mock_create_task
-        ), patch(
-            "routes.predict_router.send_moderation_request", mock_send_kafka
+            "routes.predict_router.enqueue_moderation_task", mock_enqueue
         ):
             response = client.post("/async_predict", json={"item_id": 100})
             assert response.status_code == 200
             body = response.json()
             assert body["task_id"] == 42
             assert body["status"] == "pending"
-            mock_get_item.assert_called_once_with(100)
-            mock_create_task.assert_called_once_with(100)
-            mock_send_kafka.assert_called_once_with(100)
+            mock_enqueue.assert_called_once_with(100, "moderation")
 
     def test_async_predict_item_not_found(self, client: TestClient):
-        mock_get_item = AsyncMock(return_value=None)
+        mock_enqueue = AsyncMock(return_value=None)
         with patch(
-            "routes.predict_router.get_item_by_item_id", mock_get_item
+            "routes.predict_router.enqueue_moderation_task", mock_enqueue
         ):
             response = client.post("/async_predict", json={"item_id": 999})
             assert response.status_code == 404
 
-    def test_async_predict_kafka_failure_marks_task_failed(self, client: TestClient):
-        mock_get_item = AsyncMock(return_value={
-            "item_id": 100,
-            "seller_id": 1,
-            "name": "x",
-            "description": "y",
-            "category": 1,
-            "images_qty": 0,
-            "is_verified_seller": False,
-        })
-        mock_create_task = AsyncMock(return_value=7)
-        mock_update = AsyncMock()
-        mock_send_kafka = AsyncMock(side_effect=Exception("Kafka unavailable"))
+    def test_async_predict_known_missing_item_skips_database(self, client: TestClient):
+        mock_enqueue = AsyncMock()
         with patch(
-            "routes.predict_router.get_item_by_item_id", mock_get_item
-        ), patch(
-            "routes.predict_router.create_moderation_task", mock_create_task
+            "routes.predict_router.known_missing", AsyncMock(return_value=True)
         ), patch(
-            "routes.predict_router.update_moderation_result", mock_update
-        ), patch(
-            "routes.predict_router.send_moderation_request", mock_send_kafka
+            "routes.predict_router.enqueue_moderation_task", mock_enqueue
+        ):
+            response = client.post("/async_predict", json={"item_id": 999})
+            assert response.status_code == 404
+            mock_enqueue.assert_not_called()
+
+    def test_async_predict_database_failure(self, client: TestClient):
+        mock_enqueue = AsyncMock(side_effect=Exception("connection refused"))
+        with patch(
+            "routes.predict_router.enqueue_moderation_task", mock_enqueue
         ):
             response = client.post("/async_predict", json={"item_id": 100})
             assert response.status_code == 500
-            mock_update.assert_called_once()
-            call_kw = mock_update.call_args[1]
-            assert call_kw["task_id"] == 7
-            assert call_kw["status"] == "failed"
 
 
 class TestModerationResult:
@@ -371,15 +522,14 @@ class TestModerationWorker:
         item_data = {
             "item_id": 1,
             "seller_id": 1,
-            "name": "x",
-            "description": "y",
+            "description_length": 1,
             "category": 1,
             "images_qty": 0,
             "is_verified_seller": False,
         }
 
         with patch(
-            "app.workers.moderation_worker.get_item_by_item_id",
+            "app.workers.moderation_worker.get_item_features_by_item_id",
             new_callable=AsyncMock,
             return_value=item_data,
         ), patch(
@@ -390,7 +540,7 @@ class TestModerationWorker:
             "app.workers.moderation_worker.update_moderation_result",
             new_callable=AsyncMock,
         ) as mock_update, patch(
-            "app.workers.moderation_worker.predict_moderation",
+            "app.workers.moderation_worker.predict_item",
             return_value=PredictResponse(is_violation=False, probability=0.1),
         ):
             await process_moderation_message(message_data, mock_model)
@@ -411,7 +561,7 @@ class TestModerationWorker:
         send_dlq = AsyncMock()
 
         with patch(
-            "app.workers.moderation_worker.get_item_by_item_id", get_item
+            "app.workers.moderation_worker.get_item_features_by_item_id", get_item
         ), patch(
             "app.workers.moderation_worker.get_pending_task_by_item_id", get_pending
         ), patch(
@@ -422,9 +572,236 @@ class TestModerationWorker:
             await process_moderation_message(message_data, mock_model)
 
         assert get_item.call_count == MAX_RETRIES
+        get_pending.assert_called_once_with(2)
         update_result.assert_called_once()
         call_kw = update_result.call_args[1]
         assert call_kw["task_id"] == 20
         assert call_kw["status"] == "failed"
         send_dlq.assert_called_once()
         assert send_dlq.call_args[1].get("retry_count") == MAX_RETRIES
+
+    async def test_process_message_v2_updates_task_by_id_without_lookup(self):
+        item_data = {
+            "item_id": 3,
+            "seller_id": 1,
+            "description_length": 1,
+            "category": 1,
+            "images_qty": 0,
+            "is_verified_seller": False,
+        }
+        get_pending = AsyncMock()
+        update_result = AsyncMock()
+
+        with patch(
+            "app.workers.moderation_worker.get_item_features_by_item_id",
+            new_callable=AsyncMock,
+            return_value=item_data,
+        ), patch(
+            "app.workers.moderation_worker.get_pending_task_by_item_id", get_pending
+        ), patch(
+            "app.workers.moderation_worker.update_moderation_result", update_result
+        ), patch(
+            "app.workers.moderation_worker.predict_item",
+            return_value=PredictResponse(is_violation=True, probability=0.9),
+        ):
+            await process_moderation_message({"version": 2, "task_id": 30, "item_id": 3}, MagicMock())
+
+        get_pending.assert_not_called()
+        assert update_result.call_args[1]["task_id"] == 30
+        assert update_result.call_args[1]["status"] == "completed"
+
+    async def test_process_message_v2_failure_marks_own_task(self):
+        from app.workers.moderation_worker import MAX_RETRIES
+
+        message_data = {"version": 2, "task_id": 40, "item_id": 4}
+        get_pending = AsyncMock()
+        update_result = AsyncMock()
+        send_dlq = AsyncMock()
+
+        with patch(
+            "app.workers.moderation_worker.get_item_features_by_item_id",
+            AsyncMock(side_effect=Exception("DB error")),
+        ), patch(
+            "app.workers.moderation_worker.get_pending_task_by_item_id", get_pending
+        ), patch(
+            "app.workers.moderation_worker.update_moderation_result", update_result
+        ), patch(
+            "app.workers.moderation_worker.send_to_dlq", send_dlq
+        ), patch(
+            "app.workers.moderation_worker.INITIAL_DELAY_SEC", 0
+        ):
+            await process_moderation_message(message_data, MagicMock())
+
+        get_pending.assert_not_called()
+        assert update_result.call_args[1]["task_id"] == 40
+        assert update_result.call_args[1]["status"] == "failed"
+        send_dlq.assert_called_once_with(message_data, "DB error", retry_count=MAX_RETRIES)
+
+
+@pytest.mark.asyncio
+class TestMicroBatcher:
+    @staticmethod
+    def _request(i):
+        return PredictRequest(
+            seller_id=1,
+            is_verified_seller=i % 2 == 0,
+            item_id=i + 1,
+            name="x",
+            description="y" * (i + 1),
+            category=1,
+            images_qty=i % 3,
+        )
+
+    async def test_concurrent_requests_share_one_batch(self):
+        model = load_scorer()
+        metrics.reset()
+        batcher = MicroBatcher(lambda: model, max_batch_size=8, max_wait_ms=50)
+        await batcher.start()
+        try:
+            requests = [self._request(i) for i in range(8)]
+            results = await asyncio.gather(*(batcher.submit(raw_features(r)) for r in requests))
+        finally:
+            await batcher.stop()
+
+        for request, result in zip(requests, results):
+            expected = predict_moderation(request, model)
+            assert result.is_violation == expected.is_violation
+            assert result.probability == pytest.approx(expected.probability)
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"]["batcher_batches_total"] == 1
+        assert snapshot["summaries"]["batcher_batch_size"]["max"] == 8
+
+    async def test_inference_error_propagates_to_callers(self):
+        model = MagicMock()
+        model.predict_with_proba.side_effect = ValueError("boom")
+        batcher = MicroBatcher(lambda: model, max_batch_size=2, max_wait_ms=10)
+        await batcher.start()
+        try:
+            with pytest.raises(ValueError):
+                await batcher.submit(raw_features(self._request(0)))
+        finally:
+            await batcher.stop()
+
+    async def test_submitted_model_is_used_during_hot_swap(self):
+        # Запрос, отправленный со старой моделью, не должен уйти в новую, даже если они в одной пачке
+        old_model, new_model = MagicMock(), MagicMock()
+        old_model.predict_with_proba.side_effect = lambda x: (np.zeros(len(x)), np.full(len(x), 0.1))
+        new_model.predict_with_proba.side_effect = lambda x: (np.ones(len(x)), np.full(len(x), 0.9))
+        batcher = MicroBatcher(lambda: new_model, max_batch_size=3, max_wait_ms=50)
+        await batcher.start()
+        try:
+            rows = [raw_features(self._request(i)) for i in range(3)]
+            old, new, current = await asyncio.gather(
+                batcher.submit(rows[0], old_model),
+                batcher.submit(rows[1], new_model),
+                batcher.submit(rows[2]),
+            )
+        finally:
+            await batcher.stop()
+
+        assert old.probability == pytest.approx(0.1) and not old.is_violation
+        assert new.probability == pytest.approx(0.9) and new.is_violation
+        assert current.probability == pytest.approx(0.9)
+        assert old_model.predict_with_proba.call_count == 1
+        assert new_model.predict_with_proba.call_count == 1
+
+
+@pytest.mark.asyncio
+class TestInferenceExecutor:
+    @pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+    async def test_modes_match_inline_prediction(self, mode):
+        model = load_scorer()
+        request = TestMicroBatcher._request(3)
+        executor = InferenceExecutor(mode=mode, workers=1)
+        await executor.start()
+        try:
+            result = await executor.run(predict_moderation, request, model)
+        finally:
+            await executor.close()
+        expected = predict_moderation(request, model)
+        assert result.is_violation == expected.is_violation
+        assert result.probability == pytest.approx(expected.probability)
+
+    async def test_unknown_mode_rejected(self):
+        with pytest.raises(ValueError):
+            InferenceExecutor(mode="gpu")
+
+    async def test_close_does_not_block_event_loop(self):
+        executor = InferenceExecutor(mode="thread", workers=1)
+        await executor.start()
+        running = asyncio.ensure_future(executor.run(lambda payload, model: time.sleep(0.2), None, None))
+        await asyncio.sleep(0.01)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        await executor.close()
+        ticker.cancel()
+        await running
+        assert ticks >= 5
+
+
+@pytest.mark.asyncio
+class TestModelManager:
+    async def test_reload_swaps_model_when_artifact_changes(self, tmp_path):
+        path = str(tmp_path / "model.pkl")
+        save_model(train_model(), path)
+        swapped = []
+        manager = ModelManager(path=path, on_swap=swapped.append)
+        old = manager.load()
+
+        assert await manager.reload() is False
+
+        retrained = train_model()
+        retrained.intercept_ = retrained.intercept_ + 1.0
+        save_model(retrained, path)
+        assert await manager.reload(force=True) is True
+        assert manager.model is not old
+        assert manager.version != old.version
+        assert swapped == [old, manager.model]
+        assert metrics.snapshot()["info"]["model_version"] == manager.version
+
+    async def test_invalid_model_is_rejected_and_old_kept(self, tmp_path):
+        path = str(tmp_path / "model.pkl")
+        save_model(train_model(), path)
+        manager = ModelManager(path=path)
+        old = manager.load()
+        manager._loader = lambda p: LogisticScorer([1.0, 2.0, 3.0], 0.0, version="bad")
+        with pytest.raises(ValueError):
+            await manager.reload(force=True)
+        assert manager.model is old
+
+    async def test_missing_artifact_fails_fast_or_uses_fallback(self, tmp_path):
+        missing = str(tmp_path / "missing.weights")
+        with pytest.raises(FileNotFoundError):
+            ModelManager(path=missing, fallback_path=None).load()
+        assert not (tmp_path / "missing.weights").exists()
+
+        fallback = str(tmp_path / "fallback.pkl")
+        save_model(train_model(), fallback)
+        manager = ModelManager(path=missing, fallback_path=fallback)
+        manager.load()
+        assert manager.loaded_path == fallback
+
+
+class TestAdminModel:
+    def test_model_version_exposed(self, client: TestClient):
+        original_model = app.state.model
+        app.state.model = LogisticScorer([0.0] * 4, 0.0, version="v-test")
+        try:
+            response = client.get("/metrics")
+            assert response.headers["X-Model-Version"] == "v-test"
+        finally:
+            app.state.model = original_model
+
+    def test_reload_endpoint_failure(self, client: TestClient):
+        mock_reload = AsyncMock(side_effect=ValueError("bad artifact"))
+        with patch.object(app.state.model_manager, "reload", mock_reload):
+            response = client.post("/admin/model/reload")
+            assert response.status_code == 500
+            assert "bad artifact" in response.json()["detail"]
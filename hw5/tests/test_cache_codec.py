@@ -0,0 +1,62 @@
+import json
+import math
+import struct
+
+import pytest
+
+from app.storages.cache_codec import (
+    FORMAT_VERSION,
+    CacheEntry,
+    UnsupportedFormat,
+    decode_entry,
+    encode_entry,
+    encode_entry_json,
+)
+from models.schemas import ModerationResultResponse, PredictResponse
+
+
+class TestCacheCodec:
+    def test_prediction_round_trip(self):
+        entry = CacheEntry(PredictResponse(is_violation=True, probability=0.73), 1700000000.5, 0.012)
+        raw = encode_entry(entry)
+        assert raw[0] == FORMAT_VERSION
+        assert decode_entry(raw, PredictResponse) == entry
+
+    @pytest.mark.parametrize("result", [
+        ModerationResultResponse(task_id=7, status="completed", is_violation=False, probability=0.2),
+        ModerationResultResponse(task_id=8, status="pending"),
+        ModerationResultResponse(task_id=9, status="failed", error_message="Kafka недоступна"),
+    ])
+    def test_moderation_round_trip(self, result):
+        entry = CacheEntry(result, 1700000000.0, 0.0)
+        decoded = decode_entry(encode_entry(entry), ModerationResultResponse)
+        assert decoded.value.model_dump() == result.model_dump()
+        assert decoded.soft_expires_at == entry.soft_expires_at
+
+    def test_binary_is_smaller_than_json(self):
+        entry = CacheEntry(PredictResponse(is_violation=False, probability=0.123456789), 1700000000.0, 0.01)
+        assert len(encode_entry(entry)) < len(encode_entry_json(entry))
+
+    def test_json_entries_stay_readable(self):
+        entry = CacheEntry(PredictResponse(is_violation=True, probability=0.5), 1700000000.0, 0.25)
+        assert decode_entry(encode_entry_json(entry), PredictResponse) == entry
+        assert decode_entry(encode_entry_json(entry).encode(), PredictResponse) == entry
+
+        legacy = decode_entry(b'{"is_violation": false, "probability": 0.3}', PredictResponse)
+        assert legacy.value.probability == 0.3
+        assert math.isinf(legacy.soft_expires_at)
+
+    def test_unknown_version_rejected(self):
+        raw = struct.pack("<BBdd", FORMAT_VERSION + 1, 1, 0.0, 0.0) + b"\x00" * 9
+        with pytest.raises(UnsupportedFormat):
+            decode_entry(raw, PredictResponse)
+
+    def test_type_mismatch_rejected(self):
+        raw = encode_entry(CacheEntry(PredictResponse(is_violation=True, probability=0.5), 0.0, 0.0))
+        with pytest.raises(UnsupportedFormat):
+            decode_entry(raw, ModerationResultResponse)
+
+    def test_serialized_response_matches_validated_model(self):
+        result = ModerationResultResponse(task_id=1, status="completed", is_violation=True, probability=0.9)
+        decoded = decode_entry(encode_entry(CacheEntry(result, 0.0, 0.0)), ModerationResultResponse).value
+        assert json.loads(decoded.model_dump_json()) == json.loads(result.model_dump_json())
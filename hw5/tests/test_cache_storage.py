@@ -0,0 +1,449 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+from unittest.mock import AsyncMock, patch
+
+from app import metrics
+from app.storages import cache_storage
+from app.storages.cache_storage import (
+    INVALIDATION_CHANNEL,
+    clear_local_caches,
+    coalesce_moderation_result,
+    coalesce_prediction_by_item,
+    delete_cached_prediction_for_item,
+    get_cached_prediction_by_item,
+    set_cached_prediction_by_item,
+)
+from app.storages.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.storages.local_cache import LocalCache
+from models.schemas import ModerationResultResponse, PredictResponse
+
+# Версия модели в ключах prediction:item:*
+MODEL_VERSION = "v1"
+
+
+class TestLocalCache:
+    def test_lru_eviction(self):
+        cache = LocalCache("test", max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+
+    def test_ttl_expiry(self):
+        cache = LocalCache("test", max_size=10, ttl=60)
+        cache.set("a", 1)
+        with patch("app.storages.local_cache.time.monotonic", return_value=time.monotonic() + 61):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_hit_rate_metric(self):
+        metrics.reset()
+        cache = LocalCache("test", max_size=10, ttl=60)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+        assert metrics.snapshot()["gauges"]["cache_l1_test_hit_rate"] == 0.5
+
+    def test_invalidation_blocks_only_its_own_key(self):
+        cache = LocalCache("test", max_size=10, ttl=60)
+        token = cache.read_token()
+        cache.invalidate("b")
+        assert cache.set_if_fresh("a", 1, token)
+        assert not cache.set_if_fresh("b", 2, token)
+        assert cache.get("a") == 1 and cache.get("b") is None
+        assert cache.set_if_fresh("b", 3, cache.read_token())
+
+    def test_clear_and_log_overflow_block_earlier_reads(self):
+        cache = LocalCache("test", max_size=10, ttl=60)
+        token = cache.read_token()
+        cache.clear()
+        assert not cache.set_if_fresh("a", 1, token)
+
+        token = cache.read_token()
+        with patch("app.storages.local_cache._INVALIDATION_LOG_SIZE", 2):
+            for key in ("x", "y", "z"):
+                cache.invalidate(key)
+        # Запись о чужом ключе вытеснена — нельзя знать, не было ли среди них "a"
+        assert not cache.set_if_fresh("a", 1, token)
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_probes_once(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN and not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow() and breaker.state == HALF_OPEN
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED and breaker.allow()
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+class TestTieredCache:
+    async def test_l1_hit_skips_redis(self):
+        r = await cache_storage.get_redis()
+        await set_cached_prediction_by_item(1, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+        cached = await get_cached_prediction_by_item(1, MODEL_VERSION)
+        assert cached.probability == 0.7
+        r.get.assert_not_called()
+
+    async def test_redis_hit_populates_l1(self):
+        r = await cache_storage.get_redis()
+        r.get = AsyncMock(return_value='{"is_violation": false, "probability": 0.3}')
+        assert (await get_cached_prediction_by_item(2, MODEL_VERSION)).probability == 0.3
+        assert (await get_cached_prediction_by_item(2, MODEL_VERSION)).probability == 0.3
+        r.get.assert_called_once()
+
+    async def test_delete_evicts_l1_and_notifies_replicas(self):
+        r = await cache_storage.get_redis()
+        await set_cached_prediction_by_item(3, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+        await delete_cached_prediction_for_item(3)
+        assert await get_cached_prediction_by_item(3, MODEL_VERSION) is None
+        pipe = r.pipeline.return_value
+        pipe.delete.assert_called_once_with("prediction:item:v1:3")
+        pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, "prediction:item:v1:3")
+
+    async def test_failed_delete_is_retried_and_stale_value_not_read(self):
+        metrics.reset()
+        r = await cache_storage.get_redis()
+        r.get = AsyncMock(return_value='{"is_violation": true, "probability": 0.9}')
+        r.zrangebyscore = AsyncMock(return_value=[MODEL_VERSION.encode()])
+        execute = AsyncMock(side_effect=[ConnectionError("down"), []])
+        r.pipeline.return_value.execute = execute
+        with patch.object(cache_storage, "REDIS_BREAKER_RESET_SEC", 0.001):
+            with pytest.raises(cache_storage.CacheUnavailable):
+                await delete_cached_prediction_for_item(4)
+            # Пока удаление не дошло до Redis, лежащее там значение не читаем
+            assert await get_cached_prediction_by_item(4, MODEL_VERSION) is None
+            r.get.assert_not_called()
+            await asyncio.wait_for(cache_storage._retry_task, 1)
+        assert execute.call_count == 2
+        assert not cache_storage._pending_keys
+        assert metrics.get_counter("cache_invalidations_retried_total") == 1
+
+    async def test_foreign_key_invalidation_does_not_block_l1_fill(self):
+        r = await cache_storage.get_redis()
+        gate = asyncio.Event()
+
+        async def slow_get(key):
+            await gate.wait()
+            return '{"is_violation": false, "probability": 0.3}'
+
+        r.get = slow_get
+        read = asyncio.create_task(get_cached_prediction_by_item(5, MODEL_VERSION))
+        await asyncio.sleep(0)
+        # Например, инвалидация от CLIENT TRACKING за запись другого объявления
+        cache_storage._invalidate_local(["prediction:item:v1:6"])
+        gate.set()
+        assert (await read).probability == 0.3
+        assert cache_storage._local["prediction"].get("prediction:item:v1:5") is not None
+
+    async def test_disabled_l1_always_reads_redis(self):
+        r = await cache_storage.get_redis()
+        with patch.dict(cache_storage._local, {"prediction": LocalCache("prediction", 0, 60)}):
+            await set_cached_prediction_by_item(4, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+            await get_cached_prediction_by_item(4, MODEL_VERSION)
+        r.get.assert_called_once()
+
+
+@pytest.mark.asyncio
+class TestSingleFlight:
+    async def test_concurrent_misses_share_one_computation(self):
+        metrics.reset()
+        calls = 0
+        gate = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await gate.wait()
+            return PredictResponse(is_violation=False, probability=0.4)
+
+        waiters = [asyncio.create_task(coalesce_prediction_by_item(10, MODEL_VERSION, compute)) for _ in range(20)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*waiters)
+
+        assert calls == 1
+        assert all(result.probability == 0.4 for result in results)
+        counters = metrics.snapshot()["counters"]
+        assert counters["cache_single_flight_leaders"] == 1
+        assert counters["cache_single_flight_coalesced"] == 19
+
+    async def test_error_propagates_to_all_waiters(self):
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise HTTPException(status_code=404, detail="not found")
+
+        results = await asyncio.gather(
+            *(coalesce_moderation_result(5, compute) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(r, HTTPException) and r.status_code == 404 for r in results)
+
+    async def test_cancelled_waiter_does_not_cancel_computation(self):
+        async def compute():
+            await asyncio.sleep(0.02)
+            return PredictResponse(is_violation=True, probability=0.9)
+
+        first = asyncio.create_task(coalesce_prediction_by_item(11, MODEL_VERSION, compute))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(coalesce_prediction_by_item(11, MODEL_VERSION, compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert (await second).probability == 0.9
+
+    async def test_other_replica_holds_lock(self):
+        r = await cache_storage.get_redis()
+        r.set = AsyncMock(return_value=None)
+        r.get = AsyncMock(side_effect=[None, '{"is_violation": true, "probability": 0.8}'])
+        compute = AsyncMock()
+        with patch.object(cache_storage, "SINGLE_FLIGHT_LOCK_TTL_MS", 1000):
+            result = await coalesce_prediction_by_item(12, MODEL_VERSION, compute)
+        assert result.probability == 0.8
+        compute.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestStaleWhileRevalidate:
+    async def test_fresh_entry_is_not_refreshed(self):
+        refresh = AsyncMock()
+        await set_cached_prediction_by_item(20, MODEL_VERSION, PredictResponse(is_violation=False, probability=0.1))
+        assert (await get_cached_prediction_by_item(20, MODEL_VERSION, refresh=refresh)).probability == 0.1
+        await asyncio.sleep(0)
+        refresh.assert_not_called()
+
+    async def test_stale_entry_is_served_and_refreshed_in_background(self):
+        metrics.reset()
+        refresh = AsyncMock()
+        with patch.dict(cache_storage.CACHE_TTLS, {"item": (0, 60)}):
+            await set_cached_prediction_by_item(21, MODEL_VERSION, PredictResponse(is_violation=False, probability=0.1))
+            cached = await get_cached_prediction_by_item(21, MODEL_VERSION, refresh=refresh)
+        assert cached.probability == 0.1
+        await asyncio.gather(*cache_storage._refresh_tasks)
+        refresh.assert_awaited_once()
+        assert metrics.snapshot()["counters"]["cache_item_stale_hits"] == 1
+
+    async def test_expensive_recompute_refreshes_early(self):
+        metrics.reset()
+        refresh = AsyncMock()
+        entry = cache_storage.CacheEntry(
+            PredictResponse(is_violation=True, probability=0.9), time.time() + 1, delta=1000.0
+        )
+        cache_storage._local["prediction"].set("prediction:item:v1:22", entry)
+        await get_cached_prediction_by_item(22, MODEL_VERSION, refresh=refresh)
+        await asyncio.gather(*cache_storage._refresh_tasks)
+        refresh.assert_awaited_once()
+        assert metrics.snapshot()["counters"]["cache_item_early_refreshes"] == 1
+
+    async def test_batch_write_keeps_measured_recompute_cost(self):
+        rows = [(True, 2, 100, 5), (False, 1, 50, 3)]
+        result = PredictResponse(is_violation=False, probability=0.1)
+        await cache_storage.set_cached_predictions_by_features([(row, result) for row in rows], "v1", delta=0.25)
+        entries = await cache_storage._get_entries([cache_storage._key_features(row, "v1") for row in rows], PredictResponse)
+        assert [entry.delta for entry in entries] == [0.25, 0.25]
+
+    async def test_hard_ttl_is_used_for_redis_expiry(self):
+        r = await cache_storage.get_redis()
+        with patch.dict(cache_storage.CACHE_TTLS, {"task": (10, 120)}):
+            await cache_storage.set_cached_moderation_result(
+                1, ModerationResultResponse(task_id=1, status="pending")
+            )
+        assert r.setex.call_args[0][1] == 120
+
+    async def test_legacy_entry_is_readable(self):
+        r = await cache_storage.get_redis()
+        r.get = AsyncMock(return_value='{"is_violation": true, "probability": 0.6}')
+        refresh = AsyncMock()
+        assert (await get_cached_prediction_by_item(23, MODEL_VERSION, refresh=refresh)).probability == 0.6
+        await asyncio.sleep(0)
+        refresh.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestCacheEncoding:
+    async def test_values_are_written_in_binary(self):
+        r = await cache_storage.get_redis()
+        await set_cached_prediction_by_item(30, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+        raw = r.pipeline.return_value.setex.call_args[0][2]
+        assert isinstance(raw, bytes)
+        clear_local_caches()
+        r.get = AsyncMock(return_value=raw)
+        assert (await get_cached_prediction_by_item(30, MODEL_VERSION)).probability == 0.7
+
+    async def test_json_format_for_rollout(self):
+        r = await cache_storage.get_redis()
+        with patch.object(cache_storage, "CACHE_VALUE_FORMAT", "json"):
+            await set_cached_prediction_by_item(31, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+        assert json.loads(r.pipeline.return_value.setex.call_args[0][2])["value"]["probability"] == 0.7
+
+    async def test_unreadable_entry_is_a_miss(self):
+        r = await cache_storage.get_redis()
+        r.get = AsyncMock(return_value=b"\x7f garbage")
+        assert await get_cached_prediction_by_item(32, MODEL_VERSION) is None
+
+
+@pytest.mark.asyncio
+class TestSellerIndex:
+    async def test_item_write_is_indexed_by_seller(self):
+        r = await cache_storage.get_redis()
+        pipe = r.pipeline.return_value
+        await set_cached_prediction_by_item(50, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7), seller_id=5)
+        pipe.setex.assert_called_once()
+        pipe.sadd.assert_called_once_with("index:seller_items:5", "prediction:item:v1:50")
+        pipe.expire.assert_any_call("index:seller_items:5", cache_storage.CACHE_TTLS["item"][1])
+        # Версия модели — в индекс версий: по нему удаляются ключи объявления
+        assert pipe.zadd.call_args[0][0] == "index:item_versions"
+        assert list(pipe.zadd.call_args[0][1]) == [MODEL_VERSION]
+
+    async def test_bulk_write_groups_index_updates_by_seller(self):
+        r = await cache_storage.get_redis()
+        pipe = r.pipeline.return_value
+        result = PredictResponse(is_violation=False, probability=0.2)
+        await cache_storage.set_cached_predictions_by_items([(1, 7, result), (2, 8, result), (3, 7, result)], MODEL_VERSION)
+        assert pipe.setex.call_count == 3
+        assert sorted(call.args for call in pipe.sadd.call_args_list) == [
+            ("index:seller_items:7", "prediction:item:v1:1", "prediction:item:v1:3"),
+            ("index:seller_items:8", "prediction:item:v1:2"),
+        ]
+        pipe.execute.assert_awaited_once()
+
+    async def test_invalidate_seller_reads_index_in_batches(self):
+        metrics.reset()
+        r = await cache_storage.get_redis()
+        pipe = r.pipeline.return_value
+        r.srandmember = AsyncMock(side_effect=[
+            [b"prediction:item:v1:1", b"prediction:item:v1:2"], [b"prediction:item:v1:3"], [],
+        ])
+        await set_cached_prediction_by_item(3, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+
+        removed = await cache_storage.invalidate_seller_predictions(7, batch_size=2)
+
+        assert removed == 3
+        assert [call.args for call in r.srandmember.call_args_list] == [("index:seller_items:7", 2)] * 3
+        assert [call.args for call in pipe.delete.call_args_list] == [
+            ("prediction:item:v1:1", "prediction:item:v1:2"), ("prediction:item:v1:3",),
+        ]
+        assert [call.args for call in pipe.srem.call_args_list] == [
+            ("index:seller_items:7", "prediction:item:v1:1", "prediction:item:v1:2"),
+            ("index:seller_items:7", "prediction:item:v1:3"),
+        ]
+        assert pipe.publish.call_count == 3
+        assert cache_storage._local["prediction"].get("prediction:item:v1:3") is None
+        assert metrics.snapshot()["counters"]["cache_seller_invalidated_keys_total"] == 3
+
+    async def test_failed_seller_invalidation_keeps_index_and_is_retried(self):
+        metrics.reset()
+        r = await cache_storage.get_redis()
+        members = [b"prediction:item:v1:1"]
+        r.srandmember = AsyncMock(side_effect=lambda index, count: list(members))
+        calls = []
+
+        async def execute_pipeline():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("down")
+            # Прошедший pipeline удалил ключ и убрал его из индекса
+            members.clear()
+            return []
+
+        execute = AsyncMock(side_effect=execute_pipeline)
+        r.pipeline.return_value.execute = execute
+        with patch.object(cache_storage, "REDIS_BREAKER_RESET_SEC", 0.001):
+            with pytest.raises(cache_storage.CacheUnavailable):
+                await cache_storage.invalidate_seller_predictions(7)
+            assert cache_storage._pending_sellers == {7}
+            await asyncio.wait_for(cache_storage._retry_task, 1)
+        assert execute.call_count == 2
+        assert not cache_storage._pending_sellers
+        assert metrics.get_counter("cache_seller_invalidations_retried_total") == 1
+
+    async def test_verification_change_survives_cache_outage(self):
+        from unittest.mock import MagicMock
+        from repositories import user_repository
+
+        conn = MagicMock()
+        conn.execute = AsyncMock(return_value="UPDATE 1")
+        pool = MagicMock()
+        pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+        invalidate = AsyncMock(side_effect=cache_storage.CacheUnavailable("down"))
+        with patch.object(user_repository, "get_db_pool", AsyncMock(return_value=pool)), \
+             patch.object(user_repository, "invalidate_seller_predictions", invalidate):
+            assert await user_repository.set_seller_verification(7, True) is True
+        invalidate.assert_awaited_once_with(7)
+
+
+@pytest.mark.asyncio
+class TestItemBatch:
+    async def test_mget_for_l1_misses_only(self, monkeypatch):
+        cached = PredictResponse(is_violation=True, probability=0.5)
+        await set_cached_prediction_by_item(1, MODEL_VERSION, cached)
+        redis = await cache_storage.get_redis()
+        _, raw, _ = cache_storage._encode(cache_storage._key_item(2, MODEL_VERSION), cached)
+        redis.mget.side_effect = lambda keys: [raw if key == "prediction:item:v1:2" else None for key in keys]
+
+        results = await cache_storage.get_cached_predictions_by_items([1, 2, 3], MODEL_VERSION)
+        assert [r.probability if r else None for r in results] == [0.5, 0.5, None]
+        redis.mget.assert_called_once_with(["prediction:item:v1:2", "prediction:item:v1:3"])
+
+    async def test_stale_items_refreshed_in_one_call(self):
+        cached = PredictResponse(is_violation=True, probability=0.5)
+        refresh = AsyncMock()
+        with patch.dict(cache_storage.CACHE_TTLS, {"item": (-1, 3600)}):
+            await set_cached_prediction_by_item(1, MODEL_VERSION, cached)
+            await set_cached_prediction_by_item(2, MODEL_VERSION, cached)
+            results = await cache_storage.get_cached_predictions_by_items([1, 2, 3], MODEL_VERSION, refresh=refresh)
+            await asyncio.sleep(0.01)
+        assert results[:2] == [cached, cached]
+        refresh.assert_awaited_once_with([1, 2])
+
+    async def test_mark_items_missing_in_one_pipeline(self):
+        redis = await cache_storage.get_redis()
+        await cache_storage.mark_items_missing([7, 8])
+        pipe = redis.pipeline.return_value
+        assert [c.args[0] for c in pipe.setex.call_args_list] == ["missing:item:7", "missing:item:8"]
+        pipe.execute.assert_awaited_once()
+        assert await cache_storage.is_item_known_missing(8)
+
+    async def test_bulk_item_invalidation_in_one_pipeline(self):
+        await set_cached_prediction_by_item(5, MODEL_VERSION, PredictResponse(is_violation=False, probability=0.1))
+        redis = await cache_storage.get_redis()
+        await cache_storage.delete_cached_predictions_for_items([5, 6])
+        pipe = redis.pipeline.return_value
+        pipe.delete.assert_called_once_with("prediction:item:v1:5", "prediction:item:v1:6")
+        assert [c.args[1] for c in pipe.publish.call_args_list] == ["prediction:item:v1:5", "prediction:item:v1:6"]
+        assert cache_storage._local["prediction"].get("prediction:item:v1:5") is None
+
+    async def test_new_model_version_does_not_read_old_verdicts(self):
+        await set_cached_prediction_by_item(9, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.9))
+        assert await get_cached_prediction_by_item(9, "v2") is None
+        assert await cache_storage.get_cached_predictions_by_items([9], "v2") == [None]
+
+    async def test_items_retried_when_version_index_unavailable(self):
+        metrics.reset()
+        redis = await cache_storage.get_redis()
+        redis.zrangebyscore = AsyncMock(side_effect=[ConnectionError("down"), [b"v1", b"v2"]])
+        with patch.object(cache_storage, "REDIS_BREAKER_RESET_SEC", 0.001):
+            with pytest.raises(cache_storage.CacheUnavailable):
+                await cache_storage.delete_cached_predictions_for_items([5])
+            assert cache_storage._pending_items == {5}
+            await asyncio.wait_for(cache_storage._retry_task, 1)
+        redis.pipeline.return_value.delete.assert_called_once_with("prediction:item:v1:5", "prediction:item:v2:5")
+        assert not cache_storage._pending_items
+        assert metrics.get_counter("cache_item_invalidations_retried_total") == 1
@@ -0,0 +1,49 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app import metrics
+from app.workers.cache_warmer import CacheWarmer
+from model import load_scorer
+
+
+def make_items(start: int, count: int):
+    return [
+        {"item_id": i, "seller_id": 1, "category": i % 50 + 1, "images_qty": i % 10,
+         "description_length": 10 * i, "is_verified_seller": i % 2 == 0}
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.mark.asyncio
+class TestCacheWarmer:
+    async def test_pages_through_items_and_bulk_writes(self):
+        metrics.reset()
+        model = load_scorer()
+        pages = AsyncMock(side_effect=[make_items(1, 3), make_items(4, 2), []])
+        write = AsyncMock()
+        with patch("app.workers.cache_warmer.get_open_item_features_page", pages), \
+             patch("app.workers.cache_warmer.set_cached_predictions_by_items", write):
+            warmed = await CacheWarmer(lambda: model, page_size=3, rate=0).warm()
+
+        assert warmed == 5
+        assert [call.args for call in pages.call_args_list] == [(0, 3), (3, 3), (5, 3)]
+        assert write.call_count == 2
+        assert all(call.args[1] == model.version for call in write.call_args_list)
+        written = write.call_args_list[0].args[0] + write.call_args_list[1].args[0]
+        assert [item_id for item_id, _, _ in written] == [1, 2, 3, 4, 5]
+        assert all(seller_id == 1 for _, seller_id, _ in written)
+        assert all(0.0 <= result.probability <= 1.0 for _, _, result in written)
+        assert metrics.snapshot()["counters"]["cache_warmer_items_total"] == 5
+
+    async def test_rate_limit_spaces_pages(self):
+        model = load_scorer()
+        pages = AsyncMock(side_effect=[make_items(1, 100), make_items(101, 100), []])
+        sleep = AsyncMock()
+        with patch("app.workers.cache_warmer.get_open_item_features_page", pages), \
+             patch("app.workers.cache_warmer.set_cached_predictions_by_items", AsyncMock()), \
+             patch("app.workers.cache_warmer.asyncio.sleep", sleep):
+            await CacheWarmer(lambda: model, page_size=100, rate=1000).warm()
+
+        # 100 объявлений при 1000/с — не раньше чем через ~0.1 с после начала
+        assert sleep.call_count == 2
+        assert 0.05 < sleep.call_args_list[0].args[0] <= 0.1
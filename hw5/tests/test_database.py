@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import database
+from app import metrics
+from database import InstrumentedPool
+
+
+class FakePool:
+    def __init__(self, size: int):
+        self.size = size
+        self._slots = asyncio.Semaphore(size)
+
+    def get_size(self):
+        return self.size
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self._slots.acquire(), timeout)
+        return MagicMock()
+
+    async def release(self, conn):
+        self._slots.release()
+
+
+@pytest.mark.asyncio
+class TestInstrumentedPool:
+    async def test_gauges_track_in_use_and_waiters(self):
+        metrics.reset()
+        pool = InstrumentedPool(FakePool(1))
+        held = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hold():
+            async with pool.acquire():
+                held.set()
+                await release.wait()
+
+        async def wait_for_connection():
+            async with pool.acquire():
+                pass
+
+        holder = asyncio.create_task(hold())
+        await held.wait()
+        waiter = asyncio.create_task(wait_for_connection())
+        await asyncio.sleep(0.01)
+        gauges = metrics.snapshot()["gauges"]
+        assert (gauges["db_pool_size"], gauges["db_pool_in_use"], gauges["db_pool_waiters"]) == (1, 1, 1)
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        snapshot = metrics.snapshot()
+        assert (snapshot["gauges"]["db_pool_in_use"], snapshot["gauges"]["db_pool_waiters"]) == (0, 0)
+        assert snapshot["counters"]["db_pool_acquires_total"] == 2
+        assert snapshot["summaries"]["db_pool_acquire_ms"]["max"] >= 5
+
+    async def test_acquire_timeout_is_counted(self):
+        metrics.reset()
+        pool = InstrumentedPool(FakePool(1), acquire_timeout=0.01)
+        async with pool.acquire():
+            with pytest.raises(asyncio.TimeoutError):
+                async with pool.acquire():
+                    pass
+        assert metrics.get_counter("db_pool_acquire_timeouts_total") == 1
+        assert metrics.snapshot()["gauges"]["db_pool_waiters"] == 0
+
+    async def test_connection_released_on_error(self):
+        pool = InstrumentedPool(FakePool(1))
+        with pytest.raises(RuntimeError):
+            async with pool.acquire():
+                raise RuntimeError("query failed")
+        async with pool.acquire(timeout=0.1):
+            pass
+
+
+@pytest.mark.asyncio
+class TestConnectionWarmup:
+    async def test_hot_statements_run_on_new_connection(self):
+        conn = MagicMock()
+        conn.fetch = AsyncMock(side_effect=[[], Exception("relation does not exist")])
+        with patch.object(database, "_warm_statements", [("SELECT 1 WHERE $1 = 0", (1,)), ("SELECT broken", ())]):
+            await database._init_connection(conn)
+        assert [c.args for c in conn.fetch.call_args_list] == [("SELECT 1 WHERE $1 = 0", 1), ("SELECT broken",)]
+
+    async def test_repositories_register_hot_statements(self):
+        queries = [query for query, _ in database._warm_statements]
+        assert any("ANY($1)" in query for query in queries)
+        assert any("FROM moderation_results WHERE id = $1" in query for query in queries)
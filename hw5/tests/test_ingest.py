@@ -0,0 +1,135 @@
+import json
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.cli import ingest as ingest_cli
+from app.storages.cache_storage import CacheUnavailable
+from services import ingest_service
+from services.ingest_service import ingest, iter_lines
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def lines_of(text: str):
+    async for line in iter_lines(chunks(text.encode())):
+        yield line
+
+
+ITEMS_CSV = (
+    "item_id,seller_id,name,description,category,images_qty\n"
+    '1,10,Стол,"Дубовый стол,\nпочти новый",5,3\n'
+    "2,10,Стул,Деревянный,5,0\n"
+    "3,11,,Без названия,5,0\n"
+    "1,10,Стол,Уже продан,5,3\n"
+)
+
+
+@pytest.mark.asyncio
+class TestParsing:
+    async def test_lines_split_across_chunks_and_multibyte_chars(self):
+        data = "первая\nвторая\nтретья".encode()
+        lines = [line async for line in iter_lines(chunks(data[:3], data[3:15], data[15:]))]
+        assert lines == ["первая\n", "вторая\n", "третья"]
+
+    async def test_unicode_line_separators_stay_inside_record(self):
+        record = {"item_id": 1, "seller_id": 10, "name": "Стол", "description": "раз\u2028два\x1cтри\x85",
+                  "category": 5, "images_qty": 0}
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode()
+        lines = [line async for line in iter_lines(chunks(data[:20], data[20:]))]
+        assert len(lines) == 1
+        rows = [row async for row in ingest_service._ndjson_rows(lines_of(lines[0]))]
+        assert rows == [record]
+
+    async def test_csv_keeps_quoted_newlines(self):
+        rows = [row async for row in ingest_service._csv_rows(lines_of(ITEMS_CSV))]
+        assert len(rows) == 4
+        assert rows[0]["description"] == "Дубовый стол,\nпочти новый"
+
+    async def test_csv_quoted_newline_on_chunk_boundary(self):
+        with patch.object(ingest_service, "_CSV_CHUNK_LINES", 1):
+            rows = [row async for row in ingest_service._csv_rows(lines_of(ITEMS_CSV))]
+        assert [row["item_id"] for row in rows] == ["1", "2", "3", "1"]
+
+    async def test_item_validation(self):
+        with pytest.raises(ingest_service.InvalidRecord):
+            ingest_service.parse_item({"item_id": "1", "seller_id": "1", "name": "", "description": "d",
+                                       "category": "1", "images_qty": "0"})
+        with pytest.raises(ingest_service.InvalidRecord):
+            ingest_service.parse_user({"seller_id": 0, "is_verified_seller": True})
+        assert ingest_service.parse_user({"seller_id": "5", "is_verified_seller": "false"}) == (5, False)
+
+
+@pytest.mark.asyncio
+class TestIngest:
+    async def test_items_batched_deduped_and_invalidated(self):
+        metrics.reset()
+        upsert = AsyncMock(side_effect=[([1], [2], 0)])
+        forget, delete = AsyncMock(), AsyncMock()
+        with patch.object(ingest_service, "bulk_upsert_items", upsert), \
+             patch.object(ingest_service, "forget_items_missing", forget), \
+             patch.object(ingest_service, "delete_cached_predictions_for_items", delete):
+            report = await ingest("items", lines_of(ITEMS_CSV), "csv")
+
+        records = upsert.call_args[0][0]
+        assert [r[0] for r in records] == [1, 2]
+        assert records[0][3] == "Уже продан"
+        assert (report.rows, report.inserted, report.updated, report.rejected) == (4, 1, 1, 1)
+        assert report.rows_per_sec > 0
+        forget.assert_awaited_once_with([1])
+        delete.assert_awaited_once_with([2])
+        assert metrics.get_counter("ingest_items_rows_total") == 2
+
+    async def test_batch_size_splits_copy(self):
+        text = "".join(json.dumps({"seller_id": i, "is_verified_seller": i % 2 == 0}) + "\n" for i in range(1, 6))
+        upsert = AsyncMock(return_value=([], []))
+        with patch.object(ingest_service, "bulk_upsert_users", upsert):
+            report = await ingest("users", lines_of(text + "not json\n"), "ndjson", batch_size=2)
+        assert [len(c.args[0]) for c in upsert.call_args_list] == [2, 2, 1]
+        assert (report.rows, report.rejected) == (6, 1)
+
+    async def test_verification_change_invalidates_seller(self):
+        invalidate = AsyncMock()
+        with patch.object(ingest_service, "bulk_upsert_users", AsyncMock(return_value=([1], [2]))), \
+             patch.object(ingest_service, "invalidate_seller_predictions", invalidate):
+            await ingest("users", lines_of("seller_id,is_verified_seller\n1,true\n2,false\n"), "csv")
+        invalidate.assert_awaited_once_with(2)
+
+    async def test_cache_outage_does_not_fail_ingest(self):
+        metrics.reset()
+        with patch.object(ingest_service, "bulk_upsert_items", AsyncMock(return_value=([], [2], 1))), \
+             patch.object(ingest_service, "delete_cached_predictions_for_items",
+                          AsyncMock(side_effect=CacheUnavailable("down"))):
+            report = await ingest("items", lines_of(ITEMS_CSV), "csv")
+        assert (report.updated, report.skipped) == (1, 1)
+        assert metrics.get_counter("ingest_cache_invalidation_failures_total") == 1
+
+
+class TestIngestEntrypoints:
+    def test_api_streams_body(self, client: TestClient):
+        upsert = AsyncMock(return_value=([1, 2], [], 0))
+        with patch.object(ingest_service, "bulk_upsert_items", upsert), \
+             patch.object(ingest_service, "forget_items_missing", AsyncMock()):
+            response = client.post("/admin/ingest/items?format=csv", content=ITEMS_CSV.encode())
+        assert response.status_code == 200
+        assert response.json()["inserted"] == 2
+
+    def test_api_rejects_unknown_kind(self, client: TestClient):
+        assert client.post("/admin/ingest/orders", content=b"").status_code == 422
+
+    def test_cli_reads_file(self, tmp_path):
+        path = tmp_path / "sellers.ndjson"
+        path.write_text('{"seller_id": 1, "is_verified_seller": true}\n')
+        upsert = AsyncMock(return_value=([1], []))
+        with patch.object(ingest_service, "bulk_upsert_users", upsert), \
+             patch.object(ingest_cli, "close_db_pool", AsyncMock()), \
+             patch.object(ingest_cli, "close_redis", AsyncMock()):
+            report = ingest_cli.main(["users", str(path)])
+        assert report.inserted == 1
+        assert upsert.call_args[0][0] == [(1, True)]
@@ -1,13 +1,20 @@
 import asyncio
 import pytest
+from unittest.mock import AsyncMock, patch
 from httpx import AsyncClient, ASGITransport
 from main import app
-from model import get_or_train_model
+from model import load_scorer
 from database import get_db_pool, close_db_pool
-from repositories.user_repository import create_user
-from repositories.item_repository import create_item, get_item_by_item_id, delete_item_by_item_id
+from repositories.user_repository import (
+    bulk_upsert_users, create_user, get_user_by_seller_id, set_seller_verification,
+)
+from repositories.item_repository import (
+    create_item, get_item_by_item_id, get_item_features_by_item_id, delete_item_by_item_id,
+    get_open_item_features_page, get_item_features_by_item_ids, bulk_upsert_items,
+)
 from app.repositories.moderation_repository import (
-    create_moderation_task,
+    drain_outbox,
+    enqueue_moderation_task,
     get_moderation_task,
     delete_moderation_results_by_item_id,
 )
@@ -29,24 +36,121 @@ class TestPostgresRepositories:
             assert item and item["item_id"] == 500
         run(t())
 
-    def test_create_moderation_task_and_get(self):
+    def test_get_item_features_returns_description_length(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            await create_user(seller_id=53, is_verified_seller=True)
+            await create_item(503, 53, "Features item", "Описание", 7, 3)
+            item = await get_item_features_by_item_id(503)
+            assert item["description_length"] == len("Описание")
+            assert "description" not in item and "name" not in item
+            assert item["is_verified_seller"] is True
+        run(t())
+
+    def test_open_item_pages_are_keyset_ordered(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            await create_user(seller_id=54, is_verified_seller=False)
+            await create_item(504, 54, "Page item 1", "D", 1, 0)
+            await create_item(505, 54, "Page item 2", "DD", 1, 0)
+            page = await get_open_item_features_page(503, 2)
+            assert [item["item_id"] for item in page] == [504, 505]
+            assert page[1]["description_length"] == 2
+        run(t())
+
+    def test_item_features_by_ids_in_one_query(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            await create_user(seller_id=56, is_verified_seller=True)
+            await create_item(506, 56, "Batch item 1", "DDD", 1, 0)
+            await create_item(507, 56, "Batch item 2", "D", 2, 1)
+            items = await get_item_features_by_item_ids([507, 99998, 506])
+            assert sorted(items) == [506, 507]
+            assert items[506]["description_length"] == 3
+        run(t())
+
+    def test_bulk_upsert_users_and_items(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            await create_user(seller_id=57, is_verified_seller=False)
+            inserted, changed = await bulk_upsert_users([(57, True), (58, False)])
+            assert (inserted, changed) == ([58], [57])
+
+            await create_item(508, 57, "Bulk item", "Old", 1, 0)
+            inserted, updated, skipped = await bulk_upsert_items([
+                (508, 57, "Bulk item", "New description", 1, 0),
+                (509, 58, "Bulk item 2", "D", 2, 1),
+                (510, 99999, "Orphan", "D", 1, 0),
+            ])
+            assert (inserted, updated, skipped) == ([509], [508], 1)
+            assert (await get_item_features_by_item_id(508))["description_length"] == len("New description")
+
+            # Повторная загрузка тех же строк ничего не переписывает
+            assert await bulk_upsert_items([(509, 58, "Bulk item 2", "D", 2, 1)]) == ([], [], 0)
+        run(t())
+
+    def test_seller_verification_change_invalidates_cache(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            await create_user(seller_id=55, is_verified_seller=False)
+            with patch("repositories.user_repository.invalidate_seller_predictions", AsyncMock()) as invalidate:
+                # create_user не перезаписывает продавца, оставшегося от прошлого прогона
+                await set_seller_verification(55, False)
+                invalidate.reset_mock()
+                assert await set_seller_verification(55, True) is True
+                assert await set_seller_verification(55, True) is False
+            invalidate.assert_awaited_once_with(55)
+            assert (await get_user_by_seller_id(55))["is_verified_seller"] is True
+        run(t())
+
+    def test_enqueue_moderation_task_and_get(self):
         async def t():
             await close_db_pool()
             await get_db_pool()
             await create_user(seller_id=51, is_verified_seller=False)
             await create_item(501, 51, "Item 501", "D", 1, 0)
-            task_id = await create_moderation_task(501)
+            task_id = await enqueue_moderation_task(501, "moderation")
             task = await get_moderation_task(task_id)
             assert task and task["status"] == "pending"
         run(t())
 
+    def test_enqueue_moderation_task_writes_outbox_message(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            await create_user(seller_id=59, is_verified_seller=False)
+            await create_item(511, 59, "Outbox item", "D", 1, 0)
+            await drain_outbox(10000, AsyncMock())
+
+            task_id = await enqueue_moderation_task(511, "moderation")
+            assert (await get_moderation_task(task_id))["status"] == "pending"
+            assert await enqueue_moderation_task(99997, "moderation") is None
+
+            send = AsyncMock(side_effect=RuntimeError("kafka down"))
+            with pytest.raises(RuntimeError):
+                await drain_outbox(10, send)
+            # Неудачная отправка оставляет сообщение в outbox
+            send = AsyncMock()
+            rows = await drain_outbox(10, send)
+            assert len(rows) == 1
+            [(topic, payload)] = send.call_args[0][0]
+            assert topic == "moderation" and payload["item_id"] == 511
+            assert payload["task_id"] == task_id and payload["version"] == 2
+            assert await drain_outbox(10, send) == []
+        run(t())
+
     def test_delete_moderation_results_and_item(self):
         async def t():
             await close_db_pool()
             await get_db_pool()
             await create_user(seller_id=52, is_verified_seller=True)
             await create_item(502, 52, "To delete", "D", 1, 0)
-            task_id = await create_moderation_task(502)
+            task_id = await enqueue_moderation_task(502, "moderation")
             await delete_moderation_results_by_item_id(502)
             assert await get_moderation_task(task_id) is None
             assert await delete_item_by_item_id(502)
@@ -61,7 +165,7 @@ class TestSimplePredictIntegration:
             await close_db_pool()
             await get_db_pool()
             try:
-                app.state.model = get_or_train_model()
+                app.state.model = load_scorer()
             except Exception:
                 app.state.model = None
             await create_user(seller_id=60, is_verified_seller=False)
@@ -77,7 +181,7 @@ class TestSimplePredictIntegration:
             await close_db_pool()
             await get_db_pool()
             try:
-                app.state.model = get_or_train_model()
+                app.state.model = load_scorer()
             except Exception:
                 app.state.model = None
             async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
@@ -85,6 +189,22 @@ class TestSimplePredictIntegration:
                 assert r.status_code == 404
         run(t())
 
+    def test_simple_predict_batch(self):
+        async def t():
+            await close_db_pool()
+            await get_db_pool()
+            try:
+                app.state.model = load_scorer()
+            except Exception:
+                app.state.model = None
+            await create_user(seller_id=61, is_verified_seller=True)
+            await create_item(610, 61, "Товар", "Описание", 1, 2)
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+                r = await c.post("/simple_predict_batch", json={"item_ids": [610, 99997]})
+                assert r.status_code == 200
+                assert [item["status"] for item in r.json()["results"]] == ["ok", "not_found"]
+        run(t())
+
 
 @pytest.mark.integration
 class TestCloseIntegration:
@@ -93,7 +213,7 @@ class TestCloseIntegration:
             await close_db_pool()
             await get_db_pool()
             try:
-                app.state.model = get_or_train_model()
+                app.state.model = load_scorer()
             except Exception:
                 app.state.model = None
             await create_user(seller_id=70, is_verified_seller=True)
@@ -108,7 +228,7 @@ class TestCloseIntegration:
             await close_db_pool()
             await get_db_pool()
             try:
-                app.state.model = get_or_train_model()
+                app.state.model = load_scorer()
             except Exception:
                 app.state.model = None
             async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
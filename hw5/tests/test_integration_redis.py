@@ -9,9 +9,15 @@ from app.storages.cache_storage import (
     get_cached_moderation_result,
     set_cached_moderation_result,
     PREDICTION_CACHE_TTL_SEC,
+    clear_local_caches,
+    start_invalidation_listener,
+    stop_invalidation_listener,
 )
 from models.schemas import PredictResponse, ModerationResultResponse
 
+# Версия модели в ключах prediction:item:*
+MODEL_VERSION = "v1"
+
 
 @pytest.fixture(scope="module", autouse=True)
 def skip_if_redis_unavailable():
@@ -35,6 +41,7 @@ async def reset_redis_before_each_test():
     """Сброс глобального клиента Redis перед каждым тестом, чтобы не было Event loop is closed."""
     from app.clients.redis_client import close_redis
     await close_redis()
+    clear_local_caches()
     yield
 
 
@@ -42,21 +49,21 @@ async def reset_redis_before_each_test():
 @pytest.mark.asyncio
 class TestCacheStorageIntegration:
     async def test_set_and_get_prediction_by_item(self):
-        await set_cached_prediction_by_item(99991, PredictResponse(is_violation=True, probability=0.75))
-        cached = await get_cached_prediction_by_item(99991)
+        await set_cached_prediction_by_item(99991, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.75))
+        cached = await get_cached_prediction_by_item(99991, MODEL_VERSION)
         assert cached is not None
         assert cached.is_violation is True
         assert cached.probability == 0.75
         await delete_cached_prediction_for_item(99991)
 
     async def test_get_prediction_miss_returns_none(self):
-        cached = await get_cached_prediction_by_item(99992)
+        cached = await get_cached_prediction_by_item(99992, MODEL_VERSION)
         assert cached is None
 
     async def test_delete_prediction_then_get_returns_none(self):
-        await set_cached_prediction_by_item(99993, PredictResponse(is_violation=False, probability=0.1))
+        await set_cached_prediction_by_item(99993, MODEL_VERSION, PredictResponse(is_violation=False, probability=0.1))
         await delete_cached_prediction_for_item(99993)
-        assert await get_cached_prediction_by_item(99993) is None
+        assert await get_cached_prediction_by_item(99993, MODEL_VERSION) is None
 
     async def test_set_and_get_moderation_result(self):
         res = ModerationResultResponse(task_id=88881, status="completed", is_violation=False, probability=0.2, error_message=None)
@@ -66,10 +73,54 @@ class TestCacheStorageIntegration:
         assert cached.status == "completed"
         assert cached.probability == 0.2
 
+    async def test_legacy_json_entry_readable(self):
+        from app.clients.redis_client import get_redis
+        r = await get_redis()
+        await r.setex("prediction:item:v1:99996", 60, '{"is_violation": true, "probability": 0.4}')
+        cached = await get_cached_prediction_by_item(99996, MODEL_VERSION)
+        await r.delete("prediction:item:v1:99996")
+        assert cached.probability == 0.4
+
     async def test_prediction_ttl_set(self):
         from app.clients.redis_client import get_redis
-        await set_cached_prediction_by_item(99994, PredictResponse(is_violation=False, probability=0.5))
+        await set_cached_prediction_by_item(99994, MODEL_VERSION, PredictResponse(is_violation=False, probability=0.5))
         r = await get_redis()
-        ttl = await r.ttl("prediction:item:99994")
-        await r.delete("prediction:item:99994")
+        ttl = await r.ttl("prediction:item:v1:99994")
+        await r.delete("prediction:item:v1:99994")
         assert 0 < ttl <= PREDICTION_CACHE_TTL_SEC
+
+    async def test_invalidation_reaches_other_replica_l1(self):
+        from app.storages.cache_storage import _local, _key_item
+        await start_invalidation_listener()
+        try:
+            await asyncio.sleep(0.1)
+            await set_cached_prediction_by_item(99995, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.6))
+            # Эмулируем другую реплику: в её L1 ключ есть, удаляет его кто-то ещё
+            key = _key_item(99995, MODEL_VERSION)
+            from app.clients.redis_client import get_redis
+            await (await get_redis()).publish("cache:invalidate", key)
+            await asyncio.sleep(0.1)
+            assert _local["prediction"].get(key) is None
+        finally:
+            await stop_invalidation_listener()
+            await delete_cached_prediction_for_item(99995)
+
+    async def test_server_tracking_invalidates_l1_on_foreign_write(self):
+        from app.clients.redis_client import InvalidationTracker, get_redis
+        from app.storages.cache_storage import _local, _key_item, _invalidate_local
+        tracker = InvalidationTracker(["prediction:item:"], _invalidate_local)
+        if not await tracker.start():
+            pytest.skip("Redis без CLIENT TRACKING")
+        try:
+            await set_cached_prediction_by_item(99997, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.6))
+            await asyncio.sleep(0.1)
+            await get_cached_prediction_by_item(99997, MODEL_VERSION)
+            key = _key_item(99997, MODEL_VERSION)
+            assert _local["prediction"].get(key) is not None
+            # Запись в обход приложения (другой сервис, redis-cli) — без публикации в cache:invalidate
+            await (await get_redis()).set(key, b"{}")
+            await asyncio.sleep(0.1)
+            assert _local["prediction"].get(key) is None
+        finally:
+            await tracker.stop()
+            await delete_cached_prediction_for_item(99997)
@@ -0,0 +1,150 @@
+import time
+
+import pytest
+import pytest_asyncio
+import redis.asyncio as aioredis
+from httpx import ASGITransport, AsyncClient
+from unittest.mock import AsyncMock, patch
+
+from app import metrics
+from app.storages import cache_storage
+from app.storages.circuit_breaker import CLOSED, OPEN
+from main import app
+from models.schemas import PredictResponse
+from tests.fake_redis import FakeRedisServer
+
+FEATURES = (True, 2, 100, 5)
+
+
+# Сервер должен жить в том же loop, что и тест
+@pytest_asyncio.fixture(loop_scope="function")
+async def fake_redis():
+    server = await FakeRedisServer().start()
+    client = aioredis.Redis(host="127.0.0.1", port=server.port, protocol=2, socket_connect_timeout=0.2)
+    metrics.reset()
+    cache_storage._breaker.reset()
+    cache_storage._bulk_breaker.reset()
+    with patch("app.storages.cache_storage.get_redis", AsyncMock(return_value=client)), \
+         patch.object(cache_storage, "REDIS_OP_TIMEOUT_MS", 50), \
+         patch.object(cache_storage._breaker, "failure_threshold", 3), \
+         patch.object(cache_storage._breaker, "reset_timeout", 0.2), \
+         patch.object(cache_storage._bulk_breaker, "failure_threshold", 3), \
+         patch.object(cache_storage._bulk_breaker, "reset_timeout", 0.2):
+        yield server
+    cache_storage._breaker.reset()
+    cache_storage._bulk_breaker.reset()
+    await client.aclose()
+    await server.stop()
+
+
+async def read_through_redis():
+    cache_storage.clear_local_caches()
+    return await cache_storage.get_cached_prediction_by_features(FEATURES, "v1")
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestRedisDegradation:
+    async def test_round_trip_through_stand_in(self, fake_redis):
+        await cache_storage.set_cached_prediction_by_features(FEATURES, "v1", PredictResponse(is_violation=True, probability=0.4))
+        assert (await read_through_redis()).probability == 0.4
+
+    async def test_slow_redis_is_cut_off_by_timeout(self, fake_redis):
+        fake_redis.delay = 1.0
+        started = time.perf_counter()
+        assert await read_through_redis() is None
+        assert time.perf_counter() - started < 0.5
+        assert metrics.get_counter("cache_redis_timeouts_total") == 1
+
+    async def test_errors_open_breaker_and_bypass_redis(self, fake_redis):
+        fake_redis.fail = True
+        for _ in range(3):
+            assert await read_through_redis() is None
+        assert cache_storage._breaker.state == OPEN
+        assert metrics.snapshot()["gauges"]["redis_breaker_state"] == 2
+
+        sent = len(fake_redis.commands)
+        assert await read_through_redis() is None
+        await cache_storage.set_cached_prediction_by_features(FEATURES, "v1", PredictResponse(is_violation=True, probability=0.4))
+        assert len(fake_redis.commands) == sent
+        assert metrics.get_counter("cache_redis_bypassed_total") == 2
+
+    async def test_breaker_probes_and_recovers(self, fake_redis):
+        fake_redis.drop = True
+        for _ in range(3):
+            await read_through_redis()
+        assert cache_storage._breaker.state == OPEN
+
+        fake_redis.heal()
+        await cache_storage.set_cached_prediction_by_features(FEATURES, "v1", PredictResponse(is_violation=False, probability=0.1))
+        assert metrics.get_counter("cache_redis_bypassed_total") == 1
+        time.sleep(0.25)
+        assert await read_through_redis() is None
+        assert cache_storage._breaker.state == CLOSED
+        await cache_storage.set_cached_prediction_by_features(FEATURES, "v1", PredictResponse(is_violation=False, probability=0.1))
+        assert (await read_through_redis()).probability == 0.1
+
+    async def test_failed_probe_reopens(self, fake_redis):
+        fake_redis.fail = True
+        for _ in range(3):
+            await read_through_redis()
+        time.sleep(0.25)
+        await read_through_redis()
+        assert cache_storage._breaker.state == OPEN
+        # Размыкание по порогу и повторное — после неудачной пробы
+        assert metrics.get_counter("redis_breaker_opened_total") == 2
+
+    async def test_invalidation_surfaces_unavailable_cache(self, fake_redis):
+        fake_redis.fail = True
+        with pytest.raises(cache_storage.CacheUnavailable):
+            await cache_storage.delete_cached_prediction_for_item(1)
+
+    async def test_item_invalidation_covers_every_cached_model_version(self, fake_redis):
+        result = PredictResponse(is_violation=True, probability=0.4)
+        await cache_storage.set_cached_prediction_by_item(1, "v1", result)
+        await cache_storage.set_cached_prediction_by_item(1, "v2", result)
+        # Версию v1 эта реплика «не видела» — о ней знает только индекс версий в Redis
+        cache_storage._item_versions.discard("v1")
+        await cache_storage.delete_cached_prediction_for_item(1)
+        cache_storage.clear_local_caches()
+        assert await cache_storage.get_cached_prediction_by_item(1, "v1") is None
+        assert await cache_storage.get_cached_prediction_by_item(1, "v2") is None
+
+    async def test_bulk_timeout_scales_with_keys(self, fake_redis):
+        # Соединение открываем заранее: служебные команды при подключении тоже ждали бы delay
+        await read_through_redis()
+        fake_redis.delay = 0.1
+        rows = [(True, 2, 100 + i, 5) for i in range(1000)]
+        # 50 мс + 200 мкс на ключ: медленный, но укладывающийся в бюджет MGET — не таймаут
+        with patch.object(cache_storage, "REDIS_OP_TIMEOUT_PER_KEY_US", 200):
+            assert await cache_storage.get_cached_predictions_by_features(rows, "v1") == [None] * len(rows)
+        assert metrics.get_counter("cache_redis_timeouts_total") == 0
+        assert await read_through_redis() is None
+        assert metrics.get_counter("cache_redis_timeouts_total") == 1
+
+    async def test_bulk_failures_do_not_open_single_key_breaker(self, fake_redis):
+        fake_redis.fail = True
+        rows = [(True, 2, 100 + i, 5) for i in range(100)]
+        for _ in range(3):
+            await cache_storage.get_cached_predictions_by_features(rows, "v1")
+        assert cache_storage._bulk_breaker.state == OPEN
+        assert cache_storage._breaker.state == CLOSED
+
+        fake_redis.heal()
+        await cache_storage.set_cached_prediction_by_features(FEATURES, "v1", PredictResponse(is_violation=True, probability=0.3))
+        assert (await read_through_redis()).probability == 0.3
+
+    @pytest.mark.parametrize("fault", ["fail", "delay"])
+    async def test_close_succeeds_when_cache_invalidation_fails(self, fake_redis, fault):
+        setattr(fake_redis, fault, True if fault == "fail" else 1.0)
+        delete_item = AsyncMock(return_value=True)
+        with patch("routes.predict_router.get_item_by_item_id", AsyncMock(return_value={"item_id": 1})), \
+             patch("routes.predict_router.delete_moderation_results_by_item_id", AsyncMock()), \
+             patch("routes.predict_router.delete_item_by_item_id", delete_item):
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post("/close?item_id=1")
+        assert response.status_code == 200
+        delete_item.assert_awaited_once_with(1)
+        assert metrics.get_counter("close_cache_invalidation_failures_total") == 1
+        # Версии модели в кеше не узнать — объявление целиком удаляется заново в фоне
+        assert 1 in cache_storage._pending_items
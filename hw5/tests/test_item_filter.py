@@ -0,0 +1,214 @@
+import asyncio
+
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app import metrics
+from app.storages import cache_storage
+from app.storages.item_filter import CountingBloomFilter, ItemExistenceFilter
+from repositories import item_repository
+
+
+class TestCountingBloomFilter:
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = CountingBloomFilter(capacity=10000, error_rate=0.01)
+        bloom.add_many(np.arange(1, 10001))
+        assert all(item_id in bloom for item_id in range(1, 10001))
+        false_positives = sum(item_id in bloom for item_id in range(100001, 110001))
+        assert false_positives < 300
+
+    def test_single_and_bulk_hashing_agree(self):
+        bloom = CountingBloomFilter(capacity=1000, error_rate=0.01)
+        bloom.add(123456789)
+        assert 123456789 in bloom
+        assert sorted(bloom._positions(123456789)[0]) == sorted(bloom._positions_one(123456789))
+
+    def test_remove(self):
+        bloom = CountingBloomFilter(capacity=1000, error_rate=0.01)
+        bloom.add_many([1, 2, 3])
+        bloom.remove(2)
+        assert 2 not in bloom
+        assert 1 in bloom and 3 in bloom
+
+
+@pytest.mark.asyncio
+class TestItemExistenceFilter:
+    async def test_unbuilt_filter_lets_everything_through(self):
+        assert ItemExistenceFilter(capacity=100).might_contain(42)
+
+    async def test_rebuild_pages_through_ids(self):
+        pages = AsyncMock(side_effect=[[1, 2, 3], [7, 9], []])
+        item_filter = ItemExistenceFilter(capacity=100)
+        assert await item_filter.rebuild(pages) == 5
+        assert [call.args[0] for call in pages.call_args_list] == [0, 3, 9]
+        assert item_filter.might_contain(7)
+        assert not item_filter.might_contain(4)
+
+    async def test_items_created_during_rebuild_are_kept(self):
+        item_filter = ItemExistenceFilter(capacity=100)
+
+        async def pages(after_item_id, limit):
+            if after_item_id == 0:
+                item_filter.add(50)
+                return [1]
+            return []
+
+        await item_filter.rebuild(pages)
+        assert item_filter.might_contain(50)
+
+    async def test_stale_filter_lets_everything_through_until_rebuilt(self):
+        item_filter = ItemExistenceFilter(capacity=100)
+        await item_filter.rebuild(AsyncMock(side_effect=[[1], []]))
+        assert not item_filter.might_contain(2)
+        item_filter.mark_stale()
+        assert item_filter.might_contain(2)
+        await item_filter.rebuild(AsyncMock(side_effect=[[1, 2], []]))
+        assert item_filter.ready and not item_filter.might_contain(3)
+
+    async def test_rebuild_started_before_mark_stale_is_discarded(self):
+        item_filter = ItemExistenceFilter(capacity=100)
+
+        async def pages(after_item_id, limit):
+            if after_item_id == 0:
+                item_filter.mark_stale()
+                return [1]
+            return []
+
+        await item_filter.rebuild(pages)
+        assert not item_filter.ready
+
+    async def test_mark_stale_triggers_rebuild(self):
+        item_filter = ItemExistenceFilter(capacity=100)
+        pages = AsyncMock(side_effect=lambda after_item_id, limit: [] if after_item_id else [1])
+        await item_filter.start(pages, interval=0)
+        try:
+            await asyncio.sleep(0.01)
+            assert item_filter.ready
+            item_filter.mark_stale()
+            await asyncio.sleep(0.01)
+            assert item_filter.ready
+            assert pages.call_count == 4
+        finally:
+            await item_filter.stop()
+
+
+@pytest.mark.asyncio
+class TestItemLookupShortcuts:
+    @staticmethod
+    def pool_returning(row):
+        conn = MagicMock()
+        conn.fetchrow = AsyncMock(return_value=row)
+        pool = MagicMock()
+        pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+        return AsyncMock(return_value=pool)
+
+    async def test_filter_rejection_skips_database(self):
+        metrics.reset()
+        item_filter = ItemExistenceFilter(capacity=100)
+        await item_filter.rebuild(AsyncMock(side_effect=[[1, 2], []]))
+        get_pool = self.pool_returning(None)
+        with patch.object(item_repository, "item_filter", item_filter), \
+             patch.object(item_repository, "get_db_pool", get_pool):
+            assert await item_repository.get_item_by_item_id(99) is None
+        get_pool.assert_not_called()
+        assert metrics.snapshot()["counters"]["item_filter_rejections_total"] == 1
+
+    async def test_missing_item_is_negatively_cached(self):
+        r = await cache_storage.get_redis()
+        get_pool = self.pool_returning(None)
+        with patch.object(item_repository, "get_db_pool", get_pool):
+            assert await item_repository.get_item_features_by_item_id(77) is None
+            assert await item_repository.get_item_features_by_item_id(77) is None
+        get_pool.assert_awaited_once()
+        assert r.setex.call_args[0][0] == "missing:item:77"
+
+    async def test_negative_entry_from_redis_skips_database(self):
+        r = await cache_storage.get_redis()
+        r.exists = AsyncMock(return_value=1)
+        get_pool = self.pool_returning(None)
+        with patch.object(item_repository, "get_db_pool", get_pool):
+            assert await item_repository.get_item_by_item_id(78) is None
+        get_pool.assert_not_called()
+
+    async def test_item_created_elsewhere_clears_negative_entry(self):
+        await cache_storage.mark_item_missing(79)
+        cache_storage._invalidate_local(["missing:item:79"])
+        assert not await cache_storage.is_item_known_missing(79)
+
+    async def test_stale_filter_sends_lookup_to_database(self):
+        item_filter = ItemExistenceFilter(capacity=100)
+        await item_filter.rebuild(AsyncMock(side_effect=[[1], []]))
+        item_filter.mark_stale()
+        get_pool = self.pool_returning({"item_id": 5})
+        with patch.object(item_repository, "item_filter", item_filter), \
+             patch.object(item_repository, "get_db_pool", get_pool):
+            assert await item_repository.get_item_by_item_id(5) == {"item_id": 5}
+
+    async def test_negative_cache_checked_before_filter(self):
+        metrics.reset()
+        r = await cache_storage.get_redis()
+        r.exists = AsyncMock(return_value=1)
+        item_filter = ItemExistenceFilter(capacity=100)
+        await item_filter.rebuild(AsyncMock(side_effect=[[1], []]))
+        with patch.object(item_repository, "item_filter", item_filter):
+            assert await item_repository.known_missing(80)
+        assert metrics.get_counter("item_filter_rejections_total") == 0
+
+
+@pytest.mark.asyncio
+class TestCrossReplicaInserts:
+    async def test_listener_runs_for_filter_without_l1(self):
+        with patch.object(cache_storage, "L1_CACHE_MAX_SIZE", 0), \
+             patch.object(cache_storage, "ITEM_FILTER_ENABLED", True):
+            await cache_storage.start_invalidation_listener()
+            try:
+                assert cache_storage._invalidation_task is not None
+            finally:
+                await cache_storage.stop_invalidation_listener()
+
+    async def test_resubscribe_marks_filter_stale(self):
+        r = await cache_storage.get_redis()
+        pubsub = MagicMock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.aclose = AsyncMock()
+        attempts = []
+
+        def listen():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("connection lost")
+            return _forever()
+
+        async def _forever():
+            await asyncio.Event().wait()
+            yield
+
+        pubsub.listen.side_effect = listen
+        r.pubsub.return_value = pubsub
+        item_filter = MagicMock()
+        yield_to_loop = asyncio.sleep
+        # Пауза перед переподпиской — та же asyncio.sleep, поэтому сами уступаем loop через сохранённую
+        with patch.object(cache_storage, "item_filter", item_filter), \
+             patch.object(cache_storage.asyncio, "sleep", AsyncMock()):
+            task = asyncio.ensure_future(cache_storage._listen_invalidations())
+            for _ in range(10):
+                await yield_to_loop(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert item_filter.mark_stale.call_count == 2
+
+    async def test_failed_publish_is_retried(self):
+        metrics.reset()
+        r = await cache_storage.get_redis()
+        execute = AsyncMock(side_effect=[ConnectionError("down"), ConnectionError("down"), []])
+        r.pipeline.return_value.execute = execute
+        with patch.object(cache_storage, "REDIS_BREAKER_RESET_SEC", 0.001):
+            with pytest.raises(cache_storage.CacheUnavailable):
+                await cache_storage.forget_items_missing([81, 82])
+            await asyncio.wait_for(cache_storage._retry_task, 1)
+        assert execute.call_count == 3
+        assert not cache_storage._pending_keys
+        assert metrics.get_counter("cache_invalidations_retried_total") == 2
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app import metrics
+from repositories import item_repository
+from repositories.item_repository import ItemLoader
+
+
+def rows_for(item_ids):
+    return {item_id: {"item_id": item_id, "seller_id": item_id * 10} for item_id in item_ids if item_id < 100}
+
+
+@pytest.mark.asyncio
+class TestItemLoader:
+    async def test_same_tick_loads_share_one_batch(self):
+        metrics.reset()
+        batch_fn = AsyncMock(side_effect=rows_for)
+        loader = ItemLoader("test_loader", batch_fn)
+
+        results = await asyncio.gather(*(loader.load(item_id) for item_id in [1, 2, 1, 200, 3]))
+
+        batch_fn.assert_awaited_once_with([1, 2, 200, 3])
+        assert [r["seller_id"] if r else None for r in results] == [10, 20, 10, None, 30]
+        counters = metrics.snapshot()["counters"]
+        assert counters["test_loader_loads_total"] == 5
+        assert counters["test_loader_deduplicated_total"] == 1
+        assert counters["test_loader_batches_total"] == 1
+
+    async def test_sequential_loads_are_separate_batches(self):
+        batch_fn = AsyncMock(side_effect=rows_for)
+        loader = ItemLoader("test_loader", batch_fn)
+        assert (await loader.load(1))["item_id"] == 1
+        assert (await loader.load(1))["item_id"] == 1
+        assert batch_fn.await_count == 2
+
+    async def test_window_collects_later_loads(self):
+        batch_fn = AsyncMock(side_effect=rows_for)
+        loader = ItemLoader("test_loader", batch_fn, window_ms=20)
+
+        async def later(item_id):
+            await asyncio.sleep(0.005)
+            return await loader.load(item_id)
+
+        await asyncio.gather(loader.load(1), later(2))
+        batch_fn.assert_awaited_once_with([1, 2])
+
+    async def test_full_batch_dispatched_immediately(self):
+        batch_fn = AsyncMock(side_effect=rows_for)
+        loader = ItemLoader("test_loader", batch_fn, window_ms=10000, max_batch_size=2)
+        await asyncio.wait_for(asyncio.gather(loader.load(1), loader.load(2)), 1)
+        batch_fn.assert_awaited_once_with([1, 2])
+
+    async def test_error_reaches_every_caller(self):
+        loader = ItemLoader("test_loader", AsyncMock(side_effect=RuntimeError("db down")))
+        results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        release = asyncio.Event()
+
+        async def slow(item_ids):
+            await release.wait()
+            return rows_for(item_ids)
+
+        loader = ItemLoader("test_loader", slow)
+        first = asyncio.create_task(loader.load(1))
+        second = asyncio.create_task(loader.load(1))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert (await second)["item_id"] == 1
+
+
+@pytest.mark.asyncio
+class TestRepositoryLoader:
+    async def test_concurrent_lookups_use_one_connection_and_query(self):
+        metrics.reset()
+        conn = MagicMock()
+        conn.fetch = AsyncMock(return_value=[
+            {"item_id": 1, "seller_id": 10, "category": 1, "images_qty": 0,
+             "description_length": 5, "is_verified_seller": True},
+        ])
+        pool = MagicMock()
+        pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+        with patch.object(item_repository, "ITEM_LOADER_ENABLED", True), \
+             patch.object(item_repository, "get_db_pool", AsyncMock(return_value=pool)):
+            results = await asyncio.gather(*(
+                item_repository.get_item_features_by_item_id(item_id) for item_id in [1, 1, 2]
+            ))
+
+        assert [r["seller_id"] if r else None for r in results] == [10, 10, None]
+        query, ids = conn.fetch.call_args[0]
+        assert "ANY($1)" in query and ids == [1, 2]
+        assert pool.acquire.call_count == 1
+        assert metrics.get_counter("item_queries_total") == 1
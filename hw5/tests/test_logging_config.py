@@ -0,0 +1,46 @@
+import io
+import json
+import logging
+
+from app.logging_config import SamplingFilter, parse_sample_rates, setup_logging, stop_logging
+
+
+def _record(name, level=logging.INFO, msg="hello %s", args=("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestSampling:
+    def test_parse_sample_rates(self):
+        assert parse_sample_rates(" a.b=0.1, c=1 ,") == {"a.b": 0.1, "c": 1.0}
+
+    def test_rate_inherited_from_nearest_parent(self):
+        sampling = SamplingFilter({"services": 0.0, "services.keep": 1.0})
+        assert not sampling.filter(_record("services.predict_service"))
+        assert sampling.filter(_record("services.keep.child"))
+        assert sampling.filter(_record("other"))
+
+    def test_warnings_never_sampled(self):
+        sampling = SamplingFilter({"services": 0.0})
+        assert sampling.filter(_record("services.predict_service", level=logging.WARNING))
+        assert sampling.filter(_record("services.predict_service", level=logging.ERROR))
+
+
+class TestSetupLogging:
+    def test_json_lines_through_queue(self):
+        stream = io.StringIO()
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        try:
+            setup_logging(level="INFO", fmt="json", sample_rates={"sampled": 0.0}, stream=stream)
+            logging.getLogger("kept").info("value=%s", 42, extra={"item_id": 7})
+            logging.getLogger("sampled").info("dropped")
+            logging.getLogger("kept").debug("below level")
+            stop_logging()
+        finally:
+            root.handlers, root.level = handlers, level
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert len(lines) == 1
+        assert lines[0]["message"] == "value=42"
+        assert lines[0]["logger"] == "kept"
+        assert lines[0]["item_id"] == 7
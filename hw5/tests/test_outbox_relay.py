@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app import metrics
+from app.repositories import moderation_repository
+from app.workers import outbox_relay
+from app.workers.outbox_relay import OutboxRelay
+
+
+def pool_with(conn):
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+    conn.transaction.return_value.__aenter__ = AsyncMock(return_value=None)
+    conn.transaction.return_value.__aexit__ = AsyncMock(return_value=None)
+    return AsyncMock(return_value=pool)
+
+
+@pytest.mark.asyncio
+class TestDrainOutbox:
+    async def test_sends_batch_in_id_order_inside_transaction(self):
+        conn = MagicMock()
+        conn.fetch = AsyncMock(return_value=[
+            {"id": 2, "topic": "moderation", "payload": '{"item_id": 20}', "age_sec": 0.5},
+            {"id": 1, "topic": "moderation", "payload": '{"item_id": 10}', "age_sec": 0.7},
+        ])
+        sent = []
+
+        async def send(messages):
+            # Отправка идёт до выхода из транзакции — иначе сбой Kafka потерял бы сообщения
+            conn.transaction.return_value.__aexit__.assert_not_called()
+            sent.extend(messages)
+
+        with patch.object(moderation_repository, "get_db_pool", pool_with(conn)):
+            rows = await moderation_repository.drain_outbox(100, send)
+
+        assert sent == [("moderation", {"item_id": 10}), ("moderation", {"item_id": 20})]
+        assert [row["id"] for row in rows] == [1, 2]
+        assert "SKIP LOCKED" in conn.fetch.call_args[0][0]
+
+    async def test_send_failure_rolls_back(self):
+        conn = MagicMock()
+        conn.fetch = AsyncMock(return_value=[{"id": 1, "topic": "moderation", "payload": "{}", "age_sec": 0.0}])
+        with patch.object(moderation_repository, "get_db_pool", pool_with(conn)):
+            with pytest.raises(RuntimeError):
+                await moderation_repository.drain_outbox(100, AsyncMock(side_effect=RuntimeError("kafka down")))
+        exit_args = conn.transaction.return_value.__aexit__.call_args[0]
+        assert exit_args[0] is RuntimeError
+
+    async def test_empty_outbox_sends_nothing(self):
+        conn = MagicMock()
+        conn.fetch = AsyncMock(return_value=[])
+        send = AsyncMock()
+        with patch.object(moderation_repository, "get_db_pool", pool_with(conn)):
+            assert await moderation_repository.drain_outbox(100, send) == []
+        send.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestOutboxRelay:
+    async def test_relay_once_records_metrics(self):
+        metrics.reset()
+        rows = [{"id": 1, "topic": "moderation", "age_sec": 0.2}, {"id": 2, "topic": "moderation", "age_sec": 1.5}]
+        with patch.object(outbox_relay, "drain_outbox", AsyncMock(return_value=rows)) as drain:
+            assert await OutboxRelay(send=AsyncMock(), batch_size=10).relay_once() == 2
+        assert drain.call_args[0][0] == 10
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"]["outbox_relayed_total"] == 2
+        assert snapshot["gauges"]["outbox_lag_sec"] == 1.5
+
+    async def test_run_keeps_draining_full_batches_and_survives_failures(self):
+        metrics.reset()
+        full = [{"id": i, "topic": "moderation", "age_sec": 0.0} for i in range(2)]
+        drain = AsyncMock(side_effect=[full, RuntimeError("kafka down"), full[:1]] + [[]] * 1000)
+        relay = OutboxRelay(send=AsyncMock(), batch_size=2, poll_interval_ms=1, retry_delay=0)
+        with patch.object(outbox_relay, "drain_outbox", drain):
+            task = asyncio.create_task(relay.run())
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert metrics.get_counter("outbox_relayed_total") == 3
+        assert metrics.get_counter("outbox_relay_failures_total") == 1
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from redis.exceptions import ResponseError
+
+from app import metrics
+from app.clients.redis_client import InvalidationTracker
+from app.storages import cache_storage
+from models.schemas import PredictResponse
+
+# Версия модели в ключах prediction:item:*
+MODEL_VERSION = "v1"
+
+
+class FakeConnection:
+    """Соединение с заранее заданными ответами; когда они кончаются, read_response висит."""
+
+    scripts = []
+
+    def __init__(self, **kwargs):
+        self.responses = FakeConnection.scripts.pop(0)
+        self.sent = []
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def send_command(self, *args):
+        self.sent.append(args)
+
+    async def read_response(self):
+        if not self.responses:
+            await asyncio.Future()
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.mark.asyncio
+class TestInvalidationTracker:
+    async def test_server_invalidations_reach_callback(self):
+        metrics.reset()
+        received = []
+        FakeConnection.scripts = [
+            [7, [b"subscribe", b"__redis__:invalidate", 1],
+             [b"message", b"__redis__:invalidate", [b"prediction:item:v1:1", b"prediction:item:v1:2"]]],
+            [b"OK"],
+        ]
+        with patch("app.clients.redis_client.Connection", FakeConnection):
+            tracker = InvalidationTracker(["prediction:item:"], received.append)
+            assert await tracker.start() is True
+            await asyncio.sleep(0)
+            owner_command = tracker._owner.sent[0]
+            await tracker.stop()
+
+        assert owner_command == ("CLIENT", "TRACKING", "ON", "REDIRECT", 7, "BCAST", "PREFIX", "prediction:item:")
+        # Сброс при подключении, затем ключи от сервера
+        assert received == [None, ["prediction:item:v1:1", "prediction:item:v1:2"]]
+        assert metrics.snapshot()["counters"]["redis_tracking_invalidations_total"] == 1
+
+    async def test_falls_back_when_tracking_unsupported(self):
+        FakeConnection.scripts = [
+            [7, [b"subscribe", b"__redis__:invalidate", 1]],
+            [ResponseError("unknown subcommand 'TRACKING'")],
+        ]
+        with patch("app.clients.redis_client.Connection", FakeConnection):
+            tracker = InvalidationTracker(["prediction:item:"], lambda keys: None)
+            assert await tracker.start() is False
+        assert metrics.snapshot()["gauges"]["redis_tracking_enabled"] == 0
+
+
+@pytest.mark.asyncio
+class TestTrackedLocalCache:
+    async def test_invalidated_key_is_dropped_from_l1(self):
+        await cache_storage.set_cached_prediction_by_item(40, MODEL_VERSION, PredictResponse(is_violation=True, probability=0.7))
+        cache_storage._invalidate_local(["prediction:item:v1:40"])
+        assert cache_storage._local["prediction"].get("prediction:item:v1:40") is None
+
+    async def test_value_read_before_invalidation_is_not_kept(self):
+        r = await cache_storage.get_redis()
+        stale = '{"is_violation": false, "probability": 0.1}'
+
+        async def get_racing_with_write(key):
+            # Пока ответ GET был в пути, ключ перезаписали и пришла инвалидация
+            cache_storage._invalidate_local([key])
+            return stale
+
+        r.get = AsyncMock(side_effect=get_racing_with_write)
+        assert (await cache_storage.get_cached_prediction_by_item(41, MODEL_VERSION)).probability == 0.1
+        assert cache_storage._local["prediction"].get("prediction:item:v1:41") is None
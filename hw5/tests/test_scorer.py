@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from app.inference.scorer import LogisticScorer
+from model import (
+    MODEL_PATH, export_weights, load_model, load_scorer, load_weights, read_weights_header, save_model, train_model,
+)
+from models.schemas import PredictRequest
+from services.predict_service import prepare_features, prepare_features_batch
+
+
+@pytest.fixture(scope="module", params=["trained", "artifact"])
+def sklearn_model(request):
+    return train_model() if request.param == "trained" else load_model()
+
+
+def _assert_parity(model, features):
+    labels, probabilities = LogisticScorer.from_sklearn(model).predict_with_proba(features)
+    np.testing.assert_array_equal(labels, model.predict(features).astype(bool))
+    np.testing.assert_allclose(probabilities, model.predict_proba(features)[:, 1], rtol=1e-12, atol=1e-15)
+
+
+class TestScorerParity:
+    def test_random_features(self, sklearn_model):
+        rng = np.random.default_rng(0)
+        _assert_parity(sklearn_model, rng.random((5000, 4)))
+
+    def test_single_row(self, sklearn_model):
+        _assert_parity(sklearn_model, np.array([[1.0, 0.5, 0.2, 0.01]]))
+
+    def test_extreme_values_do_not_overflow(self, sklearn_model):
+        features = np.array([
+            [0.0, 0.0, 0.0, 0.0],
+            [1.0, 1e6, 1e6, 1e6],
+            [0.0, -1e6, -1e6, -1e6],
+        ])
+        with np.errstate(over="raise"):
+            _assert_parity(sklearn_model, features)
+
+    def test_near_decision_boundary(self, sklearn_model):
+        scorer = LogisticScorer.from_sklearn(sklearn_model)
+        # Точки ровно на границе решения и в её окрестности
+        base = np.zeros(4)
+        base[1] = -scorer.intercept / scorer.coef[1]
+        offsets = np.linspace(-1e-9, 1e-9, 11)
+        features = np.tile(base, (offsets.size, 1))
+        features[:, 1] += offsets
+        _assert_parity(sklearn_model, features)
+
+    def test_prepared_request_features(self, sklearn_model):
+        requests = [
+            PredictRequest(
+                seller_id=1,
+                is_verified_seller=i % 2 == 0,
+                item_id=i + 1,
+                name="x",
+                description="y" * (i * 37 + 1),
+                category=i % 100 + 1,
+                images_qty=i % 11,
+            )
+            for i in range(200)
+        ]
+        _assert_parity(sklearn_model, prepare_features_batch(requests))
+        _assert_parity(sklearn_model, prepare_features(requests[0]))
+
+
+class TestScorerValidation:
+    def test_rejects_multiclass_model(self):
+        rng = np.random.default_rng(1)
+        model = LogisticRegression().fit(rng.random((30, 4)), np.arange(30) % 3)
+        with pytest.raises(ValueError):
+            LogisticScorer.from_sklearn(model)
+
+    def test_batch_equals_row_by_row(self, sklearn_model):
+        scorer = LogisticScorer.from_sklearn(sklearn_model)
+        features = np.random.default_rng(2).random((50, 4))
+        labels, probabilities = scorer.predict_with_proba(features)
+        for i, row in enumerate(features):
+            row_labels, row_probabilities = scorer.predict_with_proba(row[None, :])
+            assert row_labels[0] == labels[i]
+            assert row_probabilities[0] == pytest.approx(probabilities[i], rel=1e-12)
+
+
+class TestWeightsArtifact:
+    def test_exported_weights_match_sklearn(self, sklearn_model, tmp_path):
+        path = str(tmp_path / "model.weights")
+        header = export_weights(sklearn_model, path)
+        scorer = load_weights(path)
+        assert scorer.version == header["model_version"]
+        features = np.random.default_rng(3).random((1000, 4))
+        np.testing.assert_allclose(
+            scorer.predict_with_proba(features)[1], sklearn_model.predict_proba(features)[:, 1], rtol=1e-12
+        )
+
+    def test_pickle_and_weights_share_version(self, sklearn_model, tmp_path):
+        # Версия — от коэффициентов, а не от байтов файла: иначе одна модель в двух форматах
+        # получала бы разные ключи кеша
+        pkl_path, weights_path = str(tmp_path / "model.pkl"), str(tmp_path / "model.weights")
+        save_model(sklearn_model, pkl_path)
+        header = export_weights(sklearn_model, weights_path)
+        assert load_scorer(pkl_path).version == header["model_version"]
+        assert load_scorer(weights_path).version == header["model_version"]
+
+    def test_weights_are_memory_mapped(self):
+        header, offset = read_weights_header(MODEL_PATH)
+        assert offset % 64 == 0
+        scorer = load_weights(MODEL_PATH)
+        # Веса — read-only вид на отображённый файл, а не копия
+        assert not scorer.coef.flags.owndata
+        assert not scorer.coef.flags.writeable
+
+    def test_corrupted_weights_rejected(self, tmp_path):
+        path = tmp_path / "model.weights"
+        export_weights(train_model(), str(path))
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+        with pytest.raises(ValueError, match="Checksum"):
+            load_weights(str(path))
+
+    def test_not_a_weights_file(self, tmp_path):
+        path = tmp_path / "model.weights"
+        path.write_bytes(b"garbage")
+        with pytest.raises(ValueError):
+            load_weights(str(path))
@@ -0,0 +1,28 @@
+import numpy as np
+
+from app.cli.train import main
+from model import load_model, load_weights, read_weights_header
+
+
+class TestTrainCli:
+    def test_train_writes_weights_with_metadata(self, tmp_path):
+        out = tmp_path / "model.weights"
+        pickle_out = tmp_path / "model.pkl"
+        main(["--out", str(out), "--pickle-out", str(pickle_out), "--cv", "3", "--jobs", "2", "--samples", "300"])
+
+        header, _ = read_weights_header(str(out))
+        metadata = header["metadata"]
+        assert metadata["n_samples"] == 300
+        assert metadata["cv_folds"] == 3
+        assert 0.0 <= metadata["cv_accuracy_mean"] <= 1.0
+        assert not list(tmp_path.glob("*.tmp.*"))
+
+        scorer = load_weights(str(out))
+        model = load_model(str(pickle_out))
+        features = np.random.default_rng(0).random((100, 4))
+        np.testing.assert_allclose(scorer.predict_with_proba(features)[1], model.predict_proba(features)[:, 1])
+
+    def test_export_only_from_pickle(self, tmp_path):
+        out = tmp_path / "model.weights"
+        main(["--export-only", "--pickle-in", "model.pkl", "--out", str(out)])
+        assert load_weights(str(out)).version == read_weights_header(str(out))[0]["model_version"]